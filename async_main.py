@@ -0,0 +1,451 @@
+# async_main.py
+"""
+异步服务模式：aiohttp 事件循环在最外层，与 main.py (Flask/WSGI) 提供同一套接口
+
+- /api/hsk/tts、/api/tts/generate-*-audio：共用 TTSEngine 的音频磁盘缓存，未命中时 edge-tts 直接在服务器事件循环上运行
+- /api/tts/ocr-image：百度 OCR SDK 是同步的，放进有上限的线程池执行（OCR_WORKERS）
+- /api/tts/audio/<filename>：静态音频文件由 aiohttp 直接发送
+- /api/hsk/save_mastery、/api/hsk/save_progress、/api/hsk/get_user_mastery（缓存命中）：测验中最频繁的请求，
+  只读写进程内的缓存和写回缓冲，直接在事件循环上处理，不占桥接线程；熟练度缓存未命中、
+  或写回缓冲为同步模式（刷写间隔设为 0）时才到线程池访问 Supabase
+- 其余所有接口通过 WSGI 桥接交给 main.app（Flask）在线程池中处理；其中的 Supabase 调用经
+  supabase_aiohttp.AiohttpAdapter 在事件循环上的 aiohttp 连接池完成。
+  桥接线程数 ASYNC_WSGI_THREADS 是这些接口的并发上限，新的高频接口应改写为原生处理函数
+
+启动方式：
+  gunicorn async_main:app --worker-class aiohttp.GunicornWebWorker
+  python async_main.py
+"""
+import asyncio
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote_to_bytes
+
+from aiohttp import web
+
+import main
+import supabase_aiohttp
+from flashcard_english.flashcard_app import check_initial_data
+from hsk_learning_curve.auth import check_session, token_from_headers
+from hsk_learning_curve.config import TTS_CACHE_MAX_AGE
+from hsk_learning_curve.hsk_app import (
+    tts_params, record_mastery, record_progress, read_user_mastery, flush_writes, mastery_writes, progress_writes
+)
+from hsk_learning_curve.mastery_cache import mastery_cache
+from mandarin_tts_tool.tts_app import tts_engine, ocr_engine, parse_tts_request
+
+# --- 线程池 / 请求体配置（可通过环境变量覆盖）---
+# WSGI 桥接线程数：Flask 视图在这些线程里运行，等待 Supabase 时线程阻塞在 Future 上
+ASYNC_WSGI_THREADS = int(os.environ.get('ASYNC_WSGI_THREADS', 32))
+# 百度 OCR 并发上限：SDK 为同步调用，超出的请求在线程池队列中等待
+OCR_WORKERS = int(os.environ.get('OCR_WORKERS', 4))
+# 流式响应在桥接线程与事件循环之间最多缓冲的块数（背压）
+WSGI_QUEUE_SIZE = 8
+# 请求体上限（/api/flashcard/import 需要上传整个卡组）
+CLIENT_MAX_SIZE = int(os.environ.get('ASYNC_CLIENT_MAX_SIZE', 256 * 1024 * 1024))
+
+_wsgi_executor = ThreadPoolExecutor(max_workers=ASYNC_WSGI_THREADS, thread_name_prefix='wsgi')
+_ocr_executor = ThreadPoolExecutor(max_workers=OCR_WORKERS, thread_name_prefix='ocr')
+
+
+# ==========================================================
+# 原生异步接口
+# ==========================================================
+
+async def hsk_tts(request):
+    """与 hsk_app.tts 相同：经共享的 TTSEngine 磁盘缓存，未命中时 edge-tts 直接在服务器事件循环上合成"""
+    text, selected_voice, speed = tts_params(request.query)
+    try:
+        audio_path = await tts_engine.generate_single_sentence_audio_async(text, selected_voice, speed)
+    except Exception as e:
+        audio_path = f"Error: {e}"
+    if str(audio_path).startswith("Error"):
+        print(f"TTS Error: {audio_path}")
+        return web.Response(text=audio_path, status=500)
+    return web.FileResponse(audio_path, headers={
+        'Content-Type': 'audio/mpeg',
+        'Cache-Control': f'public, max-age={TTS_CACHE_MAX_AGE}'
+    })
+
+
+def _hsk_session(request, supplied):
+    """与 require_session 相同的会话校验，返回 (会话用户, 错误响应)"""
+    token = token_from_headers(request.headers)
+    username, error = check_session(token, supplied if token else None)
+    if error:
+        body, status = error
+        return None, web.json_response(body, status=status)
+    return username, None
+
+
+async def _hsk_json(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    return data if isinstance(data, dict) else None
+
+
+async def hsk_save_mastery(request):
+    """与 hsk_app.save_mastery 相同：只更新缓存和写回缓冲，直接在事件循环上完成"""
+    data = await _hsk_json(request)
+    if data is None:
+        return web.json_response({"error": "request body must be a JSON object"}, status=400)
+    session_user, error = _hsk_session(request, data.get('username'))
+    if error:
+        return error
+    if mastery_writes.synchronous:
+        # 同步写入模式会访问 Supabase，交给线程池
+        body, status = await asyncio.get_running_loop().run_in_executor(
+            _wsgi_executor, record_mastery, data, session_user)
+    else:
+        body, status = record_mastery(data, session_user)
+    return web.json_response(body, status=status)
+
+
+async def hsk_save_progress(request):
+    """与 hsk_app.save_progress 相同：合并进写回缓冲，直接在事件循环上完成"""
+    data = await _hsk_json(request)
+    if data is None:
+        return web.json_response({"error": "request body must be a JSON object"}, status=400)
+    session_user, error = _hsk_session(request, data.get('username'))
+    if error:
+        return error
+    if progress_writes.synchronous:
+        body, status = await asyncio.get_running_loop().run_in_executor(
+            _wsgi_executor, record_progress, data, session_user)
+    else:
+        body, status = record_progress(data, session_user)
+    return web.json_response(body, status=status)
+
+
+async def hsk_get_user_mastery(request):
+    """与 hsk_app.get_user_mastery 相同：缓存命中时直接返回，未命中时在线程池中读取 Supabase"""
+    session_user, error = _hsk_session(request, request.query.get('username'))
+    if error:
+        return error
+    username = session_user or request.query.get('username')
+    if not username:
+        return web.json_response({"error": "username is required"}, status=400)
+    level = request.query.get('level') or None
+
+    mastery = mastery_cache.get(username, level)
+    if mastery is None:
+        loop = asyncio.get_running_loop()
+        try:
+            mastery = await loop.run_in_executor(_wsgi_executor, read_user_mastery, username, level)
+        except Exception as e:
+            return web.json_response({"error": str(e)}, status=500)
+    return web.json_response(mastery)
+
+
+async def generate_single_audio(request):
+    try:
+        sentence, voice, speed, error = parse_tts_request(await request.json(), 'sentence', "句子不能为空")
+        if error:
+            return web.json_response({"error": error}, status=400)
+
+        audio_path = await tts_engine.generate_single_sentence_audio_async(sentence, voice, speed)
+        if str(audio_path).startswith("Error"):
+            return web.json_response({"error": audio_path}, status=500)
+
+        return web.json_response({
+            "success": True,
+            "audio_path": audio_path,
+            "filename": os.path.basename(audio_path)
+        })
+    except Exception as e:
+        return web.json_response({"error": str(e)}, status=500)
+
+
+async def generate_full_audio(request):
+    try:
+        text, voice, speed, error = parse_tts_request(await request.json(), 'text', "文本不能为空")
+        if error:
+            return web.json_response({"error": error}, status=400)
+
+        audio_path, sentences = await tts_engine.generate_full_audio_async(text, voice, speed)
+        if str(audio_path).startswith("Error"):
+            return web.json_response({"error": audio_path}, status=500)
+
+        return web.json_response({
+            "success": True,
+            "audio_path": audio_path,
+            "filename": os.path.basename(audio_path),
+            "sentences": sentences
+        })
+    except Exception as e:
+        return web.json_response({"error": str(e)}, status=500)
+
+
+async def ocr_image(request):
+    """图片直接以字节交给 OCR，不再落临时文件"""
+    try:
+        form = await request.post()
+        image = form.get('image')
+        if not isinstance(image, web.FileField):
+            return web.json_response({"error": "未上传图片"}, status=400)
+
+        image_data = image.file.read()
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(_ocr_executor, ocr_engine.ocr_image_data, image_data)
+
+        if result.startswith(("Error:", "Warning:")):
+            return web.json_response({"error": result}, status=500)
+
+        return web.json_response({"success": True, "text": result})
+    except Exception as e:
+        return web.json_response({"error": str(e)}, status=500)
+
+
+async def serve_audio(request):
+    audio_path = tts_engine.cached_audio_path(request.match_info['filename'])
+    if audio_path is not None and os.path.isfile(audio_path):
+        return web.FileResponse(audio_path, headers={'Content-Type': 'audio/mpeg'})
+    raise web.HTTPNotFound()
+
+
+@web.middleware
+async def cors_middleware(request, handler):
+    """原生接口与 Flask-CORS 保持一致：允许任意来源（预检 OPTIONS 仍由 Flask 处理）"""
+    response = await handler(request)
+    response.headers.setdefault('Access-Control-Allow-Origin', '*')
+    return response
+
+
+# ==========================================================
+# WSGI 桥接：其余接口交给 Flask
+# ==========================================================
+
+class _WSGIInput:
+    """
+    wsgi.input：桥接线程按需从事件循环读取请求体，大请求体（/import）不必先整体读入内存
+    readline(size) 多读出的字节留在 _buffer 中，供之后的 read / readline 使用
+    """
+
+    def __init__(self, content, loop):
+        self._content = content
+        self._loop = loop
+        self._buffer = b''
+
+    def _call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def _take(self, size):
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            return self._take(len(self._buffer)) + self._call(self._content.read())
+        parts = [self._take(size)]
+        size -= len(parts[0])
+        while size > 0:
+            data = self._call(self._content.read(size))
+            if not data:
+                break
+            parts.append(data)
+            size -= len(data)
+        return b''.join(parts)
+
+    def readline(self, size=-1):
+        limit = None if size is None or size < 0 else size
+        while True:
+            end = self._buffer.find(b'\n') + 1
+            if end:
+                return self._take(end if limit is None else min(end, limit))
+            if limit is not None and len(self._buffer) >= limit:
+                return self._take(limit)
+            if limit is None:
+                data = self._call(self._content.readline())
+            else:
+                # StreamReader.readline 不能限制长度：最多读到 size 字节，超出换行的部分留在缓冲中
+                data = self._call(self._content.read(limit - len(self._buffer)))
+            if not data:
+                return self._take(len(self._buffer))
+            self._buffer += data
+
+    def readlines(self, hint=-1):
+        return list(self)
+
+    def __iter__(self):
+        while True:
+            line = self.readline()
+            if not line:
+                return
+            yield line
+
+
+class _ClientGone(Exception):
+    """客户端已断开，停止迭代 WSGI 响应"""
+
+
+def build_environ(request, loop):
+    """按 PEP 3333 由 aiohttp 请求构造 environ"""
+    path, _, query = request.raw_path.partition('?')
+    sockname = request.transport.get_extra_info('sockname') if request.transport else None
+    host = request.host.rsplit(':', 1)[0] if request.host else ''
+    environ = {
+        'REQUEST_METHOD': request.method,
+        'SCRIPT_NAME': '',
+        'PATH_INFO': unquote_to_bytes(path).decode('latin-1'),
+        'QUERY_STRING': query,
+        'SERVER_NAME': host or (sockname[0] if sockname else 'localhost'),
+        'SERVER_PORT': str(sockname[1]) if sockname else '80',
+        'SERVER_PROTOCOL': f'HTTP/{request.version.major}.{request.version.minor}',
+        'REMOTE_ADDR': request.remote or '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': request.scheme,
+        'wsgi.input': _WSGIInput(request.content, loop),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for key in set(request.headers.keys()):
+        name = key.upper().replace('-', '_')
+        value = ','.join(request.headers.getall(key))
+        if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            environ[name] = value
+        else:
+            environ['HTTP_' + name] = value
+    if 'CONTENT_LENGTH' not in environ and request.body_exists:
+        # chunked 请求体：没有 Content-Length，读到 EOF 为止
+        environ['wsgi.input_terminated'] = True
+    return environ
+
+
+def _run_wsgi(environ, loop, queue, cancelled):
+    """
+    在桥接线程中完整执行一次 WSGI 调用（包括迭代响应和 close），
+    stream_with_context 的生成器因此始终在同一个线程、同一个请求上下文里运行
+    """
+    state = {'start': None, 'sent': False}
+
+    def put(item):
+        if cancelled.is_set():
+            raise _ClientGone()
+        asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+    def send_headers():
+        if not state['sent']:
+            state['sent'] = True
+            put(('start',) + state['start'])
+
+    def write(data):
+        send_headers()
+        if data:
+            put(('body', data))
+
+    def start_response(status, headers, exc_info=None):
+        if exc_info and state['sent']:
+            raise exc_info[1].with_traceback(exc_info[2])
+        state['start'] = (status, headers)
+        return write
+
+    try:
+        result = main.app(environ, start_response)
+        try:
+            for data in result:
+                write(data)
+            send_headers()
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        put(('end',))
+    except _ClientGone:
+        pass
+    except Exception as e:
+        if not cancelled.is_set():
+            put(('error', e))
+
+
+async def wsgi_bridge(request):
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=WSGI_QUEUE_SIZE)
+    cancelled = threading.Event()
+    loop.run_in_executor(_wsgi_executor, _run_wsgi, build_environ(request, loop), loop, queue, cancelled)
+
+    finished = False
+    try:
+        item = await queue.get()
+        if item[0] == 'error':
+            finished = True
+            print(f"❌ WSGI 处理失败 {request.method} {request.path}: {item[1]}")
+            return web.Response(text="Internal Server Error", status=500)
+
+        _, status, headers = item
+        code, _, reason = status.partition(' ')
+        response = web.StreamResponse(status=int(code), reason=reason or None)
+        for name, value in headers:
+            response.headers.add(name, value)
+        await response.prepare(request)
+
+        while True:
+            item = await queue.get()
+            if item[0] == 'body':
+                await response.write(item[1])
+            elif item[0] == 'end':
+                finished = True
+                break
+            else:
+                # 响应头已发出，只能截断响应
+                finished = True
+                print(f"❌ WSGI 响应中途失败 {request.method} {request.path}: {item[1]}")
+                return response
+        await response.write_eof()
+        return response
+    finally:
+        if not finished:
+            # 客户端断开：通知桥接线程停止，并腾出队列让可能阻塞中的 put 返回
+            cancelled.set()
+            while not queue.empty():
+                queue.get_nowait()
+
+
+# ==========================================================
+# 应用
+# ==========================================================
+
+async def on_startup(app):
+    await supabase_aiohttp.start()
+    supabase_aiohttp.install()
+
+
+async def on_cleanup(app):
+    # 写回缓冲的 Supabase 请求要经过事件循环上的连接池，必须在关闭连接池之前刷写
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(None, flush_writes)
+    except Exception as e:
+        print(f"❌ 退出前刷写写回缓冲失败: {e}")
+    await supabase_aiohttp.close()
+    _wsgi_executor.shutdown(wait=False)
+    _ocr_executor.shutdown(wait=False)
+
+
+def create_app():
+    app = web.Application(client_max_size=CLIENT_MAX_SIZE, middlewares=[cors_middleware])
+    app.router.add_get('/api/hsk/tts', hsk_tts)
+    app.router.add_post('/api/hsk/save_mastery', hsk_save_mastery)
+    app.router.add_post('/api/hsk/save_progress', hsk_save_progress)
+    app.router.add_get('/api/hsk/get_user_mastery', hsk_get_user_mastery)
+    app.router.add_post('/api/tts/generate-single-audio', generate_single_audio)
+    app.router.add_post('/api/tts/generate-full-audio', generate_full_audio)
+    app.router.add_post('/api/tts/ocr-image', ocr_image)
+    app.router.add_get('/api/tts/audio/{filename}', serve_audio)
+    app.router.add_route('*', '/{tail:.*}', wsgi_bridge)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+app = create_app()
+
+
+if __name__ == "__main__":
+    check_initial_data()
+    main.start_warmup()
+    web.run_app(app, host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
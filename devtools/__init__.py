@@ -0,0 +1,8 @@
+# devtools
+"""
+本地开发/性能测试工具（不参与线上部署）
+
+- supabase_standin.py: 内存中的 PostgREST 替身（进程内 Adapter 或独立 HTTP 服务），不访问真实 Supabase
+- srs_bench.py:        SRS 算法与 /srs/today 的基准测试（合成卡组）
+- loadgen.py:          按真实流量比例对 main.app 施压（经替身，不依赖线上 Supabase）
+"""
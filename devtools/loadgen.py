@@ -0,0 +1,311 @@
+# loadgen.py
+"""
+压测驱动：按接近线上的流量比例，对 main.app 重放请求，统计各接口的吞吐、延迟和状态码
+
+两种目标：
+  进程内（默认）：Flask test client 直接调用 main.app，Supabase 由进程内替身代替
+      python -m devtools.loadgen --duration 30 --concurrency 8 --latency-ms 20
+  HTTP：对已启动的服务施压（服务端应通过 SUPABASE_URL 指向替身，见 supabase_standin.py）
+      python -m devtools.supabase_standin --port 54321 --cards 5000 --users 50 &
+      SUPABASE_URL=http://127.0.0.1:54321 gunicorn main:app &
+      python -m devtools.loadgen --base-url http://127.0.0.1:8000 --users 50 --cards 5000
+
+流量比例用 --mix 覆盖，如 --mix srs_today=50,cards_page=20,hsk_mastery=30。
+依赖外部服务的接口（edge-tts、百度 OCR）不在默认流量中；tts_split 只做分句，可按需加入。
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+
+from devtools.srs_bench import percentile
+
+FLASHCARD = '/api/flashcard'
+HSK = '/api/hsk'
+TTS = '/api/tts'
+MODULES = ('mod1', 'mod2')
+
+DEFAULT_MIX = {
+    'srs_today': 15,
+    'srs_today_all': 10,
+    'cards_page': 10,
+    'cards_revalidate': 5,
+    'srs_learn': 8,
+    'srs_use': 8,
+    'srs_events': 4,
+    'card_update': 2,
+    'hsk_login': 2,
+    'hsk_progress': 10,
+    'hsk_mastery': 10,
+    'hsk_save_progress': 8,
+    'hsk_save_mastery': 8,
+    'tts_split': 0,
+}
+
+
+# ==========================================================
+# 目标：进程内 test client 或 HTTP
+# ==========================================================
+
+class InProcessTarget:
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, json_body=None, headers=None):
+        # 每个线程一个 test client
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, json=json_body, headers=headers)
+        return response.status_code, response.headers, response.get_data()
+
+
+class HTTPTarget:
+    def __init__(self, base_url):
+        import requests
+        self.base_url = base_url.rstrip('/')
+        self._requests = requests
+        self._local = threading.local()
+
+    def request(self, method, path, json_body=None, headers=None):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = self._requests.Session()
+        response = session.request(method, self.base_url + path, json=json_body, headers=headers, timeout=30)
+        return response.status_code, response.headers, response.content
+
+
+# ==========================================================
+# 场景：每个场景发一个请求，返回 (状态码, 响应头, 响应体)
+# ==========================================================
+
+class Scenarios:
+    def __init__(self, target, cards, users):
+        self.target = target
+        self.cards = cards
+        self.users = users
+        self._etags = {}
+
+    def _card(self, rng):
+        module_id = rng.choice(MODULES)
+        return module_id, f'{module_id}_card_{rng.randint(1, self.cards)}'
+
+    def _user(self, rng):
+        i = rng.randint(1, self.users)
+        return f'user{i}', f'pw{i}'
+
+    def srs_today(self, rng):
+        return self.target.request('GET', f'{FLASHCARD}/{rng.choice(MODULES)}/srs/today')
+
+    def srs_today_all(self, rng):
+        """首页：一次取所有模块的今日清单"""
+        return self.target.request('GET', f'{FLASHCARD}/srs/today?k_total={rng.choice((5, 8, 10))}')
+
+    def cards_page(self, rng):
+        module_id = rng.choice(MODULES)
+        status, headers, body = self.target.request('GET', f'{FLASHCARD}/{module_id}/cards?limit=200')
+        if headers.get('ETag'):
+            self._etags[module_id] = headers['ETag']
+        return status, headers, body
+
+    def cards_revalidate(self, rng):
+        """客户端带上次的 ETag 重新校验（大多数情况下应为 304）"""
+        module_id = rng.choice(MODULES)
+        etag = self._etags.get(module_id)
+        headers = {'If-None-Match': etag} if etag else None
+        return self.target.request('GET', f'{FLASHCARD}/{module_id}/cards?limit=200', headers=headers)
+
+    def srs_learn(self, rng):
+        module_id, card_id = self._card(rng)
+        return self.target.request('POST', f'{FLASHCARD}/{module_id}/srs/learn/{card_id}')
+
+    def srs_use(self, rng):
+        module_id, card_id = self._card(rng)
+        return self.target.request('POST', f'{FLASHCARD}/{module_id}/srs/use/{card_id}')
+
+    def srs_events(self, rng):
+        module_id = rng.choice(MODULES)
+        events = [
+            {'card_id': f'{module_id}_card_{rng.randint(1, self.cards)}', 'type': rng.choice(('review', 'application'))}
+            for _ in range(rng.randint(2, 10))
+        ]
+        return self.target.request('POST', f'{FLASHCARD}/{module_id}/srs/events', json_body={'events': events})
+
+    def card_update(self, rng):
+        module_id, card_id = self._card(rng)
+        body = {'cardid': card_id, 'title': f'edited {rng.randint(0, 10 ** 6)}'}
+        return self.target.request('PUT', f'{FLASHCARD}/{module_id}/cards/{card_id}', json_body=body)
+
+    def hsk_login(self, rng):
+        username, password = self._user(rng)
+        return self.target.request('POST', f'{HSK}/login', json_body={'username': username, 'password': password})
+
+    def hsk_progress(self, rng):
+        username, _ = self._user(rng)
+        return self.target.request('GET', f'{HSK}/get_user_progress?username={username}')
+
+    def hsk_mastery(self, rng):
+        username, _ = self._user(rng)
+        return self.target.request('GET', f'{HSK}/get_user_mastery?username={username}&level={rng.randint(1, 6)}')
+
+    def hsk_save_progress(self, rng):
+        username, _ = self._user(rng)
+        body = {'username': username, 'level': rng.randint(1, 6), 'index': rng.randint(0, 500)}
+        return self.target.request('POST', f'{HSK}/save_progress', json_body=body)
+
+    def hsk_save_mastery(self, rng):
+        username, _ = self._user(rng)
+        body = {'username': username, 'char': f'字{rng.randint(0, 199)}', 'level': rng.randint(1, 6),
+                'record': {'correct': rng.randint(0, 10), 'wrong': rng.randint(0, 5)}}
+        return self.target.request('POST', f'{HSK}/save_mastery', json_body=body)
+
+    def tts_split(self, rng):
+        text = '今天天气很好。我们去公园散步吧！你觉得怎么样？' * rng.randint(1, 5)
+        return self.target.request('POST', f'{TTS}/split-text', json_body={'text': text})
+
+
+# ==========================================================
+# 执行与统计
+# ==========================================================
+
+def parse_mix(text):
+    mix = dict(DEFAULT_MIX)
+    if text:
+        mix = {name: 0 for name in mix}
+        for part in text.split(','):
+            name, _, weight = part.partition('=')
+            name = name.strip()
+            if name not in DEFAULT_MIX:
+                raise SystemExit(f"未知场景: {name}（可选: {', '.join(DEFAULT_MIX)}）")
+            mix[name] = float(weight or 1)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+def run_load(target, scenarios, mix, duration=None, total=None, concurrency=4, seed=42):
+    """
+    concurrency 个线程按 mix 的权重随机选场景，直到 duration 秒或共发出 total 个请求
+    返回 {场景名: {'latencies': [...], 'status': {状态码: 次数}, 'errors': [...]}}
+    """
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    stats = defaultdict(lambda: {'latencies': [], 'status': defaultdict(int), 'errors': []})
+    lock = threading.Lock()
+    issued = [0]
+    deadline = time.monotonic() + duration if duration else None
+
+    def worker(worker_id):
+        rng = random.Random(seed * 1000 + worker_id)
+        while True:
+            with lock:
+                if total is not None and issued[0] >= total:
+                    return
+                issued[0] += 1
+            if deadline is not None and time.monotonic() >= deadline:
+                return
+            name = rng.choices(names, weights)[0]
+            start = time.perf_counter()
+            try:
+                status, _, body = getattr(scenarios, name)(rng)
+                # 5xx 保留前几条响应体，便于定位
+                error = f'{status}: {body[:200].decode("utf-8", "replace")}' if status >= 500 else None
+            except Exception as e:
+                status, error = 'exception', f'{type(e).__name__}: {e}'
+            elapsed = time.perf_counter() - start
+            with lock:
+                entry = stats[name]
+                entry['latencies'].append(elapsed)
+                entry['status'][status] += 1
+                if error and len(entry['errors']) < 5:
+                    entry['errors'].append(error)
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return stats, time.perf_counter() - started
+
+
+def summarize(stats, wall_time):
+    rows = []
+    for name, entry in sorted(stats.items()):
+        latencies = entry['latencies']
+        rows.append({
+            'scenario': name,
+            'requests': len(latencies),
+            'rps': round(len(latencies) / wall_time, 1) if wall_time else None,
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'max_ms': round(max(latencies) * 1000, 2),
+            'status': {str(k): v for k, v in sorted(entry['status'].items(), key=lambda kv: str(kv[0]))},
+            'errors': entry['errors']
+        })
+    total = sum(r['requests'] for r in rows)
+    return {
+        'wall_seconds': round(wall_time, 2),
+        'requests': total,
+        'rps': round(total / wall_time, 1) if wall_time else None,
+        'scenarios': rows
+    }
+
+
+def print_summary(summary):
+    print(f"\n🚦 共 {summary['requests']} 个请求，用时 {summary['wall_seconds']} 秒，{summary['rps']} req/s")
+    print(f"{'scenario':<20}{'reqs':>8}{'rps':>9}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}  status")
+    for r in summary['scenarios']:
+        status = ' '.join(f'{k}:{v}' for k, v in r['status'].items())
+        print(f"{r['scenario']:<20}{r['requests']:>8}{r['rps']:>9}{r['p50_ms']:>10}{r['p99_ms']:>10}{r['max_ms']:>10}  {status}")
+        for error in r['errors']:
+            print(f"    ❌ {error}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='按流量比例对 main.app 施压')
+    parser.add_argument('--base-url', help='对已启动的服务施压；不指定时在进程内调用 main.app')
+    parser.add_argument('--duration', type=float, default=10, help='持续秒数（与 --requests 二选一）')
+    parser.add_argument('--requests', type=int, help='总请求数')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--mix', help='场景权重，如 srs_today=50,hsk_mastery=50')
+    parser.add_argument('--cards', type=int, default=1000, help='每个模块的卡片数（须与替身数据一致）')
+    parser.add_argument('--users', type=int, default=20, help='HSK 用户数（须与替身数据一致）')
+    parser.add_argument('--latency-ms', type=float, default=0, help='进程内替身：每个 Supabase 请求的延迟')
+    parser.add_argument('--jitter-ms', type=float, default=0, help='进程内替身：随机延迟上限')
+    parser.add_argument('--error-rate', type=float, default=0, help='进程内替身：注入错误的比例')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args(argv)
+
+    mix = parse_mix(args.mix)
+    if args.base_url:
+        target = HTTPTarget(args.base_url)
+    else:
+        from devtools.supabase_standin import PostgRESTStandIn, install, seed as seed_standin
+        import main as app_module
+        standin = PostgRESTStandIn(
+            latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+            error_rate=args.error_rate, seed=args.seed
+        )
+        seed_standin(standin, cards=args.cards, users=args.users, rng_seed=args.seed)
+        install(standin)
+        target = InProcessTarget(app_module.app)
+
+    stats, wall_time = run_load(
+        target, Scenarios(target, args.cards, args.users), mix,
+        duration=None if args.requests else args.duration, total=args.requests,
+        concurrency=args.concurrency, seed=args.seed
+    )
+    summary = summarize(stats, wall_time)
+    if args.json:
+        json.dump(summary, sys.stdout, indent=2, ensure_ascii=False)
+        print()
+    else:
+        print_summary(summary)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+# srs_bench.py
+"""
+SRS 基准测试：用可复现的合成卡组测量
+
+  score_P        对整副卡组逐卡调用 calculate_priority_score_P
+  must_use_list  generate_must_use_list（整副卡组）
+  parse          get_all_cards_srs_state_supabase 未命中缓存时的读取 + 解析（经进程内 PostgREST 替身）
+  today_cold     /srs/today 端到端（Flask test client，每次先让缓存失效）
+  today_warm     /srs/today 端到端（卡组缓存命中，每次先清空记住的今日清单，走到期日分桶索引重新计算）
+  today_memo     /srs/today 端到端（今日清单已记住，只是一次字典查找）
+
+每项输出吞吐（卡片/秒）、单次耗时 p50/p99（毫秒）和峰值内存（tracemalloc，单独跑一次，不计入耗时）。
+
+用法:
+  python -m devtools.srs_bench --sizes 1000,100000,1000000 --repeat 20
+  python -m devtools.srs_bench --due-ratio 0.3 --hungry-ratio 0.02 --core-ratio 0.4 --rc-mean 5 --json
+"""
+import argparse
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+from datetime import timedelta
+
+from flashcard_english.config import MODULE_TO_TABLE, A_THRESHOLD, get_today
+from devtools.supabase_standin import PostgRESTStandIn, install
+
+BENCH_MODULE = 'mod1'
+
+
+# ==========================================================
+# 合成卡组
+# ==========================================================
+
+def synthetic_records(size, due_ratio=0.2, hungry_ratio=0.01, core_ratio=0.3, rc_mean=3.0,
+                      today=None, seed=42, module_id=BENCH_MODULE):
+    """
+    生成 size 行 Supabase 记录（列与 mod*_cards 表一致），同一组参数 + seed 结果完全相同
+
+    due_ratio:    已到期（LRD + CI < today）的比例
+    hungry_ratio: 饥渴（今天 - LAD > A_THRESHOLD）的比例
+    core_ratio:   is_core 的比例
+    rc_mean:      referenceCount 的均值（几何分布，多数卡引用很少、少数很多）
+    """
+    if today is None:
+        today = get_today()
+    rng = random.Random(seed)
+    records = []
+    for i in range(1, size + 1):
+        ci = rng.choice((1, 2, 3, 5, 8, 13, 21, 34))
+        if rng.random() < due_ratio:
+            lrd = today - timedelta(days=ci + 1 + rng.randint(0, 30))
+        else:
+            lrd = today - timedelta(days=rng.randint(0, ci))
+        if rng.random() < hungry_ratio:
+            lad = today - timedelta(days=A_THRESHOLD + 1 + rng.randint(0, 60))
+        else:
+            lad = today - timedelta(days=rng.randint(0, A_THRESHOLD))
+        rc = int(rng.expovariate(1 / rc_mean)) if rc_mean > 0 else 0
+        records.append({
+            'cardid': f'{module_id}_card_{i}',
+            'data': {'cardid': f'{module_id}_card_{i}', 'title': f'synthetic card {i}'},
+            'ci': ci,
+            'lrd': lrd.isoformat(),
+            'lad': lad.isoformat(),
+            'is_core': 1 if rng.random() < core_ratio else 0,
+            'rc': rc
+        })
+    return records
+
+
+# ==========================================================
+# 计时
+# ==========================================================
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def measure(name, fn, cards_per_call, repeat, setup=None):
+    """重复执行 fn，返回 {name, throughput, p50_ms, p99_ms, peak_mb}"""
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+
+    # 峰值内存单独测一次：tracemalloc 会明显拖慢执行
+    if setup:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    total = sum(timings)
+    return {
+        'name': name,
+        'cards': cards_per_call,
+        'throughput': round(cards_per_call * repeat / total) if total else None,
+        'p50_ms': round(percentile(timings, 50) * 1000, 3),
+        'p99_ms': round(percentile(timings, 99) * 1000, 3),
+        'peak_mb': round(peak / 1024 / 1024, 2)
+    }
+
+
+# ==========================================================
+# 基准项
+# ==========================================================
+
+def run_suite(size, repeat, today=None, **deck_options):
+    # 延迟导入：先让调用方决定 NumPy 是否可用等环境因素
+    import main
+    from flashcard_english import flashcard_app
+    from flashcard_english.srs_cache import srs_cache
+    from flashcard_english.srs_calculator_supabase import calculate_priority_score_P, generate_must_use_list
+
+    if today is None:
+        today = get_today()
+
+    standin = install(PostgRESTStandIn())
+    standin.load(MODULE_TO_TABLE[BENCH_MODULE], synthetic_records(size, today=today, **deck_options))
+    client = main.app.test_client()
+
+    def invalidate():
+        srs_cache.invalidate(BENCH_MODULE)
+
+    def forget_plans():
+        srs_cache.forget_plans(BENCH_MODULE)
+
+    cards = flashcard_app.get_all_cards_srs_state_supabase(BENCH_MODULE)
+    assert len(cards) == size, f'替身返回 {len(cards)} 张卡片，期望 {size}'
+
+    def score_all():
+        for card in cards:
+            calculate_priority_score_P(card, today)
+
+    def today_request():
+        response = client.get(f'/api/flashcard/{BENCH_MODULE}/srs/today')
+        assert response.status_code == 200, response.get_data(as_text=True)
+
+    results = [
+        measure('score_P', score_all, size, repeat),
+        measure('must_use_list', lambda: generate_must_use_list(cards, today), size, repeat),
+        measure('parse', lambda: flashcard_app.get_all_cards_srs_state_supabase(BENCH_MODULE), size, repeat,
+                setup=invalidate),
+        measure('today_cold', today_request, size, repeat, setup=invalidate),
+    ]
+    # 预热一次：加载缓存并构建到期日分桶索引
+    today_request()
+    results.append(measure('today_warm', today_request, size, repeat, setup=forget_plans))
+    today_request()
+    results.append(measure('today_memo', today_request, size, repeat))
+    invalidate()
+    return results
+
+
+def print_table(size, results):
+    print(f"\n📊 卡组大小: {size:,}")
+    print(f"{'benchmark':<16}{'cards/s':>14}{'p50 ms':>12}{'p99 ms':>12}{'peak MB':>10}")
+    for r in results:
+        throughput = f"{r['throughput']:,}" if r['throughput'] is not None else '-'
+        print(f"{r['name']:<16}{throughput:>14}{r['p50_ms']:>12}{r['p99_ms']:>12}{r['peak_mb']:>10}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='SRS 基准测试（合成卡组）')
+    parser.add_argument('--sizes', default='1000,10000,100000', help='逗号分隔的卡组大小')
+    parser.add_argument('--repeat', type=int, default=10, help='每项重复次数（p50/p99 基于此）')
+    parser.add_argument('--due-ratio', type=float, default=0.2)
+    parser.add_argument('--hungry-ratio', type=float, default=0.01)
+    parser.add_argument('--core-ratio', type=float, default=0.3)
+    parser.add_argument('--rc-mean', type=float, default=3.0)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果（便于与历史结果比较）')
+    args = parser.parse_args(argv)
+
+    report = []
+    for size in (int(s) for s in args.sizes.split(',') if s.strip()):
+        results = run_suite(
+            size, args.repeat,
+            due_ratio=args.due_ratio, hungry_ratio=args.hungry_ratio,
+            core_ratio=args.core_ratio, rc_mean=args.rc_mean, seed=args.seed
+        )
+        report.append({'size': size, 'results': results})
+        if not args.json:
+            print_table(size, results)
+
+    if args.json:
+        json.dump({'options': vars(args), 'report': report}, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,698 @@
+# supabase_standin.py
+"""
+PostgREST 替身（离线基准测试 / 压测用），数据全部在内存中
+
+两种接入方式，代码路径（supabase_client.request -> 解析 JSON）都与线上一致：
+1. 进程内：install() 把替身作为 requests 的 Transport Adapter 挂到共享 Session 上，
+   发往 SUPABASE_URL 的请求直接由替身处理（srs_bench / loadgen 默认方式）
+2. 独立 HTTP 服务：
+     python -m devtools.supabase_standin --port 54321 --latency-ms 30 --error-rate 0.01 --cards 5000 --users 50
+     SUPABASE_URL=http://127.0.0.1:54321 gunicorn main:app
+
+支持的 PostgREST 语义（即本仓库用到的部分）：
+  GET    /rest/v1/<table>  select（*、列名、别名:data->键）、过滤、order、limit
+  POST   /rest/v1/<table>  单行或多行插入；on_conflict + Prefer resolution=merge-duplicates/ignore-duplicates
+  PATCH  /rest/v1/<table>  按过滤条件更新
+  DELETE /rest/v1/<table>  按过滤条件删除
+  POST   /rest/v1/rpc/<fn> srs_record_application、srs_apply_event_states、record_card_changes、write_card、replace_card_batch（见 supabase_functions.sql）
+  过滤：eq/neq/gt/gte/lt/lte/in/is 以及 not. 前缀
+  Prefer：return=representation / return=minimal（写操作默认 minimal，与 PostgREST 一致）
+可注入固定延迟 + 抖动和按比例返回的错误（默认 503），用于观察超时/重试行为
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+import supabase_client
+
+REST_PREFIX = '/rest/v1/'
+REASONS = {200: 'OK', 201: 'Created', 204: 'No Content', 400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed', 409: 'Conflict', 500: 'Internal Server Error',
+           502: 'Bad Gateway', 503: 'Service Unavailable', 504: 'Gateway Timeout'}
+
+
+class PostgRESTError(Exception):
+    def __init__(self, status_code, message):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+
+
+# ==========================================================
+# 表结构（替身只需要主键、自增列和默认值）
+# ==========================================================
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+class Table:
+    """
+    一张内存表：rows 按主键索引（dict 保持插入顺序，对应 PostgREST 不带 order 时的返回顺序）
+    serial: 自增列名（插入时未提供则自动分配）
+    defaults: {列名: 默认值或无参函数}
+    """
+
+    def __init__(self, name, primary_key, serial=None, defaults=None):
+        self.name = name
+        self.primary_key = tuple(primary_key)
+        self.serial = serial
+        self.defaults = defaults or {}
+        self.rows = {}
+        self._next_serial = 1
+
+    def key(self, row, columns=None):
+        return tuple(row.get(c) for c in (columns or self.primary_key))
+
+    def prepare(self, row):
+        row = dict(row)
+        if self.serial and row.get(self.serial) is None:
+            row[self.serial] = self._next_serial
+        if self.serial and isinstance(row.get(self.serial), int):
+            self._next_serial = max(self._next_serial, row[self.serial] + 1)
+        for column, default in self.defaults.items():
+            if column not in row:
+                row[column] = default() if callable(default) else default
+        return row
+
+    def find_conflict(self, row, columns, rows=None):
+        """返回 rows（默认整张表）中与 row 在 columns 上冲突的行的主键；没有时返回 None"""
+        rows = self.rows if rows is None else rows
+        if columns == self.primary_key:
+            key = self.key(row)
+            return key if key in rows else None
+        target = self.key(row, columns)
+        for key, existing in rows.items():
+            if self.key(existing, columns) == target:
+                return key
+        return None
+
+
+# 本仓库用到的表（结构以 Supabase 项目为准，这里只描述替身需要的约束）
+DEFAULT_SCHEMA = {
+    'mod1_cards': dict(primary_key=('cardid',)),
+    'mod2_cards': dict(primary_key=('cardid',)),
+    'card_module_versions': dict(primary_key=('module_id',), defaults={'version': 0}),
+    'card_changes': dict(primary_key=('id',), serial='id', defaults={'changed_at': _now}),
+    'users': dict(primary_key=('username',)),
+    'user_progress': dict(primary_key=('username', 'level')),
+    'word_mastery': dict(primary_key=('username', 'level', 'char')),
+    'user_custom_cards': dict(primary_key=('id',), serial='id', defaults={'created_at': _now}),
+}
+
+
+# ==========================================================
+# 过滤 / 投影 / 排序
+# ==========================================================
+
+def _split_list(text):
+    """拆分 in.(a,"b,c") 中的值，支持双引号与反斜杠转义"""
+    values, buf, quoted, escaped = [], [], False, False
+    for char in text:
+        if escaped:
+            buf.append(char)
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif char == '"':
+            quoted = not quoted
+        elif char == ',' and not quoted:
+            values.append(''.join(buf))
+            buf = []
+        else:
+            buf.append(char)
+    values.append(''.join(buf))
+    return values
+
+
+def _coerce(value, literal):
+    """把过滤条件里的字符串按列值的类型转换后再比较"""
+    if isinstance(value, bool):
+        return literal.lower() == 'true'
+    if isinstance(value, (int, float)):
+        try:
+            return float(literal)
+        except ValueError:
+            raise PostgRESTError(400, f'invalid input syntax: "{literal}"')
+    return literal
+
+
+def _compare(op, value, literal):
+    if op == 'is':
+        target = {'null': None, 'true': True, 'false': False}.get(literal.lower(), literal)
+        return value is target if target is None else value == target
+    if value is None:
+        # SQL 语义：与 NULL 比较结果为 NULL，行不匹配
+        return False
+    if op == 'in':
+        if not (literal.startswith('(') and literal.endswith(')')):
+            raise PostgRESTError(400, f'invalid in filter: {literal}')
+        return any(value == _coerce(value, v) for v in _split_list(literal[1:-1]))
+    other = _coerce(value, literal)
+    if op == 'eq':
+        return value == other
+    if op == 'neq':
+        return value != other
+    if op == 'gt':
+        return value > other
+    if op == 'gte':
+        return value >= other
+    if op == 'lt':
+        return value < other
+    if op == 'lte':
+        return value <= other
+    raise PostgRESTError(400, f'unsupported operator: {op}')
+
+
+def parse_filter(column, expr):
+    """'not.is.null' -> (column, negate, op, literal)"""
+    negate = expr.startswith('not.')
+    if negate:
+        expr = expr[4:]
+    op, sep, literal = expr.partition('.')
+    if not sep:
+        raise PostgRESTError(400, f'invalid filter: {column}={expr}')
+    return column, negate, op, literal
+
+
+def row_matches(row, filters):
+    for column, negate, op, literal in filters:
+        if _compare(op, row.get(column), literal) == negate:
+            return False
+    return True
+
+
+def parse_select(select):
+    """返回 [(输出名, 列名, JSON 路径键或 None)]；None 表示 *"""
+    if not select or select == '*':
+        return None
+    columns = []
+    for item in select.split(','):
+        item = item.strip()
+        alias, _, expr = item.rpartition(':') if ':' in item else ('', '', item)
+        column, _, key = expr.partition('->')
+        key = key.strip("'\"") or None
+        columns.append((alias or (key if key else column), column, key))
+    return columns
+
+
+def project(row, columns):
+    if columns is None:
+        return dict(row)
+    out = {}
+    for name, column, key in columns:
+        value = row.get(column)
+        if key is not None:
+            value = value.get(key) if isinstance(value, dict) else None
+        out[name] = value
+    return out
+
+
+def sort_rows(rows, order):
+    """order=cardid.asc,ci.desc；升序时 NULL 在最后，降序时 NULL 在最前（与 PostgreSQL 默认一致）"""
+    rows = list(rows)
+    for part in reversed(order.split(',')):
+        column, _, direction = part.partition('.')
+        reverse = direction.startswith('desc')
+        present = [r for r in rows if r.get(column) is not None]
+        missing = [r for r in rows if r.get(column) is None]
+        present.sort(key=lambda r: r[column], reverse=reverse)
+        rows = missing + present if reverse else present + missing
+    return rows
+
+
+def parse_prefer(headers):
+    """'resolution=merge-duplicates,return=representation' -> {'resolution': ..., 'return': ...}"""
+    prefs = {}
+    for part in (headers.get('Prefer') or '').split(','):
+        name, sep, value = part.strip().partition('=')
+        if sep:
+            prefs[name] = value
+    return prefs
+
+
+# ==========================================================
+# RPC（与 supabase_functions.sql 中的函数语义一致）
+# ==========================================================
+
+def rpc_srs_record_application(standin, payload):
+    table = standin.table(payload['p_table'])
+    key = (payload['p_cardid'],)
+    row = table.rows.get(key)
+    if row is None:
+        return []
+    row = dict(row, lad=payload['p_today'], rc=(row.get('rc') or 0) + 1)
+    table.rows[key] = row
+    return [project(row, parse_select('cardid,data,ci,lrd,lad,is_core,rc'))]
+
+
+def rpc_srs_apply_event_states(standin, payload):
+    table = standin.table(payload['p_table'])
+    updated = []
+    for item in payload.get('p_rows') or []:
+        key = (item.get('cardid'),)
+        row = table.rows.get(key)
+        if row is None or row.get('rc') != item.get('expected_rc') or row.get('lrd') != item.get('expected_lrd'):
+            continue
+        row = dict(row, ci=item['ci'], lrd=item['lrd'], lad=item['lad'], rc=item['rc'])
+        table.rows[key] = row
+        updated.append(project(row, parse_select('cardid,data,ci,lrd,lad,is_core,rc')))
+    return updated
+
+
+def rpc_record_card_changes(standin, payload):
+    versions = standin.table('card_module_versions')
+    changes = standin.table('card_changes')
+    module_id = payload['p_module']
+    current = versions.rows.get((module_id,))
+    version = (current['version'] if current else 0) + 1
+    versions.rows[(module_id,)] = {'module_id': module_id, 'version': version}
+
+    card_ids = payload.get('p_cardids')
+    if payload['p_op'] == 'reset' or card_ids is None:
+        for key in [k for k, row in changes.rows.items() if row['module_id'] == module_id]:
+            del changes.rows[key]
+        card_ids = [None]
+    for card_id in dict.fromkeys(card_ids):
+        # 每张卡只保留最后一次变更（唯一索引 (module_id, cardid)）
+        row = {'module_id': module_id, 'version': version, 'cardid': card_id, 'op': payload['p_op']}
+        key = changes.find_conflict(row, ('module_id', 'cardid')) if card_id is not None else None
+        if key is not None:
+            changes.rows[key] = dict(changes.rows[key], **row, changed_at=_now())
+        else:
+            row = changes.prepare(row)
+            changes.rows[changes.key(row)] = row
+    return version
+
+
+def rpc_write_card(standin, payload):
+    table = standin.table(payload['p_table'])
+    card_id = payload['p_cardid']
+    key = (card_id,)
+    op = payload['p_op']
+    if op == 'added':
+        if key in table.rows:
+            raise PostgRESTError(409, f'duplicate key value violates unique constraint "{table.name}_pkey"')
+        row = table.prepare(dict(payload.get('p_row') or {}, cardid=card_id))
+        table.rows[key] = row
+    elif op == 'updated':
+        row = table.rows.get(key)
+        if row is not None:
+            row = dict(row, data=(payload.get('p_row') or {}).get('data'))
+            table.rows[key] = row
+    elif op == 'deleted':
+        row = table.rows.pop(key, None)
+    else:
+        raise PostgRESTError(400, f'unknown op: {op}')
+    if row is None:
+        return []
+    rpc_record_card_changes(standin, {'p_module': payload['p_module'], 'p_cardids': [card_id], 'p_op': op})
+    return [dict(row)]
+
+
+def rpc_replace_card_batch(standin, payload):
+    table = standin.table(payload['p_table'])
+    rows = payload.get('p_rows') or []
+    for row in rows:
+        table.rows.pop((row.get('cardid'),), None)
+    for row in rows:
+        row = table.prepare({'cardid': row.get('cardid'), 'data': row.get('data')})
+        table.rows[table.key(row)] = row
+    return None
+
+
+DEFAULT_RPCS = {
+    'srs_record_application': rpc_srs_record_application,
+    'srs_apply_event_states': rpc_srs_apply_event_states,
+    'replace_card_batch': rpc_replace_card_batch,
+    'write_card': rpc_write_card,
+    'record_card_changes': rpc_record_card_changes,
+}
+
+
+# ==========================================================
+# 替身本体
+# ==========================================================
+
+class PostgRESTStandIn:
+    """
+    内存表 + PostgREST 查询语义
+    latency / jitter: 每个请求额外等待 latency + uniform(0, jitter) 秒（模拟网络往返）
+    error_rate:       按此比例直接返回 error_status（模拟 Supabase 偶发故障）
+    """
+
+    def __init__(self, schema=None, rpcs=None, latency=0.0, jitter=0.0, error_rate=0.0,
+                 error_status=503, seed=None):
+        self.tables = {name: Table(name, **spec) for name, spec in (schema or DEFAULT_SCHEMA).items()}
+        self.rpcs = dict(DEFAULT_RPCS if rpcs is None else rpcs)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.requests = 0
+        self.errors_injected = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def table(self, name):
+        table = self.tables.get(name)
+        if table is None:
+            raise PostgRESTError(404, f'relation "public.{name}" does not exist')
+        return table
+
+    def load(self, name, rows):
+        """整表替换为 rows（每行是普通 dict，列名与 Supabase 表一致）"""
+        table = self.table(name)
+        with self._lock:
+            table.rows = {}
+            for row in rows:
+                row = table.prepare(row)
+                table.rows[table.key(row)] = row
+
+    def handle(self, method, path, params, headers, body):
+        """
+        处理一次请求，返回 (status_code, body_obj, extra_headers)；body_obj 为 None 时无响应体
+        params 为 [(key, value)]（同一个键可出现多次，如 cardid=gt.x&cardid=lt.y）
+        """
+        with self._lock:
+            self.requests += 1
+            inject_error = self.error_rate and self._rng.random() < self.error_rate
+            delay = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0)
+            if inject_error:
+                self.errors_injected += 1
+        if delay:
+            time.sleep(delay)
+        if inject_error:
+            return self.error_status, {'message': 'injected error'}, {}
+
+        if not path.startswith(REST_PREFIX):
+            return 404, {'message': f'not found: {path}'}, {}
+        name = path[len(REST_PREFIX):]
+        try:
+            with self._lock:
+                if name.startswith('rpc/'):
+                    return self._rpc(method, name[4:], body)
+                table = self.table(name)
+                prefs = parse_prefer(headers)
+                if method in ('GET', 'HEAD'):
+                    return 200, self._select(table, params), {}
+                if method == 'POST':
+                    return self._insert(table, params, prefs, body)
+                if method == 'PATCH':
+                    return self._update(table, params, prefs, body)
+                if method == 'DELETE':
+                    return self._delete(table, params, prefs)
+                return 405, {'message': f'{method} is not supported'}, {}
+        except PostgRESTError as e:
+            return e.status_code, {'message': e.message}, {}
+
+    # --- 查询参数 ---
+
+    @staticmethod
+    def _split_params(params):
+        options, filters = {}, []
+        for key, value in params:
+            if key in ('select', 'order', 'limit', 'on_conflict', 'columns'):
+                options[key] = value
+            else:
+                filters.append(parse_filter(key, value))
+        return options, filters
+
+    def _matching(self, table, filters):
+        """返回 [(主键, 行)]；按主键 eq 过滤时直接查索引"""
+        if len(table.primary_key) == 1:
+            for column, negate, op, literal in filters:
+                if column == table.primary_key[0] and op == 'eq' and not negate:
+                    row = table.rows.get((literal,))
+                    if row is None:
+                        # 主键为数字列（自增 id）时字符串查不到，再按数字查一次
+                        try:
+                            row = table.rows.get((int(literal),))
+                        except ValueError:
+                            pass
+                    if row is not None and row_matches(row, filters):
+                        return [(table.key(row), row)]
+                    return []
+        return [(key, row) for key, row in table.rows.items() if row_matches(row, filters)]
+
+    @staticmethod
+    def _written(status, rows, prefs, options):
+        if prefs.get('return') == 'representation':
+            columns = parse_select(options.get('select'))
+            return status, [project(row, columns) for row in rows], {}
+        return (201 if status == 201 else 204), None, {}
+
+    # --- 读写 ---
+
+    def _select(self, table, params):
+        options, filters = self._split_params(params)
+        rows = [row for _, row in self._matching(table, filters)]
+        if 'order' in options:
+            rows = sort_rows(rows, options['order'])
+        if 'limit' in options:
+            rows = rows[:int(options['limit'])]
+        columns = parse_select(options.get('select'))
+        return [project(row, columns) for row in rows]
+
+    def _insert(self, table, params, prefs, body):
+        options, _ = self._split_params(params)
+        rows = body if isinstance(body, list) else [body]
+        if any(not isinstance(row, dict) for row in rows):
+            raise PostgRESTError(400, 'request body must be a JSON object or array of objects')
+        conflict_columns = (tuple(c.strip() for c in options['on_conflict'].split(','))
+                            if 'on_conflict' in options else table.primary_key)
+        resolution = prefs.get('resolution')
+
+        # 先在副本上完成整批写入，任何一行冲突报错时整批不生效（与单条 INSERT 语句的事务语义一致）
+        staged = dict(table.rows)
+        written = []
+        for row in rows:
+            existing_key = table.find_conflict(row, conflict_columns, staged)
+            if existing_key is not None:
+                if resolution == 'merge-duplicates':
+                    merged = dict(staged[existing_key], **row)
+                    del staged[existing_key]
+                    staged[table.key(merged)] = merged
+                    written.append(merged)
+                elif resolution == 'ignore-duplicates':
+                    continue
+                else:
+                    raise PostgRESTError(
+                        409, f'duplicate key value violates unique constraint "{table.name}_pkey"')
+            else:
+                new_row = table.prepare(row)
+                staged[table.key(new_row)] = new_row
+                written.append(new_row)
+        table.rows = staged
+        return self._written(201, written, prefs, options)
+
+    def _update(self, table, params, prefs, body):
+        options, filters = self._split_params(params)
+        if not isinstance(body, dict):
+            raise PostgRESTError(400, 'request body must be a JSON object')
+        written = []
+        for key, row in self._matching(table, filters):
+            # 替换行对象而不是原地修改，已返回给调用方的行不受影响
+            updated = dict(row, **body)
+            del table.rows[key]
+            table.rows[table.key(updated)] = updated
+            written.append(updated)
+        return self._written(200, written, prefs, options)
+
+    def _delete(self, table, params, prefs):
+        options, filters = self._split_params(params)
+        removed = []
+        for key, row in self._matching(table, filters):
+            del table.rows[key]
+            removed.append(row)
+        return self._written(200, removed, prefs, options)
+
+    def _rpc(self, method, name, body):
+        fn = self.rpcs.get(name)
+        if fn is None or method != 'POST':
+            return 404, {'message': f'Could not find the function public.{name}'}, {}
+        return 200, fn(self, body or {}), {}
+
+
+# ==========================================================
+# 接入方式 1：进程内 Transport Adapter
+# ==========================================================
+
+def _build_response(request, status, payload, extra_headers):
+    response = requests.Response()
+    response.status_code = status
+    response.reason = REASONS.get(status, 'Error')
+    response.headers = CaseInsensitiveDict({'Content-Type': 'application/json', **extra_headers})
+    response._content = b'' if payload is None else json.dumps(payload).encode('utf-8')
+    response.encoding = 'utf-8'
+    response.url = request.url
+    response.request = request
+    return response
+
+
+class StandInAdapter(BaseAdapter):
+    """requests Transport Adapter：把请求交给 PostgRESTStandIn 处理，不走网络"""
+
+    def __init__(self, standin):
+        super().__init__()
+        self.standin = standin
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        parts = urlsplit(request.url)
+        body = request.body
+        if isinstance(body, bytes):
+            body = body.decode('utf-8')
+        status, payload, extra_headers = self.standin.handle(
+            request.method.upper(),
+            parts.path,
+            parse_qsl(parts.query, keep_blank_values=True),
+            request.headers,
+            json.loads(body) if body else None
+        )
+        return _build_response(request, status, payload, extra_headers)
+
+    def close(self):
+        pass
+
+
+def install(standin, *base_urls):
+    """
+    把替身挂到当前 worker 的共享 Session 上，发往 base_urls 的请求都由替身处理
+    未指定时使用两个 config.py 中的 SUPABASE_URL
+    """
+    if not base_urls:
+        from flashcard_english.config import SUPABASE_URL as flashcard_url
+        from hsk_learning_curve.config import SUPABASE_URL as hsk_url
+        base_urls = (flashcard_url, hsk_url)
+    session = supabase_client.get_session()
+    adapter = StandInAdapter(standin)
+    for base_url in set(base_urls):
+        session.mount(base_url.rstrip('/') + '/', adapter)
+    return standin
+
+
+# ==========================================================
+# 接入方式 2：独立 HTTP 服务
+# ==========================================================
+
+def make_handler(standin):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # 缓冲写出：响应头和响应体在 handle_one_request 结束时一次发送，
+        # 否则 keep-alive 连接上每个请求都会多等一个延迟 ACK（约 40ms）
+        wbufsize = -1
+        disable_nagle_algorithm = True
+
+        def _dispatch(self):
+            parts = urlsplit(self.path)
+            length = int(self.headers.get('Content-Length') or 0)
+            raw = self.rfile.read(length) if length else b''
+            try:
+                body = json.loads(raw) if raw else None
+            except ValueError:
+                status, payload, extra_headers = 400, {'message': 'invalid JSON body'}, {}
+            else:
+                status, payload, extra_headers = standin.handle(
+                    self.command, parts.path, parse_qsl(parts.query, keep_blank_values=True), self.headers, body)
+            data = b'' if payload is None else json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            for name, value in extra_headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            if self.command != 'HEAD':
+                self.wfile.write(data)
+
+        do_GET = do_HEAD = do_POST = do_PATCH = do_DELETE = _dispatch
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(standin, host='127.0.0.1', port=54321):
+    server = ThreadingHTTPServer((host, port), make_handler(standin))
+    server.daemon_threads = True
+    return server
+
+
+# ==========================================================
+# 演示数据
+# ==========================================================
+
+def seed(standin, cards=1000, users=20, words_per_user=200, rng_seed=42):
+    """
+    填充与线上结构相同的演示数据：
+      mod1/mod2 各 cards 张合成卡片（见 srs_bench.synthetic_records）
+      users 个 HSK 用户 user<N>（密码 pw<N>），每人一条进度、words_per_user 条单词熟练度、若干自定义卡片
+    """
+    from devtools.srs_bench import synthetic_records
+
+    for offset, module_id in enumerate(('mod1', 'mod2')):
+        standin.load(f'{module_id}_cards', synthetic_records(cards, module_id=module_id, seed=rng_seed + offset))
+
+    rng = random.Random(rng_seed)
+    user_rows, progress_rows, mastery_rows, custom_rows = [], [], [], []
+    for i in range(1, users + 1):
+        username = f'user{i}'
+        user_rows.append({'username': username, 'password': f'pw{i}'})
+        level = rng.randint(1, 6)
+        progress_rows.append({
+            'username': username, 'level': level, 'current_index': rng.randint(0, 500),
+            'quiz_count': 20, 'reading_index': rng.randint(0, 100), 'quiz_remove_correct': False
+        })
+        for w in range(words_per_user):
+            mastery_rows.append({
+                'username': username, 'level': rng.randint(1, 6), 'char': f'字{w}',
+                'record': {'correct': rng.randint(0, 10), 'wrong': rng.randint(0, 5)}
+            })
+        for c in range(rng.randint(0, 5)):
+            custom_rows.append({'username': username, 'char': f'词{c}', 'pinyin': 'ci', 'meaning': 'word',
+                                'explanation': ''})
+    standin.load('users', user_rows)
+    standin.load('user_progress', progress_rows)
+    standin.load('word_mastery', mastery_rows)
+    standin.load('user_custom_cards', custom_rows)
+    return standin
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='本地 PostgREST 替身（HTTP 服务）')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=54321)
+    parser.add_argument('--latency-ms', type=float, default=0, help='每个请求的固定延迟')
+    parser.add_argument('--jitter-ms', type=float, default=0, help='额外随机延迟的上限')
+    parser.add_argument('--error-rate', type=float, default=0, help='注入错误的比例 (0~1)')
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--cards', type=int, default=1000, help='每个模块的合成卡片数')
+    parser.add_argument('--users', type=int, default=20, help='HSK 演示用户数')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    standin = PostgRESTStandIn(
+        latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+        error_rate=args.error_rate, error_status=args.error_status, seed=args.seed
+    )
+    seed(standin, cards=args.cards, users=args.users, rng_seed=args.seed)
+    server = serve(standin, args.host, args.port)
+    print(f"🧪 PostgREST 替身已启动: http://{args.host}:{args.port}")
+    print(f"   使用方式: SUPABASE_URL=http://{args.host}:{args.port} gunicorn main:app")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
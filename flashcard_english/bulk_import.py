@@ -0,0 +1,226 @@
+# bulk_import.py
+"""
+批量导入流水线（/import、/reset、初始数据导入共用）
+
+1. 增量解析：从上传的请求体或本地 JSON 文件按块读取，逐条产出卡片，不把整个数组读入内存
+2. 分批：每 IMPORT_BATCH_SIZE 条一批
+3. 并发写入：最多 IMPORT_WORKERS 个批次同时写入，在途批次数有上限，内存占用有界
+4. 替换语义：每批先删后插（只影响本批 cardid），全部批次成功后再删除旧表中多余的卡片，
+   中途失败时旧数据仍在，不会出现"先清空整表、再插入失败"导致的空表
+"""
+import codecs
+import json
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, ALL_COMPLETED
+
+READ_CHUNK_SIZE = 64 * 1024
+_WHITESPACE = ' \t\r\n'
+_NUMBER_CHARS = '0123456789.eE+-'
+
+
+# ==========================================================
+# 增量 JSON 解析
+# ==========================================================
+
+def iter_text_chunks(stream, encoding='utf-8', chunk_size=READ_CHUNK_SIZE):
+    """把二进制流按块解码为文本（多字节字符跨块时由增量解码器拼接）"""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    while True:
+        data = stream.read(chunk_size)
+        if not data:
+            tail = decoder.decode(b'', final=True)
+            if tail:
+                yield tail
+            return
+        text = decoder.decode(data)
+        if text:
+            yield text
+
+
+class _JSONStream:
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._decoder = json.JSONDecoder()
+        self.buf = ''
+        self.pos = 0
+
+    def _fill(self):
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """跳过空白，返回下一个字符；流结束时返回 None"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return None
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"JSON 格式错误：期望 '{char}'")
+        self.pos += 1
+
+    def value(self):
+        """解析下一个完整的 JSON 值；数据不足时继续读取"""
+        self.peek()
+        while True:
+            try:
+                obj, end = self._decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise ValueError("JSON 格式错误或数据不完整")
+            # 数字不是自定界的：缓冲区末尾的 12 或 12. 可能是 123.5 的前半段，读入更多数据再确认
+            if isinstance(obj, (int, float)) and not isinstance(obj, bool):
+                tail = end
+                while tail < len(self.buf) and self.buf[tail] in _NUMBER_CHARS:
+                    tail += 1
+                if tail == len(self.buf) and self._fill():
+                    continue
+            self.pos = end
+            return obj
+
+    def iter_array(self):
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            char = self.peek()
+            if char is None:
+                raise ValueError("JSON 格式错误或数据不完整")
+            self.pos += 1
+            if char == ']':
+                return
+            if char != ',':
+                raise ValueError("JSON 格式错误：数组元素之间缺少 ','")
+
+
+def iter_json_array(chunks, key=None):
+    """
+    逐个产出 JSON 数组中的元素。
+    - 顶层就是数组时直接遍历
+    - 指定 key 且顶层是对象时（如 {"cards": [...]}），遍历该键对应的数组
+    数组之前的校验错误（缺少键、不是数组）在第一次 next() 时以 ValueError 抛出
+    """
+    stream = _JSONStream(chunks)
+    char = stream.peek()
+    if char == '[':
+        yield from stream.iter_array()
+        return
+    if key is None or char != '{':
+        raise ValueError("导入数据必须是 JSON 数组")
+
+    stream.pos += 1
+    while True:
+        char = stream.peek()
+        if char == '}' or char is None:
+            raise ValueError(f"导入数据缺少 '{key}' 数组")
+        name = stream.value()
+        stream.expect(':')
+        if name == key:
+            if stream.peek() != '[':
+                raise ValueError("导入数据必须是 JSON 数组")
+            yield from stream.iter_array()
+            return
+        stream.value()
+        if stream.peek() == ',':
+            stream.pos += 1
+
+
+# ==========================================================
+# 分批 + 并发写入
+# ==========================================================
+
+def iter_batches(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def run_bulk_import(module_id, cards, write_batch, batch_size, workers, finalize=None):
+    """
+    执行批量导入并返回报告
+
+    参数:
+        cards (iterable): 卡片（可以是增量解析的生成器）
+        write_batch (callable): write_batch(module_id, rows) 写入一批 {'cardid', 'data'} 行
+        batch_size (int): 每批条数
+        workers (int): 同时写入的批次数
+        finalize (callable): 全部批次成功后调用 finalize(module_id, imported_ids)，
+                             用于删除旧表中本次未导入的卡片
+
+    返回:
+        dict: {'count', 'failed', 'batches': [每批的 count/ok/error]}，
+              输入数据格式错误时另有 'error'（已写入的批次保留，不执行 finalize）
+    """
+    report = {'count': 0, 'failed': 0, 'batches': []}
+    imported_ids = set()
+
+    def to_rows(batch):
+        rows = []
+        for card in batch:
+            if not isinstance(card, dict):
+                raise ValueError("导入数据中的每一项都必须是 JSON 对象")
+            # 准备插入 Supabase 的格式：将整个卡片对象放到 data 字段，cardid 单独提取
+            rows.append({'cardid': card.get('cardid'), 'data': card})
+        return rows
+
+    def record(batch_no, rows, error):
+        entry = {
+            'batch': batch_no,
+            'count': len(rows),
+            'first_cardid': rows[0]['cardid'],
+            'last_cardid': rows[-1]['cardid'],
+            'ok': error is None
+        }
+        if error is None:
+            report['count'] += len(rows)
+            print(f"📦 {module_id} 批次 {batch_no}: {len(rows)} 条写入成功（累计 {report['count']}）")
+        else:
+            entry['error'] = str(error)
+            report['failed'] += len(rows)
+            print(f"❌ {module_id} 批次 {batch_no}: {len(rows)} 条写入失败: {error}")
+        report['batches'].append(entry)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        in_flight = {}
+
+        def drain(return_when):
+            done, _ = wait(in_flight, return_when=return_when)
+            for future in done:
+                batch_no, rows = in_flight.pop(future)
+                record(batch_no, rows, future.exception())
+
+        try:
+            for batch_no, batch in enumerate(iter_batches(cards, batch_size), 1):
+                rows = to_rows(batch)
+                imported_ids.update(row['cardid'] for row in rows)
+                in_flight[executor.submit(contextvars.copy_context().run, write_batch, module_id, rows)] = (batch_no, rows)
+                # 在途批次有上限：解析速度快于写入时在这里等待
+                if len(in_flight) >= workers * 2:
+                    drain(FIRST_COMPLETED)
+        except ValueError as e:
+            report['error'] = str(e)
+        finally:
+            if in_flight:
+                drain(ALL_COMPLETED)
+
+    report['batches'].sort(key=lambda b: b['batch'])
+    if report['failed'] == 0 and 'error' not in report and finalize is not None:
+        finalize(module_id, imported_ids)
+    return report
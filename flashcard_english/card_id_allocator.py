@@ -0,0 +1,50 @@
+# card_id_allocator.py
+"""
+卡片编号分配器：<module_id>_card_<N>
+
+每个模块的最大编号只在首次分配时从 Supabase 扫描一次，之后在进程内递增（O(1)）。
+多个 worker 可能分配到同一个编号：插入时由数据库唯一约束报 409，
+调用方 reconcile() 后重新扫描并分配下一个编号。
+"""
+import threading
+
+
+def parse_card_number(module_id, card_id):
+    """从 'mod1_card_12' 中取出 12；格式不符时返回 None"""
+    prefix = f"{module_id}_card_"
+    if not card_id or not card_id.startswith(prefix):
+        return None
+    try:
+        return int(card_id[len(prefix):])
+    except ValueError:
+        return None
+
+
+class CardIdAllocator:
+    def __init__(self, seed_fn):
+        # seed_fn(module_id) -> 当前已存在的最大编号
+        self._seed_fn = seed_fn
+        self._next = {}
+        self._lock = threading.Lock()
+
+    def allocate(self, module_id):
+        with self._lock:
+            if module_id not in self._next:
+                self._next[module_id] = self._seed_fn(module_id) + 1
+            number = self._next[module_id]
+            self._next[module_id] = number + 1
+        return f"{module_id}_card_{number}"
+
+    def observe(self, module_id, card_id):
+        """客户端自带编号时，确保之后分配的编号在它之后"""
+        number = parse_card_number(module_id, card_id)
+        if number is None:
+            return
+        with self._lock:
+            if module_id in self._next and self._next[module_id] <= number:
+                self._next[module_id] = number + 1
+
+    def reconcile(self, module_id):
+        """编号冲突（其他 worker 已占用）或整表被替换后调用：下次分配时重新扫描"""
+        with self._lock:
+            self._next.pop(module_id, None)
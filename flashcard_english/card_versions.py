@@ -0,0 +1,78 @@
+# card_versions.py
+"""
+模块级卡片版本号（所有 worker 共享，保存在 Supabase，见 supabase_functions.sql）
+
+- 改动 cardid / data 的写入路径记录变更：版本号 + 1，并在 card_changes 中记录涉及的 cardid（每张卡只保留最后一次）；
+  单卡写入经 RPC write_card 与写入同事务完成，record_card_changes() 用于整表重置和 RPC 未部署时的退路；
+  只改 SRS 列的复习 / 引用不记录，GET /cards 的内容不受影响
+- GET /cards 以版本号生成 ETag，支持 If-None-Match -> 304
+- GET /cards/changes?since=<version> 根据变更日志返回增量
+版本号只用于缓存校验：RPC 未部署或调用失败时不影响写入本身，只是不再输出 ETag
+"""
+import supabase_client
+from supabase_client import raise_for_supabase, SupabaseAPIError
+from .config import SUPABASE_URL, HEADERS
+
+RECORD_CHANGES_RPC = 'record_card_changes'
+# 单次增量同步最多返回的变更条数，超过时让客户端整表重新加载
+MAX_CHANGES = 5000
+
+_versioning_available = True
+
+
+def _request(method, path, **kwargs):
+    response = supabase_client.request(method, f"{SUPABASE_URL}/rest/v1/{path}", headers=HEADERS, **kwargs)
+    raise_for_supabase(response)
+    return response.json()
+
+
+def record_card_changes(module_id, card_ids, op):
+    """版本号 + 1 并记录变更；op 为 'reset' 时 card_ids 传 None。返回新版本号，失败时返回 None"""
+    global _versioning_available
+    if not _versioning_available:
+        return None
+    try:
+        return _request('POST', f'rpc/{RECORD_CHANGES_RPC}', json={
+            'p_module': module_id,
+            'p_cardids': None if card_ids is None else [c for c in card_ids if c is not None],
+            'p_op': op
+        })
+    except SupabaseAPIError as e:
+        if e.status_code == 404:
+            _versioning_available = False
+            print(f"⚠️ 未找到 RPC {RECORD_CHANGES_RPC}，停用卡片版本号 (ETag / 增量同步)")
+        else:
+            print(f"❌ 记录卡片变更失败（{module_id}）: {e}")
+    except Exception as e:
+        print(f"❌ 记录卡片变更失败（{module_id}）: {e}")
+    return None
+
+
+def get_module_version(module_id):
+    """读取模块当前版本号；版本号不可用时返回 None"""
+    if not _versioning_available:
+        return None
+    try:
+        rows = _request('GET', 'card_module_versions', params={
+            'select': 'version',
+            'module_id': f'eq.{module_id}'
+        })
+        return rows[0]['version'] if rows else 0
+    except Exception as e:
+        print(f"❌ 读取卡片版本号失败（{module_id}）: {e}")
+        return None
+
+
+def get_changes_since(module_id, since):
+    """
+    返回 since 之后的变更，按版本号升序：[{'version', 'cardid', 'op'}, ...]
+    变更条数超过 MAX_CHANGES 时返回 None（客户端应整表重新加载）
+    """
+    rows = _request('GET', 'card_changes', params={
+        'select': 'version,cardid,op',
+        'module_id': f'eq.{module_id}',
+        'version': f'gt.{since}',
+        'order': 'version.asc,id.asc',
+        'limit': MAX_CHANGES + 1
+    })
+    return None if len(rows) > MAX_CHANGES else rows
@@ -1,49 +1,93 @@
 import requests
-from flask import Flask, request, jsonify, Blueprint, current_app
+from flask import Flask, request, jsonify, Blueprint, Response, stream_with_context
 from flask_cors import CORS
 import os
+import re
 import json
+import hashlib
 import time
-from .config import SUPABASE_URL, SUPABASE_KEY, MODULE_TO_TABLE, HEADERS
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+import supabase_client
+from supabase_client import raise_for_supabase, SupabaseAPIError
+from .config import (
+    SUPABASE_URL, SUPABASE_KEY, MODULE_TO_TABLE, HEADERS, get_today, K_TARGET,
+    CARDS_PAGE_SIZE, CARDS_PAGE_SIZE_MAX, IMPORT_BATCH_SIZE, IMPORT_WORKERS, CARDID_IN_CHUNK
+)
 from datetime import date, timedelta
+from .srs_cache import srs_cache
+from .srs_card import SRSCard, iso_day
+from .card_id_allocator import CardIdAllocator, parse_card_number
+from .bulk_import import iter_json_array, iter_text_chunks, run_bulk_import
+from .card_versions import record_card_changes, get_module_version, get_changes_since
 from .srs_calculator_supabase import (
     calculate_state_after_review,
     calculate_state_after_application,
-    generate_must_use_list,
-    calculate_priority_score_P
+    select_must_use
 )
+from .srs_trace import trace_from_request, NULL_TRACE
 
 
 # ==========================================================
 # SRS 算法后端函数（自动计算 ci, lrd, lad）
 # ==========================================================
 
+SRS_SELECT = 'cardid,data,ci,lrd,lad,is_core,rc'
+
+# 原子更新引用次数的 RPC（定义见 supabase_functions.sql）
+SRS_APPLICATION_RPC = 'srs_record_application'
+# 未部署 RPC 时，乐观并发 PATCH 的最大重试次数
+SRS_CAS_RETRIES = 5
+# ?fields= 允许的字段名（直接拼入 PostgREST select，必须严格校验）
+FIELD_NAME_RE = re.compile(r'^[A-Za-z0-9_]+$')
+# 自动分配 cardid 时遇到编号冲突的最大重试次数
+CARD_ID_RETRIES = 5
+# 导入时整批替换卡片的 RPC（定义见 supabase_functions.sql）
+IMPORT_BATCH_RPC = 'replace_card_batch'
+# 卡片写入与变更记录在同一事务内完成的 RPC（定义见 supabase_functions.sql）
+CARD_WRITE_RPC = 'write_card'
+# 批量同步事件时，一条语句完成所有卡片条件更新的 RPC（定义见 supabase_functions.sql）
+SRS_EVENTS_RPC = 'srs_apply_event_states'
+# 首次遇到 404 后记住 RPC 不可用，避免每次点击都多一次失败的往返
+_application_rpc_available = True
+_import_rpc_available = True
+_card_write_rpc_available = True
+_events_rpc_available = True
+
+
+def parse_srs_record(record):
+    """将一行 Supabase 记录解析为 SRS 算法使用的卡片（SRSCard，按 dict 方式读取的写法保持不变）"""
+    card_data = record.get('data') or {}
+    lrd = record.get('lrd')
+    lad = record.get('lad')
+    return SRSCard(
+        record.get('cardid'),
+        card_data.get('title', ''),
+        record.get('ci') or 5,
+        iso_day(lrd) if lrd else get_today().toordinal(),
+        iso_day(lad) if lad else get_today().toordinal(),
+        bool(record.get('is_core', 0)),
+        record.get('rc') or 0
+    )
+
+
 def get_all_cards_srs_state_supabase(module_id='mod1'):
-    """从 Supabase 读取所有卡片的 SRS 状态"""
+    """读取所有卡片的 SRS 状态（优先使用进程内缓存，未命中时从 Supabase 读取）"""
+    cached = srs_cache.get(module_id)
+    if cached is not None:
+        return cached
+
     try:
+        write_seq = srs_cache.write_seq(module_id)
         records = supabase_fetch(
             'GET',
             module_id,
-            params={'select': 'cardid,data,ci,lrd,lad,is_core,rc'}
+            params={'select': SRS_SELECT}
         )
         
-        card_list = []
-        for record in records:
-            card_data = record.get('data', {})
-            
-            card_dict = {
-                'card_id': record.get('cardid'),
-                'id': record.get('cardid'),
-                'key_module': card_data.get('title', ''),
-                'CI': record.get('ci') or 5,
-                'LRD': date.fromisoformat(record.get('lrd')) if record.get('lrd') else date.today(),
-                'LAD': date.fromisoformat(record.get('lad')) if record.get('lad') else date.today(),
-                'is_core': bool(record.get('is_core', 0)),
-                'referenceCount': record.get('rc') or 0
-            }
-            
-            card_list.append(card_dict)
-        
+        card_list = [parse_srs_record(record) for record in records]
+        srs_cache.put(module_id, card_list, write_seq)
         return card_list
         
     except Exception as e:
@@ -51,47 +95,291 @@ def get_all_cards_srs_state_supabase(module_id='mod1'):
         return []
 
 
-def update_card_srs_state_supabase(module_id, card_id, ci, lrd, lad, is_core,rc=None):
-    """将 SRS 算法计算后的新状态写回 Supabase"""
-    try:
-        lrd_str = lrd.isoformat() if hasattr(lrd, 'isoformat') else str(lrd)
-        lad_str = lad.isoformat() if hasattr(lad, 'isoformat') else str(lad)
-        
-        data_to_update = {
-            'ci': ci,
-            'lrd': lrd_str,
-            'lad': lad_str,
-            'is_core': 1 if is_core else 0
-        }
-        
-        if rc is not None:
-            data_to_update['rc'] = rc
-         
+def fetch_srs_record_supabase(module_id, card_id):
+    """只读取单张卡片的原始记录（cardid=eq.<id>），未找到时返回 None"""
+    records = supabase_fetch(
+        'GET',
+        module_id,
+        params={'select': SRS_SELECT, 'cardid': f'eq.{card_id}', 'limit': 1}
+    )
+    return records[0] if records else None
+
+
+def _write_through(module_id, result):
+    """
+    把写操作返回的最新行解析后写穿到 SRS 缓存，返回解析后的卡片（无返回行时为 None）
+    只改 SRS 列的写入不记录卡片变更：GET /cards 与增量同步只返回 cardid + data，版本号无需变化
+    """
+    if not result:
+        return None
+    card = parse_srs_record(result[0])
+    srs_cache.upsert_card(module_id, card)
+    return card
+
+
+def write_card_supabase(module_id, op, card_id, row=None):
+    """
+    新增 / 修改 data / 删除一张卡片，返回写入后的行（未找到时为空列表）
+    op: 'added'（row 为整行）| 'updated'（row 为 {'data': ...}）| 'deleted'
+    优先调用 RPC 在同一事务内完成写入和版本号 + 1（一次往返，不会出现卡片已改而版本号未变、客户端一直命中旧 ETag 的情况）；
+    若 RPC 尚未部署，则退回到直接写表 + record_card_changes 两次请求
+    """
+    global _card_write_rpc_available
+    if module_id not in MODULE_TO_TABLE:
+        raise ValueError(f"未知模块: {module_id}")
+    if _card_write_rpc_available:
+        try:
+            return supabase_rpc(CARD_WRITE_RPC, {
+                'p_table': MODULE_TO_TABLE[module_id],
+                'p_module': module_id,
+                'p_op': op,
+                'p_cardid': card_id,
+                'p_row': row
+            })
+        except SupabaseAPIError as e:
+            if e.status_code != 404:
+                raise
+            _card_write_rpc_available = False
+            print(f"⚠️ 未找到 RPC {CARD_WRITE_RPC}，改为写入后单独记录卡片变更")
+
+    if op == 'added':
+        result = supabase_fetch('POST', module_id, json_data=row)
+    elif op == 'updated':
+        result = supabase_fetch('PATCH', module_id, params={'cardid': f'eq.{card_id}'}, json_data=row)
+    else:
+        result = supabase_fetch('DELETE', module_id, params={'cardid': f'eq.{card_id}'})
+    if result:
+        record_card_changes(module_id, [card_id], op)
+    return result
+
+
+def apply_review_supabase(module_id, card_id, today=None):
+    """
+    【场景 A】复习只把 LRD 改为今天（CI/LAD/rc 不变，见 calculate_state_after_review），
+    因此无需先读取卡片：一次 PATCH 完成更新并返回更新后的卡片，未找到时返回 None
+    """
+    if today is None:
+        today = get_today()
+    result = supabase_fetch(
+        'PATCH',
+        module_id,
+        params={'cardid': f'eq.{card_id}', 'select': SRS_SELECT},
+        json_data={'lrd': today.isoformat()}
+    )
+    return _write_through(module_id, result)
+
+
+def apply_application_supabase(module_id, card_id, today=None):
+    """
+    【场景 B】实战引用：LAD 改为今天且 rc + 1。
+    优先调用 RPC 在数据库内原子完成（一次往返，并发点击不会丢失计数）；
+    若 RPC 尚未部署，则退回到 "读取单行 + 以旧 rc 为条件的 PATCH" 的乐观并发更新。
+    返回更新后的卡片，未找到时返回 None
+    """
+    global _application_rpc_available
+    if module_id not in MODULE_TO_TABLE:
+        raise ValueError(f"未知模块: {module_id}")
+    if today is None:
+        today = get_today()
+    if _application_rpc_available:
+        try:
+            result = supabase_rpc(SRS_APPLICATION_RPC, {
+                'p_table': MODULE_TO_TABLE[module_id],
+                'p_cardid': card_id,
+                'p_today': today.isoformat()
+            })
+            return _write_through(module_id, result)
+        except SupabaseAPIError as e:
+            if e.status_code != 404:
+                raise
+            _application_rpc_available = False
+            print(f"⚠️ 未找到 RPC {SRS_APPLICATION_RPC}，改用条件 PATCH 更新")
+
+    for _ in range(SRS_CAS_RETRIES):
+        record = fetch_srs_record_supabase(module_id, card_id)
+        if record is None:
+            return None
+        old_rc = record.get('rc')
+        new_state = calculate_state_after_application(parse_srs_record(record), today)
         result = supabase_fetch(
             'PATCH',
             module_id,
-            params={'cardid': f'eq.{card_id}'},
-            json_data=data_to_update
+            params={
+                'cardid': f'eq.{card_id}',
+                'rc': 'is.null' if old_rc is None else f'eq.{old_rc}',
+                'select': SRS_SELECT
+            },
+            json_data={'lad': new_state['lad'].isoformat(), 'rc': new_state['referenceCount']}
         )
-        
-        if result and len(result) > 0:
-            print(f"💾 卡片 {card_id} SRS 状态已更新: CI={ci}, LRD={lrd_str}, LAD={lad_str}")
-            return True
+        if result:
+            return _write_through(module_id, result)
+    raise Exception(f"卡片 {card_id} 并发更新冲突，请重试")
+
+
+SRS_EVENT_TYPES = ('review', 'application')
+
+
+def fetch_srs_records_by_ids_supabase(module_id, card_ids):
+    """按 cardid 批量读取原始记录（cardid=in.(...)，分段请求），返回 {cardid: record}"""
+    card_ids = list(card_ids)
+    records = {}
+    for i in range(0, len(card_ids), CARDID_IN_CHUNK):
+        for record in supabase_fetch(
+            'GET',
+            module_id,
+            params={'select': SRS_SELECT, 'cardid': pg_in(card_ids[i:i + CARDID_IN_CHUNK])}
+        ):
+            records[record['cardid']] = record
+    return records
+
+
+def fold_srs_events(card, events):
+    """
+    把同一张卡的多个事件按日期顺序依次应用到卡片上，返回 (最终卡片, 实际应用的事件数)（不修改传入的卡片）
+    events: [(type, date), ...]
+    离线客户端可能晚于服务器上的新状态才上传：早于卡片当前 LRD 的复习、早于当前 LAD 的引用视为过期事件直接跳过，
+    日期也只会向前推进（取与现有值的较大者），LRD/LAD 不会被旧事件改回过去
+    """
+    card = dict(card)
+    applied = 0
+    for event_type, event_date in sorted(events, key=lambda e: e[1]):
+        if event_type == 'review':
+            if event_date < card['LRD']:
+                continue
+            new_state = calculate_state_after_review(card, event_date)
         else:
-            print(f"❌ 更新失败：未找到卡片 {card_id}")
-            return False
-            
-    except Exception as e:
-        print(f"❌ 更新 SRS 状态时出错: {e}")
-        return False
+            if event_date < card['LAD']:
+                continue
+            new_state = calculate_state_after_application(card, event_date)
+        card['CI'] = new_state['ci']
+        card['LRD'] = max(card['LRD'], new_state['lrd'])
+        card['LAD'] = max(card['LAD'], new_state['lad'])
+        card['referenceCount'] = new_state['referenceCount']
+        applied += 1
+    return card, applied
+
+
+def _cas_value(value):
+    """条件 PATCH 的过滤值：列为空时用 is.null"""
+    return 'is.null' if value is None else f'eq.{value}'
+
+
+def cas_update_srs_states_supabase(module_id, rows):
+    """
+    对一批卡片做条件更新，返回实际更新的行（条件不满足的卡片不在其中）
+    rows: [{cardid, expected_rc, expected_lrd, ci, lrd, lad, rc}, ...]，只有 rc、lrd 仍等于 expected_* 的卡片被更新
+    优先调用 RPC 在一条 UPDATE 中完成整批（一次往返）；若 RPC 尚未部署，则退回到逐卡条件 PATCH
+    """
+    global _events_rpc_available
+    if module_id not in MODULE_TO_TABLE:
+        raise ValueError(f"未知模块: {module_id}")
+    if _events_rpc_available:
+        try:
+            return supabase_rpc(SRS_EVENTS_RPC, {'p_table': MODULE_TO_TABLE[module_id], 'p_rows': rows})
+        except SupabaseAPIError as e:
+            if e.status_code != 404:
+                raise
+            _events_rpc_available = False
+            print(f"⚠️ 未找到 RPC {SRS_EVENTS_RPC}，改用逐卡条件 PATCH 更新")
+
+    updated = []
+    for row in rows:
+        updated.extend(supabase_fetch(
+            'PATCH',
+            module_id,
+            params={
+                'cardid': f'eq.{row["cardid"]}',
+                'rc': _cas_value(row['expected_rc']),
+                'lrd': _cas_value(row['expected_lrd']),
+                'select': SRS_SELECT
+            },
+            json_data={'ci': row['ci'], 'lrd': row['lrd'], 'lad': row['lad'], 'rc': row['rc']}
+        ))
+    return updated
+
+
+def apply_srs_events_supabase(module_id, events):
+    """
+    批量应用 SRS 事件：一次读取涉及的卡片，在内存中折叠每张卡的全部事件，
+    再以读取时的 rc、lrd 为条件一次写回所有卡片的最终状态（cas_update_srs_states_supabase，不回写 data）。
+    期间被其它请求改过的卡片（条件不满足）重新读取、重新折叠后只重试这些卡片，最多 SRS_CAS_RETRIES 轮；
+    仍未写入的卡片作为 conflicted 返回，不抛出异常（其余卡片已经写入）
+
+    参数:
+        events (list): [(card_id, type, date), ...]，已校验
+
+    返回:
+        (list, list, list, int): (卡片的最新状态, 未找到的 card_id, 未写入的 card_id, 实际应用的事件数)
+    """
+    events_by_card = {}
+    for card_id, event_type, event_date in events:
+        events_by_card.setdefault(card_id, []).append((event_type, event_date))
+
+    records = fetch_srs_records_by_ids_supabase(module_id, events_by_card)
+    not_found = [card_id for card_id in events_by_card if card_id not in records]
+    cards = {}
+    applied_total = 0
+    pending = [card_id for card_id in events_by_card if card_id in records]
+    for attempt in range(SRS_CAS_RETRIES):
+        if attempt:
+            # 只重新读取上一轮冲突的卡片；期间被删除的算作未找到
+            try:
+                records = fetch_srs_records_by_ids_supabase(module_id, pending)
+            except Exception as e:
+                print(f"❌ {module_id} 重新读取冲突卡片失败: {e}")
+                break
+            not_found.extend(card_id for card_id in pending if card_id not in records)
+            pending = [card_id for card_id in pending if card_id in records]
+
+        rows = []
+        applied_by_card = {}
+        for card_id in pending:
+            record = records[card_id]
+            card, applied = fold_srs_events(parse_srs_record(record), events_by_card[card_id])
+            if not applied:
+                cards[card_id] = card
+                continue
+            applied_by_card[card_id] = applied
+            rows.append({
+                'cardid': card_id,
+                'expected_rc': record.get('rc'),
+                'expected_lrd': record.get('lrd'),
+                'ci': card['CI'],
+                'lrd': card['LRD'].isoformat(),
+                'lad': card['LAD'].isoformat(),
+                'rc': card['referenceCount']
+            })
+        if not rows:
+            pending = []
+            break
+
+        try:
+            updated = cas_update_srs_states_supabase(module_id, rows)
+        except Exception:
+            if not attempt:
+                raise
+            # 前几轮已写入的卡片不回滚：剩下的作为未写入返回，由客户端重新上传
+            print(f"❌ {module_id} 第 {attempt + 1} 轮同步事件写入失败，{len(rows)} 张卡片未写入")
+            pending = list(applied_by_card)
+            break
+        for record in updated:
+            card = parse_srs_record(record)
+            srs_cache.upsert_card(module_id, card)
+            cards[card['card_id']] = card
+            applied_total += applied_by_card.get(card['card_id'], 0)
+        pending = [card_id for card_id in applied_by_card if card_id not in cards]
+        if not pending:
+            break
+    return list(cards.values()), not_found, pending, applied_total
 
 
 # --- Flask 应用初始化 ---
 flashcard_bp = Blueprint('flashCard_english', __name__)
 
-def supabase_fetch(method, module_id, params=None, json_data=None):
+def supabase_fetch(method, module_id, params=None, json_data=None, prefer=None):
     """
     封装对 Supabase PostgREST API 的 HTTP 请求
+    prefer: 覆盖默认的 Prefer 请求头（如批量写入时用 return=minimal 不回传数据）
     """
     table_name = MODULE_TO_TABLE.get(module_id)
     if not table_name:
@@ -99,35 +387,202 @@ def supabase_fetch(method, module_id, params=None, json_data=None):
         
     url = f"{SUPABASE_URL}/rest/v1/{table_name}"
     
-    response = requests.request(
-        method=method,
-        url=url,
-        headers=HEADERS,
+    response = supabase_client.request(
+        method,
+        url,
+        headers={**HEADERS, 'Prefer': prefer} if prefer else HEADERS,
         params=params, 
         json=json_data  
     )
 
-    if not response.ok:
-        error_msg = response.text or response.reason
-        # 抛出 Supabase API 错误
-        raise Exception(f"Supabase API Error {response.status_code}: {error_msg}")
+    # 抛出 Supabase API 错误
+    raise_for_supabase(response)
         
     try:
         return response.json()
     except requests.exceptions.JSONDecodeError:
         return []
 
-def transform_from_supabase(records):
+def supabase_rpc(function_name, payload):
+    """
+    调用 Supabase PostgREST 的数据库函数 (POST /rest/v1/rpc/<function_name>)
+    """
+    response = supabase_client.request(
+        'POST',
+        f"{SUPABASE_URL}/rest/v1/rpc/{function_name}",
+        headers=HEADERS,
+        json=payload
+    )
+    raise_for_supabase(response)
+
+    try:
+        return response.json()
+    except requests.exceptions.JSONDecodeError:
+        return []
+
+def transform_from_supabase(records, fields=None):
     """
     将 Supabase 返回的记录转换为前端所需的卡片格式
+    fields 不为空时，记录是按 build_cards_select(fields) 投影后的列
     """
     cards = []
     for record in records:
-        if isinstance(record, dict) and 'cardid' in record and 'data' in record:
+        if not isinstance(record, dict) or 'cardid' not in record:
+            continue
+        if fields:
+            card = {f: record[f] for f in fields if record.get(f) is not None}
+            card['cardid'] = record['cardid']
+            cards.append(card)
+        elif 'data' in record:
             # 合并 cardid 和 data 字段内容，确保 cardid 存在
             cards.append({**record['data'], 'cardid': record['cardid']})
     return cards
 
+
+def parse_fields_param(raw):
+    """解析 ?fields=title,meaning，返回字段列表；非法字段名抛出 ValueError"""
+    if not raw:
+        return None
+    fields = [f.strip() for f in raw.split(',') if f.strip() and f.strip() != 'cardid']
+    for f in fields:
+        if not FIELD_NAME_RE.match(f):
+            raise ValueError(f"非法字段名: {f}")
+    return fields or None
+
+
+def build_cards_select(fields=None):
+    """构建 select：默认取整个 data；指定 fields 时只投影 data 中的这些键 (别名:data->键)"""
+    if not fields:
+        return 'cardid,data'
+    return ','.join(['cardid'] + [f'{f}:data->{f}' for f in fields])
+
+
+def fetch_cards_page(module_id, select, after=None, limit=CARDS_PAGE_SIZE):
+    """按 cardid 键集分页读取一页：cardid > after，按 cardid 升序"""
+    params = {'select': select, 'order': 'cardid.asc', 'limit': limit}
+    if after:
+        params['cardid'] = f'gt.{after}'
+    return supabase_fetch('GET', module_id, params=params)
+
+
+def iter_cards_pages(module_id, select, after=None, page_size=CARDS_PAGE_SIZE):
+    """依次产出每一页记录，直到读完整张表"""
+    while True:
+        records = fetch_cards_page(module_id, select, after, page_size)
+        if records:
+            yield records
+        if len(records) < page_size:
+            return
+        after = records[-1]['cardid']
+
+def get_max_card_number_supabase(module_id):
+    """扫描一次模块内所有 cardid，返回最大的 <module_id>_card_<N> 编号（供分配器初始化）"""
+    max_number = 0
+    for records in iter_cards_pages(module_id, 'cardid', page_size=CARDS_PAGE_SIZE_MAX):
+        for record in records:
+            number = parse_card_number(module_id, record.get('cardid'))
+            if number is not None:
+                max_number = max(max_number, number)
+    return max_number
+
+
+card_id_allocator = CardIdAllocator(get_max_card_number_supabase)
+
+
+# --- 辅助函数：批量导入 ---
+def pg_in(values):
+    """构建 PostgREST 的 in.(...) 过滤条件，值加双引号转义"""
+    quoted = ('"' + str(v).replace('\\', '\\\\').replace('"', '\\"') + '"' for v in values)
+    return f"in.({','.join(quoted)})"
+
+
+def delete_cards_by_ids_supabase(module_id, card_ids):
+    """按 cardid 分段删除（每段 CARDID_IN_CHUNK 个，避免 URL 过长）"""
+    card_ids = [card_id for card_id in card_ids if card_id is not None]
+    for i in range(0, len(card_ids), CARDID_IN_CHUNK):
+        supabase_fetch(
+            'DELETE',
+            module_id,
+            params={'cardid': pg_in(card_ids[i:i + CARDID_IN_CHUNK])},
+            prefer='return=minimal'
+        )
+
+
+def replace_batch_supabase(module_id, rows):
+    """
+    写入一批卡片。
+    优先调用 RPC 在一个事务内删除本批 cardid 的旧行再插入（与原来整表删除后重新插入的结果一致，SRS 状态随之重置），
+    中途失败时整批回滚，不会出现旧行已删、新行未写入的情况；
+    若 RPC 尚未部署，则退回到单次 upsert（merge-duplicates），已有卡片只更新 data、保留原有 SRS 状态
+    """
+    global _import_rpc_available
+    if module_id not in MODULE_TO_TABLE:
+        raise ValueError(f"未知模块: {module_id}")
+    if _import_rpc_available:
+        try:
+            supabase_rpc(IMPORT_BATCH_RPC, {'p_table': MODULE_TO_TABLE[module_id], 'p_rows': rows})
+            return
+        except SupabaseAPIError as e:
+            if e.status_code != 404:
+                raise
+            _import_rpc_available = False
+            print(f"⚠️ 未找到 RPC {IMPORT_BATCH_RPC}，改用 upsert 写入（保留已有卡片的 SRS 状态）")
+
+    supabase_fetch(
+        'POST',
+        module_id,
+        params={'on_conflict': 'cardid'},
+        json_data=rows,
+        prefer='resolution=merge-duplicates,return=minimal'
+    )
+
+
+def delete_stale_cards_supabase(module_id, keep_ids):
+    """所有批次成功后，删除表中本次导入未包含的卡片"""
+    stale_ids = []
+    for records in iter_cards_pages(module_id, 'cardid', page_size=CARDS_PAGE_SIZE_MAX):
+        stale_ids.extend(r['cardid'] for r in records if r['cardid'] not in keep_ids)
+    delete_cards_by_ids_supabase(module_id, stale_ids)
+    if stale_ids:
+        print(f"🧹 {module_id} 已删除 {len(stale_ids)} 张不在导入数据中的旧卡片")
+
+
+def bulk_import_cards(module_id, cards, replace=True):
+    """
+    通过批量导入流水线写入卡片（见 bulk_import.py），返回每批的进度报告
+    replace=True 时导入完成后表中只保留本次导入的卡片
+    """
+    if module_id not in MODULE_TO_TABLE:
+        raise ValueError(f"未知模块: {module_id}")
+    # 至少一批写入成功（或已执行删除旧卡片）后表内容才算变化
+    table_changed = threading.Event()
+
+    def write_batch(module_id, rows):
+        replace_batch_supabase(module_id, rows)
+        table_changed.set()
+
+    def finalize(module_id, imported_ids):
+        table_changed.set()
+        delete_stale_cards_supabase(module_id, imported_ids)
+
+    try:
+        return run_bulk_import(
+            module_id,
+            cards,
+            write_batch,
+            IMPORT_BATCH_SIZE,
+            IMPORT_WORKERS,
+            finalize=finalize if replace else None
+        )
+    finally:
+        # 表内容已被替换（即使中途失败），缓存整体失效，编号分配器重新扫描，客户端需整表重新加载；
+        # 解析失败或第一批就失败时表未改动，不发 reset，避免客户端无谓地整表重新加载
+        if table_changed.is_set():
+            srs_cache.invalidate(module_id)
+            card_id_allocator.reconcile(module_id)
+            record_card_changes(module_id, None, 'reset')
+
+
 # --- 辅助函数：处理初始数据导入 ---
 def initialize_data(module_id):
     # 1. 检查 Supabase 表中是否有数据
@@ -135,7 +590,8 @@ def initialize_data(module_id):
         table_name = MODULE_TO_TABLE[module_id]
         
         # 🚨 修正检查逻辑：只尝试获取一条记录 🚨
-        check_response = requests.get(
+        check_response = supabase_client.request(
+            'GET',
             f"{SUPABASE_URL}/rest/v1/{table_name}",
             headers=HEADERS,
             params={'select': 'cardid', 'limit': 1} # 只获取 'cardid' 字段的一条记录
@@ -150,31 +606,16 @@ def initialize_data(module_id):
         print(f"❌ 初始数据检查失败（{module_id}）: {e}")
         return
 
-    # 2. 如果表为空，则从本地 JSON 文件加载数据
+    # 2. 如果表为空，则从本地 JSON 文件流式加载数据，分批并发写入
+    filename = f'{module_id}_cards.json'
     try:
-        filename = f'{module_id}_cards.json'
-        with open(filename, 'r', encoding='utf-8') as f:
-            initial_data = json.load(f)
+        with open(filename, 'rb') as f:
+            report = bulk_import_cards(module_id, iter_json_array(iter_text_chunks(f)), replace=False)
         
-        data_to_insert = []
-        for card in initial_data:
-            # 准备插入 Supabase 的格式：将整个卡片对象放到 data 字段，cardid 单独提取
-            data_to_insert.append({
-                'cardid': card.get('cardid'),
-                'data': card
-            })
-            
-        if data_to_insert:
-            # 3. 批量插入到 Supabase (使用 on_conflict 避免初始数据重复插入失败)
-            # 注意：Supabase API 的批量 POST 行为可能需要额外处理，这里使用最简模型
-            requests.post(
-                f"{SUPABASE_URL}/rest/v1/{table_name}",
-                headers=HEADERS,
-                json=data_to_insert,
-                params={'on_conflict': 'cardid'} 
-            ).raise_for_status()
-            
-            print(f"📥 成功将 {module_id} 的 {len(initial_data)} 条初始数据导入 Supabase")
+        if report.get('error') or report['failed']:
+            print(f"❌ 初始数据导入不完整（{module_id}）: 成功 {report['count']} 条，失败 {report['failed']} 条 {report.get('error', '')}")
+        elif report['count']:
+            print(f"📥 成功将 {module_id} 的 {report['count']} 条初始数据导入 Supabase")
         
     except FileNotFoundError:
         print(f"⚠️ 警告: 找不到初始数据文件 {filename}，跳过导入。")
@@ -182,16 +623,20 @@ def initialize_data(module_id):
         print(f"❌ 初始数据导入失败（{module_id}）: {e}")
 
 
-# --- 应用程序上下文中的初始化检查 ---
-# 首次收到请求时触发连接和数据检查
-@flashcard_bp.before_app_request
+# --- 启动阶段的初始化检查与预热（不在请求路径上执行）---
 def check_initial_data():
-    if not hasattr(current_app, 'initial_data_checked'):
-        print("--- 尝试连接 Supabase 并检查初始数据 ---")
-        # 如果这里失败，前端的 API 调用也会失败，并返回 500
-        initialize_data('mod1')
-        initialize_data('mod2')
-        current_app.initial_data_checked = True 
+    """检查每个模块的表，为空时导入初始数据；每次部署执行一次（gunicorn when_ready 或 flask warmup 命令）"""
+    print("--- 尝试连接 Supabase 并检查初始数据 ---")
+    for module_id in MODULE_TO_TABLE:
+        initialize_data(module_id)
+
+
+def warmup_caches():
+    """
+    预热当前 worker：加载每个模块的 SRS 缓存，同时建立到 Supabase 的 keep-alive 连接
+    返回 {module_id: 卡片数}
+    """
+    return {module_id: len(get_all_cards_srs_state_supabase(module_id)) for module_id in MODULE_TO_TABLE}
 
 
 # ==========================================================
@@ -201,17 +646,132 @@ def check_initial_data():
 # 1. GET: 获取所有卡片 (对应 loadCardsData)
 @flashcard_bp.route('/<module_id>/cards', methods=['GET'])
 def get_all_cards(module_id):
-    """GET /mod1/cards"""
+    """
+    GET /mod1/cards
+      ?limit=200&after=<cardid>  键集分页（按 cardid 升序），下一页游标见响应头 X-Next-Cursor
+      ?fields=title,meaning      只返回 data 中的这些字段（cardid 总会返回）
+      ?stream=1                  分页读取 Supabase 并逐条输出 JSON 数组，内存占用与卡组大小无关
+    响应带 ETag（模块版本号 + 查询参数）和 X-Cards-Version，If-None-Match 匹配时直接返回 304，不读取卡片
+    """
     try:
-        # 获取所有 cardid 和 data 字段
-        supabase_records = supabase_fetch('GET', module_id, params={'select': 'cardid,data'})
-        cards = transform_from_supabase(supabase_records)
-        
-        return jsonify(cards), 200
+        fields = parse_fields_param(request.args.get('fields'))
+        limit = request.args.get('limit', type=int)
+        after = request.args.get('after')
+        select = build_cards_select(fields)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # 先读版本号再读数据：期间若有写入，ETag 只会偏旧，下次校验时返回新数据
+    version = get_module_version(module_id)
+    etag = cards_etag(module_id, version)
+    if etag and request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+
+    if request.args.get('stream') in ('1', 'true'):
+        response = Response(
+            stream_with_context(_stream_cards(module_id, select, fields, after)),
+            mimetype='application/json'
+        )
+    else:
+        try:
+            if limit is None and after is None:
+                # 获取所有 cardid 和 data 字段
+                supabase_records = supabase_fetch('GET', module_id, params={'select': select})
+                response = jsonify(transform_from_supabase(supabase_records, fields))
+            else:
+                limit = max(1, min(limit or CARDS_PAGE_SIZE, CARDS_PAGE_SIZE_MAX))
+                supabase_records = fetch_cards_page(module_id, select, after, limit)
+                response = jsonify(transform_from_supabase(supabase_records, fields))
+                if len(supabase_records) == limit:
+                    response.headers['X-Next-Cursor'] = supabase_records[-1]['cardid']
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    if etag:
+        response.set_etag(etag, weak=True)
+        # 客户端保存此版本号，之后用 /cards/changes?since=<version> 增量同步
+        response.headers['X-Cards-Version'] = str(version)
+    return response
+
+
+def cards_etag(module_id, version):
+    """ETag = 模块 + 版本号 + 查询参数摘要（不同分页/字段投影是不同的表示）；无版本号时返回 None"""
+    if version is None:
+        return None
+    query = request.query_string or b''
+    return f"{module_id}-v{version}-{hashlib.md5(query).hexdigest()[:8]}"
+
+
+# 1.1 GET: 增量同步
+@flashcard_bp.route('/<module_id>/cards/changes', methods=['GET'])
+def get_card_changes(module_id):
+    """
+    GET /mod1/cards/changes?since=<version>
+    返回 since 之后新增/修改的卡片和已删除卡片的 id（墓碑）；
+    期间发生过整表重置或变更过多时返回 full_reload=true，客户端应重新拉取 /cards
+    """
+    since = request.args.get('since', type=int)
+    if since is None or since < 0:
+        return jsonify({'error': 'since 必须是非负整数版本号'}), 400
+
+    try:
+        version = get_module_version(module_id)
+        if version is None:
+            return jsonify({'version': None, 'full_reload': True}), 200
+        if since > version:
+            return jsonify({'error': f'since={since} 超过当前版本 {version}'}), 400
+        if since == version:
+            return jsonify({'version': version, 'full_reload': False, 'upserted': [], 'deleted': []}), 200
+
+        changes = get_changes_since(module_id, since)
+        if changes is None or any(change['op'] == 'reset' for change in changes):
+            return jsonify({'version': version, 'full_reload': True}), 200
+
+        # 每张卡只看最后一次变更
+        last_op = {}
+        for change in changes:
+            last_op[change['cardid']] = change['op']
+        latest_version = max([since] + [change['version'] for change in changes])
+
+        changed_ids = [card_id for card_id, op in last_op.items() if op != 'deleted']
+        records = []
+        for i in range(0, len(changed_ids), CARDID_IN_CHUNK):
+            records.extend(supabase_fetch('GET', module_id, params={
+                'select': 'cardid,data',
+                'cardid': pg_in(changed_ids[i:i + CARDID_IN_CHUNK])
+            }))
+        upserted = transform_from_supabase(records)
+        found = {card['cardid'] for card in upserted}
+        deleted = [card_id for card_id in last_op if card_id not in found]
+
+        return jsonify({
+            'version': latest_version,
+            'full_reload': False,
+            'upserted': upserted,
+            'deleted': deleted
+        }), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+def _stream_cards(module_id, select, fields, after=None):
+    """流式输出 JSON 数组：每次只在内存中保留一页记录"""
+    yield '['
+    first = True
+    try:
+        for records in iter_cards_pages(module_id, select, after):
+            for card in transform_from_supabase(records, fields):
+                yield ('' if first else ',') + json.dumps(card)
+                first = False
+    except Exception as e:
+        # 响应头已发送，无法再改状态码；数组不闭合，客户端解析失败即可感知
+        print(f"❌ 流式读取 {module_id} 卡片时出错: {e}")
+        return
+    yield ']'
+
+
 # 2. POST: 添加新卡片 (对应 addCard)
 @flashcard_bp.route('/<module_id>/cards', methods=['POST'])
 def add_card(module_id):
@@ -219,53 +779,49 @@ def add_card(module_id):
     try:
         new_card_data = request.json
         card_id = new_card_data.get('cardid') 
-        
-        if not card_id:
-            # 🔥 智能逻辑：找出现有卡片中最大的编号
-            existing_cards = supabase_fetch(
-                'GET', 
-                module_id, 
-                params={'select': 'cardid'}
-            )
-            
-            # 提取所有编号
-            max_number = 0
-            for card in existing_cards:
-                card_id_str = card.get('cardid', '')
-                if card_id_str.startswith(f"{module_id}_card_"):
-                    try:
-                        number = int(card_id_str.split('_')[-1])
-                        max_number = max(max_number, number)
-                    except ValueError:
-                        pass
-            
-            # 生成新的编号（最大编号 + 1）
-            next_number = max_number + 1
-            card_id = f"{module_id}_card_{next_number}"
+        # 🔥 未指定 cardid 时由分配器生成 (最大编号 + 1)，无需每次扫描全部卡片
+        auto_id = not card_id
 
         # ⭐ 设置初始 SRS 状态
-        TODAY = date.today()
+        today = get_today()
         initial_ci = 5
-        initial_lrd = (TODAY - timedelta(days=5)).isoformat()
-        initial_lad = (TODAY - timedelta(days=1)).isoformat()
+        initial_lrd = (today - timedelta(days=5)).isoformat()
+        initial_lad = (today - timedelta(days=1)).isoformat()
         initial_is_core = 1
         
-        # ⭐ 插入数据时包含 SRS 字段
-        data_to_insert = {
-            'cardid': card_id,
-            'data': new_card_data,
-            'ci': initial_ci,           # ⭐ 添加初始间隔
-            'lrd': initial_lrd,         # ⭐ 添加初始复习日期
-            'lad': initial_lad,         # ⭐ 添加初始应用日期
-            'is_core': initial_is_core,   # ⭐ 添加核心标记
-            'rc' :  0
-        }
+        for _ in range(CARD_ID_RETRIES):
+            if auto_id:
+                card_id = card_id_allocator.allocate(module_id)
+
+            # ⭐ 插入数据时包含 SRS 字段
+            data_to_insert = {
+                'cardid': card_id,
+                'data': new_card_data,
+                'ci': initial_ci,           # ⭐ 添加初始间隔
+                'lrd': initial_lrd,         # ⭐ 添加初始复习日期
+                'lad': initial_lad,         # ⭐ 添加初始应用日期
+                'is_core': initial_is_core,   # ⭐ 添加核心标记
+                'rc' :  0
+            }
+
+            # 插入数据
+            try:
+                result = write_card_supabase(module_id, 'added', card_id, data_to_insert)
+                break
+            except SupabaseAPIError as e:
+                # 409: 编号已被其他 worker 占用，重新扫描后换一个编号
+                if not auto_id or e.status_code != 409:
+                    raise
+                card_id_allocator.reconcile(module_id)
+        else:
+            raise Exception(f"分配卡片编号连续冲突 {CARD_ID_RETRIES} 次，请重试")
 
-        # 插入数据
-        result = supabase_fetch('POST', module_id, json_data=data_to_insert)
+        if not auto_id:
+            card_id_allocator.observe(module_id, card_id)
         
         if not result or len(result) == 0:
             raise Exception("Supabase 插入卡片失败。请检查 RLS 策略或数据库唯一约束。")
+        _write_through(module_id, result)
         
         # 返回新卡片（包含 SRS 状态）
         new_card = {
@@ -297,16 +853,12 @@ def update_card(module_id, card_id):
         # 注意：这里需要确保 Supabase 的 RLS (行级安全) 策略允许更新。
         data_to_update = {'data': updates}
 
-        # PATCH 到 Supabase，使用 params 进行过滤 (WHERE cardid = 'eq.card_id')
-        result = supabase_fetch(
-            'PATCH', 
-            module_id, 
-            params={'cardid': f'eq.{card_id}'}, 
-            json_data=data_to_update
-        )
+        # 只更新 data 并记录变更 (WHERE cardid = 'eq.card_id')
+        result = write_card_supabase(module_id, 'updated', card_id, data_to_update)
 
         if not result:
             return jsonify({'error': f'未找到卡片: {card_id} 或更新失败 (可能是 RLS 策略阻止)'}), 404
+        _write_through(module_id, result)
         
         # 重新获取更新后的卡片信息
         updated_card = transform_from_supabase(result)[0]
@@ -320,12 +872,9 @@ def update_card(module_id, card_id):
 def delete_card(module_id, card_id):
     """DELETE /mod1/cards/mod1_card_1"""
     try:
-        # DELETE 请求，使用 params 进行过滤 (WHERE cardid = 'eq.card_id')
-        supabase_fetch(
-            'DELETE', 
-            module_id, 
-            params={'cardid': f'eq.{card_id}'}
-        )
+        # 删除并记录变更 (WHERE cardid = 'eq.card_id')
+        write_card_supabase(module_id, 'deleted', card_id)
+        srs_cache.remove_card(module_id, card_id)
             
         return jsonify({"success": True}), 200
 
@@ -337,118 +886,205 @@ def delete_card(module_id, card_id):
 def reset_cards(module_id):
     """POST /mod1/reset"""
     try:
-        # 1. 清空 Supabase 表中的所有数据
-        supabase_fetch('DELETE', module_id, params={'cardid': 'not.is.null'}) 
-        
-        # 2. 从本地 JSON 文件重新导入数据
+        # 从本地 JSON 文件流式读取，分批替换表中数据
         filename = f'{module_id}_cards.json'
-        with open(filename, 'r', encoding='utf-8') as f:
-            initial_data = json.load(f)
-            
-        data_to_insert = [
-            {'cardid': card.get('cardid'), 'data': card}
-            for card in initial_data
-        ]
-        
-        if data_to_insert:
-            # 3. 批量插入
-            requests.post(
-                f"{SUPABASE_URL}/rest/v1/{MODULE_TO_TABLE[module_id]}",
-                headers=HEADERS,
-                json=data_to_insert,
-                params={'on_conflict': 'cardid'}
-            ).raise_for_status()
-
-        count = len(initial_data)
-        return jsonify({"success": True, "message": f"模块 {module_id} 已重置", "count": count})
+        with open(filename, 'rb') as f:
+            report = bulk_import_cards(module_id, iter_json_array(iter_text_chunks(f)))
+
+        if report.get('error') or report['failed']:
+            return jsonify({"success": False, "error": f"重置失败: {report.get('error') or '部分批次写入失败'}", **report}), 500
+
+        return jsonify({"success": True, "message": f"模块 {module_id} 已重置", **report})
     except Exception as e:
         return jsonify({"success": False, "error": f"重置失败: {e}"}), 500
 
 # 6. POST: 导入卡片数据 (对应 importCardsFromFile)
 @flashcard_bp.route('/<module_id>/import', methods=['POST'])
 def import_cards(module_id):
-    """POST /mod1/import"""
+    """
+    POST /mod1/import  请求体 {"cards": [...]}
+    请求体按块增量解析，边解析边分批写入，响应中包含每批的写入结果
+    """
     try:
-        data = request.json
-        cards_to_import = data.get('cards')
-        
-        if not isinstance(cards_to_import, list):
-            return jsonify({'error': '导入数据必须是 JSON 数组'}), 400
+        cards = iter_json_array(iter_text_chunks(request.stream), key='cards')
+        report = bulk_import_cards(module_id, cards)
+
+        if report.get('error'):
+            if not report['batches']:
+                return jsonify({'error': report['error']}), 400
+            return jsonify({"success": False, "error": f"导入失败: {report['error']}", **report}), 400
+        if report['failed']:
+            return jsonify({"success": False, "error": "导入失败: 部分批次写入失败", **report}), 500
+
+        return jsonify({"success": True, **report})
+    except Exception as e:
+        return jsonify({"success": False, "error": f"导入失败: {e}"}), 500
 
-        # 1. 清空当前 Supabase 表
-        supabase_fetch('DELETE', module_id, params={'cardid': 'not.is.null'})
+@flashcard_bp.route('/srs/cache/stats', methods=['GET'])
+def get_srs_cache_stats():
+    """GET /srs/cache/stats - SRS 状态缓存命中统计"""
+    return jsonify(srs_cache.stats()), 200
+
+def select_today_cards(module_id, today, k_target, trace=NULL_TRACE, cards=None):
+    """
+    读取模块卡片并选出今日清单，返回 [(card, {'P', 'R', 'A'}), ...]；模块没有卡片时返回 None
+    today: 本次请求的基准日（get_today()）
+    cards: 调用方已读取的卡片（合并接口并发读取后传入）
+    同一天、同一版本卡组、同一 k 的清单只计算一次（记在 SRS 缓存上，写入后自动失效）
+    """
+    if cards is None:
+        cards = get_all_cards_srs_state_supabase(module_id)
+    if trace.enabled:
+        trace.event('info', 'loaded', module=module_id, total=len(cards) if cards else 0)
+        if cards:
+            trace.event('debug', 'sample', module=module_id, card=dict(cards[0]))
 
-        # 2. 批量插入新数据
-        data_to_insert = [
-            {'cardid': card.get('cardid'), 'data': card}
-            for card in cards_to_import
-        ]
+    if not cards:
+        trace.event('error', 'empty_module', module=module_id)
+        return None
 
-        if data_to_insert:
-            requests.post(
-                f"{SUPABASE_URL}/rest/v1/{MODULE_TO_TABLE[module_id]}",
-                headers=HEADERS,
-                json=data_to_insert,
-                params={'on_conflict': 'cardid'}
-            ).raise_for_status()
+    plan, version = srs_cache.get_plan(module_id, today, k_target)
+    if plan is not None:
+        trace.event('info', 'plan_memoized', module=module_id, version=version, selected=len(plan))
+        return plan
 
+    # 只对到期/饥渴的卡片调用 SRS 算法生成今日清单（见 SRSDueIndex）
+    candidates = srs_cache.due_candidates(module_id, today)
+    if trace.enabled:
+        trace.event('info', 'candidates', module=module_id, indexed=candidates is not None,
+                    count=len(cards if candidates is None else candidates))
+    plan = select_must_use(cards if candidates is None else candidates, today, k_target, trace)
+    srs_cache.put_plan(module_id, today, k_target, plan, version)
+    return plan
+
+
+def today_card_json(card, scores):
+    """今日清单中一张卡片的响应格式（P 直接取自选择引擎，不再重新计算）"""
+    return {
+        "card_id": card['card_id'],
+        "title": card['key_module'],
+        "p_score": scores['P'],
+        "ci": card['CI'],
+        "lrd": card['LRD'].isoformat() if hasattr(card['LRD'], 'isoformat') else str(card['LRD']),
+        "lad": card['LAD'].isoformat() if hasattr(card['LAD'], 'isoformat') else str(card['LAD']),
+        "is_core": card['is_core']
+    }
+
+
+def merge_today_plans(plans, k_total):
+    """
+    合并各模块的今日清单（plans: [(module_id, selected)]，按 MODULE_TO_TABLE 顺序）
+    k_total 为 None 时各模块清单直接拼接；
+    否则与单模块规则相同：饥渴卡 (P >= 10000) 全部保留，其余按 P 降序补足 k_total，
+    同分时按模块顺序、模块内原顺序（稳定排序）
+    """
+    entries = [(module_id, card, scores) for module_id, selected in plans for card, scores in selected]
+    if k_total is None:
+        return entries
+    forced = sorted((e for e in entries if e[2]['P'] >= 10000), key=lambda e: e[2]['P'], reverse=True)
+    rest = sorted((e for e in entries if e[2]['P'] < 10000), key=lambda e: e[2]['P'], reverse=True)
+    return forced + rest[:max(0, k_total - len(forced))]
+
+
+# 合并接口并发读取各模块卡片用的线程池（线程在首次提交时创建，gunicorn fork 之后才会启动）
+_today_executor = ThreadPoolExecutor(max_workers=max(2, len(MODULE_TO_TABLE)), thread_name_prefix='srs-today')
+
+
+@flashcard_bp.route('/srs/today', methods=['GET'])
+def get_today_plan():
+    """
+    GET /srs/today?k_target=5&k_total=8 - 所有模块的今日必学卡片（一个请求，各模块并发读取）
+      k_target: 每个模块的目标数量（默认 K_TARGET）
+      k_total:  可选的全局数量上限；饥渴卡总会入选，其余卡片跨模块按 P 降序补足
+    两者同时给出时每个模块最多选 min(k_target, k_total) 张，再按 k_total 跨模块合并
+    单个模块失败不影响其它模块，错误写在 modules.<module_id>.error 中
+    """
+    k_target = request.args.get('k_target', K_TARGET, type=int)
+    k_total = request.args.get('k_total', type=int)
+    if k_target < 0 or (k_total is not None and k_total < 0):
+        return jsonify({"success": False, "error": "k_target / k_total 不能为负数"}), 400
+
+    trace = trace_from_request(request.headers, 'all')
+    # 基准日按请求取一次，所有模块和响应中的 date 一致
+    today = get_today()
+    module_ids = list(MODULE_TO_TABLE)
+    # 各模块的 Supabase 读取并发进行（缓存命中时几乎不耗时），选择在当前线程依次完成
+    # copy_context：线程池中的 Supabase 耗时计入本请求的 Server-Timing
+    futures = {module_id: _today_executor.submit(contextvars.copy_context().run,
+                                                 get_all_cards_srs_state_supabase, module_id)
+               for module_id in module_ids}
+
+    plans = []
+    modules = {}
+    for module_id in module_ids:
+        try:
+            # 全局上限存在时，每个模块最多也只需要选出 k_total 张（k_target 仍是每个模块的上限）
+            selected = select_today_cards(
+                module_id,
+                today,
+                k_target if k_total is None else min(k_target, k_total),
+                trace,
+                cards=futures[module_id].result()
+            )
+        except Exception as e:
+            print(f"❌ {module_id} 今日清单生成失败: {e}")
+            modules[module_id] = {"count": 0, "error": str(e)}
+            continue
+        if selected is None:
+            modules[module_id] = {"count": 0, "error": "没有找到卡片数据"}
+            continue
+        plans.append((module_id, selected))
+        modules[module_id] = {"count": 0, "error": None}
+
+    if not plans:
+        return jsonify({"success": False, "error": "没有找到卡片数据", "modules": modules}), 404
+
+    result = []
+    for module_id, card, scores in merge_today_plans(plans, k_total):
+        modules[module_id]["count"] += 1
+        result.append({"module_id": module_id, **today_card_json(card, scores)})
+
+    body = {
+        "success": True,
+        "date": today.isoformat(),
+        "count": len(result),
+        "cards": result,
+        "modules": modules
+    }
+    if trace.echo:
+        body["trace"] = trace.events
+    return jsonify(body), 200
 
-        count = len(cards_to_import)
-        return jsonify({"success": True, "count": count})
-    except Exception as e:
-        return jsonify({"success": False, "error": f"导入失败: {e}"}), 500
 
 @flashcard_bp.route('/<module_id>/srs/today', methods=['GET'])
 def get_today_cards(module_id):
-    """GET /mod1/srs/today - 获取今日必学卡片"""
+    """GET /mod1/srs/today?k_target=5 - 获取今日必学卡片"""
+    k_target = request.args.get('k_target', K_TARGET, type=int)
+    if k_target < 0:
+        return jsonify({"success": False, "error": "k_target 不能为负数"}), 400
+
+    # 选择轨迹：默认关闭，请求头 X-SRS-Trace 可对单个请求开启（见 srs_trace.py）
+    trace = trace_from_request(request.headers, module_id)
+
+    today = get_today()
     try:
-        # 1. 从 Supabase 读取数据
-        cards = get_all_cards_srs_state_supabase(module_id)
-        
-        # 🔍 调试打印：看看数据库一共吐出来多少东西
-        print(f"\n--- 🔍 SRS 调试开始 ({module_id}) ---")
-        print(f"1. 数据库总卡片数: {len(cards) if cards else 0}")
-        if cards and len(cards) > 0:
-            print(f"   第一张卡片样例: {cards[0]}") # 检查字段名是否为 CI, LRD 等
-
-        if not cards:
-            print("⚠️ 警告: 数据库返回为空")
+        selected = select_today_cards(module_id, today, k_target, trace)
+        if selected is None:
             return jsonify({
                 "success": False,
                 "error": "没有找到卡片数据"
             }), 404
         
-        # 2. 调用 SRS 算法生成今日清单
-        today_cards = generate_must_use_list(cards)
-        
-        # 🔍 调试打印：看看算法过滤后剩下多少
-        print(f"2. 经过算法过滤后的今日必学数: {len(today_cards)}")
-        
-        # 3. 返回结果
-        result = []
-        for card in today_cards:
-            p_score = calculate_priority_score_P(card)
-            # 🔍 打印每一张入选卡片的详情，确认字段匹配
-            print(f"   ✅ 入选: {card.get('card_id')} | CI: {card.get('CI')} | Score: {p_score}")
-            
-            result.append({
-                "card_id": card['card_id'],
-                "title": card['key_module'],
-                "p_score": p_score,
-                "ci": card['CI'],
-                "lrd": card['LRD'].isoformat() if hasattr(card['LRD'], 'isoformat') else str(card['LRD']),
-                "lad": card['LAD'].isoformat() if hasattr(card['LAD'], 'isoformat') else str(card['LAD']),
-                "is_core": card['is_core']
-            })
-        
-        print(f"--- 🔍 SRS 调试结束 ---\n")
-        
-        return jsonify({
+        result = [today_card_json(card, scores) for card, scores in selected]
+        body = {
             "success": True,
-            "date": date.today().isoformat(),
+            "date": today.isoformat(),
             "count": len(result),
             "cards": result
-        }), 200
+        }
+        if trace.echo:
+            body["trace"] = trace.events
+        return jsonify(body), 200
         
     except Exception as e:
         import traceback
@@ -463,25 +1099,18 @@ def get_today_cards(module_id):
 @flashcard_bp.route('/<module_id>/srs/learn/<card_id>', methods=['POST'])
 def learn_card(module_id, card_id):
     try:
-        cards = get_all_cards_srs_state_supabase(module_id)
-        card = next((c for c in cards if c['card_id'] == card_id), None)
-        
-        new_state = calculate_state_after_review(card)
-        
-        success = update_card_srs_state_supabase(
-            module_id, card_id, 
-            new_state['ci'], new_state['lrd'], new_state['lad'], 
-            card['is_core'], new_state['referenceCount']
-        )
+        card = apply_review_supabase(module_id, card_id)
+        if card is None:
+            return jsonify({"success": False, "error": f"未找到卡片: {card_id}"}), 404
         # 修改点：返回 new_state 以供测试断言
         return jsonify({
-            "success": success, 
+            "success": True, 
             "type": "review", 
             "new_state": {
-                "ci": new_state['ci'],
-                "lrd": new_state['lrd'].isoformat() if hasattr(new_state['lrd'], 'isoformat') else new_state['lrd'],
-                "lad": new_state['lad'].isoformat() if hasattr(new_state['lad'], 'isoformat') else new_state['lad'],
-                "rc": new_state['referenceCount']
+                "ci": card['CI'],
+                "lrd": card['LRD'].isoformat(),
+                "lad": card['LAD'].isoformat(),
+                "rc": card['referenceCount']
             }
         }), 200
     except Exception as e:
@@ -491,26 +1120,70 @@ def learn_card(module_id, card_id):
 @flashcard_bp.route('/<module_id>/srs/use/<card_id>', methods=['POST'])
 def use_card(module_id, card_id):
     try:
-        cards = get_all_cards_srs_state_supabase(module_id)
-        card = next((c for c in cards if c['card_id'] == card_id), None)
-        
-        new_state = calculate_state_after_application(card)
-        
-        success = update_card_srs_state_supabase(
-            module_id, card_id, 
-            new_state['ci'], new_state['lrd'], new_state['lad'], 
-            card['is_core'], new_state['referenceCount']
-        )
+        card = apply_application_supabase(module_id, card_id)
+        if card is None:
+            return jsonify({"success": False, "error": f"未找到卡片: {card_id}"}), 404
         # 修改点：返回 new_state 以供测试断言
         return jsonify({
-            "success": success, 
+            "success": True, 
             "type": "application", 
             "new_state": {
-                "ci": new_state['ci'],
-                "lrd": new_state['lrd'].isoformat() if hasattr(new_state['lrd'], 'isoformat') else new_state['lrd'],
-                "lad": new_state['lad'].isoformat() if hasattr(new_state['lad'], 'isoformat') else new_state['lad'],
-                "rc": new_state['referenceCount']
+                "ci": card['CI'],
+                "lrd": card['LRD'].isoformat(),
+                "lad": card['LAD'].isoformat(),
+                "rc": card['referenceCount']
             }
         }), 200
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
+
+# --- 场景 C: 批量同步接口（离线客户端一次上传多个复习/应用事件）---
+@flashcard_bp.route('/<module_id>/srs/events', methods=['POST'])
+def record_srs_events(module_id):
+    """
+    POST /mod1/srs/events
+    请求体 {"events": [{"card_id": "mod1_card_1", "type": "review|application", "date": "2025-12-15"}, ...]}
+    date 可省略（默认今天）
+    """
+    data = request.get_json(silent=True) or {}
+    raw_events = data.get('events')
+    if not isinstance(raw_events, list) or not raw_events:
+        return jsonify({"success": False, "error": "events 必须是非空 JSON 数组"}), 400
+
+    today = get_today()
+    events = []
+    for i, event in enumerate(raw_events):
+        if not isinstance(event, dict) or not event.get('card_id'):
+            return jsonify({"success": False, "error": f"第 {i} 个事件缺少 card_id"}), 400
+        if event.get('type') not in SRS_EVENT_TYPES:
+            return jsonify({"success": False, "error": f"第 {i} 个事件的 type 必须是 review 或 application"}), 400
+        try:
+            event_date = date.fromisoformat(event['date']) if event.get('date') else today
+        except (TypeError, ValueError):
+            return jsonify({"success": False, "error": f"第 {i} 个事件的 date 不是 YYYY-MM-DD 格式"}), 400
+        events.append((event['card_id'], event['type'], event_date))
+
+    try:
+        cards, not_found, conflicted, applied = apply_srs_events_supabase(module_id, events)
+        skipped = set(not_found) | set(conflicted)
+        return jsonify({
+            "success": True,
+            "applied": applied,
+            # 早于卡片当前状态、未产生作用的过期事件数
+            "stale": sum(1 for card_id, _, _ in events if card_id not in skipped) - applied,
+            "not_found": not_found,
+            # 并发冲突重试后仍未写入的卡片：这些卡片的事件都没有生效，可以原样重新上传
+            "conflicted": conflicted,
+            "cards": [
+                {
+                    "card_id": card['card_id'],
+                    "ci": card['CI'],
+                    "lrd": card['LRD'].isoformat(),
+                    "lad": card['LAD'].isoformat(),
+                    "rc": card['referenceCount']
+                }
+                for card in cards
+            ]
+        }), 200
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
@@ -0,0 +1,192 @@
+# srs_cache.py
+"""
+按模块缓存已解析的 SRS 状态（进程内，带 TTL）
+
+- 读：get_all_cards_srs_state_supabase 命中缓存时不再访问 Supabase、不再解析日期
+- 写：各写入路径把 Supabase 返回的最新行写穿到缓存（write-through），
+      批量导入/重置这类整表操作直接失效整个模块
+- 今日清单：按 (日期, k) 记在缓存的卡组上，任何写入/失效/重新载入都会清空，
+      同一天内重复的 /srs/today 只是一次字典查找
+"""
+import itertools
+import threading
+import time
+from .config import SRS_CACHE_TTL
+from .srs_calculator_supabase import SRSDueIndex
+
+
+# 每次从 Supabase 重新载入卡组时递增，区分"同一写入序号下的新旧两次载入"
+_generations = itertools.count(1)
+
+
+class _ModuleEntry:
+    __slots__ = ('loaded_at', 'generation', 'cards', 'snapshot', 'due_index', 'plans')
+
+    def __init__(self, cards):
+        self.loaded_at = time.monotonic()
+        self.generation = next(_generations)
+        # card_id -> card，dict 保持插入顺序，与 Supabase 返回的顺序一致
+        self.cards = {card['card_id']: card for card in cards}
+        self.snapshot = None
+        # 到期日分桶索引，首次查询今日候选时才构建，之后随写入增量维护
+        self.due_index = None
+        # 今日清单 {(日序数, k): [(card, scores), ...]}，卡片有任何变化时清空
+        self.plans = {}
+
+    def as_list(self):
+        if self.snapshot is None:
+            self.snapshot = list(self.cards.values())
+        return self.snapshot
+
+
+class SRSStateCache:
+    """
+    模块级 SRS 状态缓存。
+    返回的列表是只读快照：写入时替换卡片对象而不是原地修改，已发出的快照不受影响。
+    """
+
+    def __init__(self, ttl=SRS_CACHE_TTL):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.plan_hits = 0
+        self.plan_misses = 0
+        self._entries = {}
+        # 每个模块的写入序号：任何写入/失效都会 +1，用于丢弃写入前发起的读取结果
+        self._write_seq = {}
+        self._lock = threading.Lock()
+
+    def get(self, module_id):
+        """返回缓存的卡片列表；未命中或已过期返回 None"""
+        with self._lock:
+            entry = self._entries.get(module_id)
+            if entry is not None and time.monotonic() - entry.loaded_at < self.ttl:
+                self.hits += 1
+                return entry.as_list()
+            if entry is not None:
+                del self._entries[module_id]
+            self.misses += 1
+            return None
+
+    def due_candidates(self, module_id, today):
+        """
+        通过到期日分桶索引返回今天可能入选的卡片（卡组原顺序）；
+        模块未缓存时返回 None，调用方应退回到全量卡片
+        """
+        with self._lock:
+            entry = self._entries.get(module_id)
+            if entry is None:
+                return None
+            if entry.due_index is None:
+                entry.due_index = SRSDueIndex(entry.cards.values())
+            return entry.due_index.candidates(today)
+
+    def get_plan(self, module_id, today, k_target):
+        """
+        返回 (已记住的今日清单或 None, 当前卡组版本)；
+        版本为 (载入代数, 写入序号)，模块未缓存时为 None（此时不应记住计算结果）
+        """
+        with self._lock:
+            entry = self._entries.get(module_id)
+            if entry is None or time.monotonic() - entry.loaded_at >= self.ttl:
+                return None, None
+            version = (entry.generation, self._write_seq.get(module_id, 0))
+            plan = entry.plans.get((today.toordinal(), k_target))
+            if plan is None:
+                self.plan_misses += 1
+            else:
+                self.plan_hits += 1
+            return plan, version
+
+    def put_plan(self, module_id, today, k_target, plan, version):
+        """记住今日清单；计算期间卡组发生过写入或重新载入（版本不同）时放弃"""
+        with self._lock:
+            entry = self._entries.get(module_id)
+            if version is None or entry is None or \
+                    version != (entry.generation, self._write_seq.get(module_id, 0)):
+                return False
+            day = today.toordinal()
+            if any(key[0] != day for key in entry.plans):
+                # 跨过午夜：前一天的清单不再需要
+                entry.plans = {key: value for key, value in entry.plans.items() if key[0] == day}
+            entry.plans[(day, k_target)] = plan
+            return True
+
+    def write_seq(self, module_id):
+        with self._lock:
+            return self._write_seq.get(module_id, 0)
+
+    def put(self, module_id, cards, write_seq=None):
+        """
+        存入从 Supabase 读取的整副卡组。
+        若传入读取前的 write_seq 且期间发生过写入，则放弃本次结果，避免旧数据覆盖新数据
+        """
+        with self._lock:
+            if write_seq is not None and write_seq != self._write_seq.get(module_id, 0):
+                return False
+            self._entries[module_id] = _ModuleEntry(cards)
+            return True
+
+    def upsert_card(self, module_id, card):
+        """写穿：用最新的卡片状态替换（或追加）缓存中的卡片"""
+        with self._lock:
+            self._bump(module_id)
+            entry = self._entries.get(module_id)
+            if entry is not None:
+                entry.cards[card['card_id']] = card
+                entry.snapshot = None
+                entry.plans = {}
+                if entry.due_index is not None:
+                    entry.due_index.upsert(card)
+
+    def remove_card(self, module_id, card_id):
+        with self._lock:
+            self._bump(module_id)
+            entry = self._entries.get(module_id)
+            if entry is not None and entry.cards.pop(card_id, None) is not None:
+                entry.snapshot = None
+                entry.plans = {}
+                if entry.due_index is not None:
+                    entry.due_index.remove(card_id)
+
+    def forget_plans(self, module_id):
+        """只清空记住的今日清单，卡组缓存和分桶索引保留（基准测试用来测量清单的重新计算）"""
+        with self._lock:
+            entry = self._entries.get(module_id)
+            if entry is not None:
+                entry.plans = {}
+
+    def invalidate(self, module_id):
+        with self._lock:
+            self._bump(module_id)
+            self._entries.pop(module_id, None)
+
+    def stats(self):
+        with self._lock:
+            now = time.monotonic()
+            total = self.hits + self.misses
+            plan_total = self.plan_hits + self.plan_misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'plan_hits': self.plan_hits,
+                'plan_misses': self.plan_misses,
+                'plan_hit_rate': round(self.plan_hits / plan_total, 4) if plan_total else 0.0,
+                'ttl': self.ttl,
+                'modules': {
+                    module_id: {
+                        'cards': len(entry.cards),
+                        'plans': len(entry.plans),
+                        'age_seconds': round(now - entry.loaded_at, 1)
+                    }
+                    for module_id, entry in self._entries.items()
+                }
+            }
+
+    def _bump(self, module_id):
+        self._write_seq[module_id] = self._write_seq.get(module_id, 0) + 1
+
+
+# 每个 worker 一个实例
+srs_cache = SRSStateCache()
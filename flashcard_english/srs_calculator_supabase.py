@@ -1,23 +1,28 @@
 # srs_calculator_supabase.py
 from datetime import date, timedelta
+from bisect import bisect_right, insort
+import heapq
 import math
-from .config import TODAY, A_THRESHOLD, K_TARGET
+from .config import get_today, A_THRESHOLD, K_TARGET
+from .srs_columnar import NUMPY_AVAILABLE, select_must_use_columnar
+from .srs_trace import NULL_TRACE
+from .srs_card import ci_of, lrd_day, lad_day, rc_of
 
 # --- SRS 核心算法函数 ---
 
 def calculate_review_factor_R(item, today=None):
     """计算复习需求因子 R：逾期天数"""
     if today is None:
-        today = TODAY
-    next_due_date = item['LRD'] + timedelta(days=item['CI'])
-    overdue_days = (today - next_due_date).days
+        today = get_today()
+    # 按日序数计算：today - (LRD + CI)
+    overdue_days = today.toordinal() - (lrd_day(item) + ci_of(item))
     return max(0, overdue_days)
 
 def calculate_application_factor_A(item, today=None):
     """计算应用饥渴因子 A：自上次使用以来的天数"""
     if today is None:
-        today = TODAY
-    days_since_applied = (today - item['LAD']).days
+        today = get_today()
+    days_since_applied = today.toordinal() - lad_day(item)
     return days_since_applied
 
 def calculate_priority_score_P(item, today=None):
@@ -26,10 +31,13 @@ def calculate_priority_score_P(item, today=None):
     """
     A = calculate_application_factor_A(item, today)
     R = calculate_review_factor_R(item, today)
-    C = 2 if item['is_core'] else 1 
     
     # N (Total Reference Count): 引用次数越多，掌握度越高，P 应该越低
-    N = item.get('referenceCount', 0) 
+    return priority_from_factors(A, R, item['is_core'], rc_of(item))
+
+def priority_from_factors(A, R, is_core, N):
+    """由已算好的 A、R 计算 P（供选择引擎复用，避免重复计算 A、R）"""
+    C = 2 if is_core else 1 
     
     # 1. 饥渴强制使用 (Logic不变)
     if A > A_THRESHOLD:
@@ -60,7 +68,7 @@ def calculate_state_after_review(card, today=None):
     结果：LRD 更新为今天，CI 保持不变，LAD 不动。
     """
     if today is None:
-        today = TODAY
+        today = get_today()
     
     return {
         'ci': card['CI'],
@@ -76,7 +84,7 @@ def calculate_state_after_application(card, today=None):
     结果：LAD 更新为今天，referenceCount + 1，LRD 和 CI 不动。
     """
     if today is None:
-        today = TODAY
+        today = get_today()
     
     return {
         'ci': card['CI'],      # 保持原样
@@ -85,54 +93,156 @@ def calculate_state_after_application(card, today=None):
         'referenceCount': card.get('referenceCount', 0) + 1 # 引用次数增加
     }
 
-def generate_must_use_list(cards, today=None, k_target=K_TARGET):
-    """
-    生成"今日必用"清单
-    
-    参数:
-        cards (list): 所有卡片列表
-        today (date): 当前日期（可选）
-        k_target (int): 目标数量
-    
-    返回:
-        list: 今日必学卡片列表
-    """
-    if today is None:
-        today = TODAY
-    
+def _select_must_use_loop(cards, today, k_target):
+    """逐卡计算 P 的纯 Python 实现（未安装 NumPy 时使用），返回 [(card, {'P', 'R', 'A'}), ...]"""
     k_force = []
     candidates = []
 
     for item in cards:
-        P = calculate_priority_score_P(item, today)
+        A = calculate_application_factor_A(item, today)
+        R = calculate_review_factor_R(item, today)
+        P = priority_from_factors(A, R, item['is_core'], rc_of(item))
         
         if P >= 10000:
-            k_force.append((P, item))
+            k_force.append((P, item, R, A))
         elif P > 0:
-            candidates.append((P, item))
+            candidates.append((P, item, R, A))
 
     k_force.sort(key=lambda x: x[0], reverse=True)
     k_remaining = max(0, k_target - len(k_force))
-    candidates.sort(key=lambda x: x[0], reverse=True)
-    k_priority = [item for p, item in candidates[:k_remaining]]
+    # heapq.nlargest 等价于 sorted(reverse=True)[:k]（同分保持原顺序），但只维护 k 个元素的堆
+    k_priority = heapq.nlargest(k_remaining, candidates, key=lambda x: x[0])
     
-    final_list = [item for p, item in k_force] + k_priority
+    return [(item, {'P': P, 'R': R, 'A': A}) for P, item, R, A in k_force + k_priority]
+
+def select_must_use(cards, today=None, k_target=K_TARGET, trace=NULL_TRACE):
+    """
+    选择"今日必用"卡片，并返回选择时算出的分数（调用方无需再次计算 P、R、A）
     
-    # 打印输出
-    print("-" * 50)
-    print(f"📅 运行日期: {today} | 目标: {k_target} | 强制锁定: {len(k_force)}")
-    print("-" * 50)
+    参数:
+        cards (list): 所有卡片列表（或 SRSDueIndex 给出的候选）
+        today (date): 当前日期（可选）
+        k_target (int): 目标数量
+        trace (SRSTrace): 选择轨迹（默认关闭，见 srs_trace.py）
     
-    for i, item in enumerate(final_list, 1):
-        P_score = calculate_priority_score_P(item, today)
-        R_val = calculate_review_factor_R(item, today)
-        A_val = calculate_application_factor_A(item, today)
-        
-        print(f"[{i}] {item.get('key_module', 'Unknown')} (ID: {item['id']})")
-        print(f"    - P: {P_score} | R(逾期): {R_val} | A(饥渴): {A_val} 天 | CI: {item['CI']}")
-    print("-" * 50)
+    返回:
+        list: [(card, {'P': P, 'R': R, 'A': A}), ...]
+    """
+    if today is None:
+        today = get_today()
+    
+    if NUMPY_AVAILABLE:
+        # 列式引擎：整副卡组一次向量化打分（见 srs_columnar.py）
+        selected = select_must_use_columnar(cards, today, k_target)
+    else:
+        selected = _select_must_use_loop(cards, today, k_target)
     
-    return final_list
+    if trace.enabled:
+        trace.event('info', 'selection', date=today.isoformat(), k_target=k_target,
+                    scored=len(cards), selected=len(selected),
+                    forced=sum(1 for _, scores in selected if scores['P'] >= 10000))
+        for i, (item, scores) in enumerate(selected, 1):
+            trace.event('debug', 'selected', rank=i, card_id=item['id'],
+                        key_module=item.get('key_module', 'Unknown'), CI=item['CI'], **scores)
+    
+    return selected
+
+def generate_must_use_list(cards, today=None, k_target=K_TARGET):
+    """
+    生成"今日必用"清单
+    
+    参数:
+        cards (list): 所有卡片列表
+        today (date): 当前日期（可选）
+        k_target (int): 目标数量
+    
+    返回:
+        list: 今日必学卡片列表
+    """
+    return [item for item, _ in select_must_use(cards, today, k_target)]
+
+
+# ==========================================================
+# 到期日分桶索引（日历轮）
+# ==========================================================
+
+class SRSDueIndex:
+    """
+    按"开始逾期的日期"和"开始饥渴的日期"把卡片分桶。
+
+    P > 0 当且仅当 R > 0 (today > LRD + CI) 或 A > A_THRESHOLD (today > LAD + A_THRESHOLD)，
+    所以只有桶日期 <= 今天的卡片才可能入选；其余卡片 P 必为 0，无需计算。
+    复习/应用/新增/删除时增量维护，candidates() 的开销与到期卡片数成正比，而不是卡组大小。
+    """
+
+    def __init__(self, cards=()):
+        self._entries = {}       # card_id -> (seq, card, due_day, hungry_day)
+        self._due = {}           # day ordinal -> set(card_id)
+        self._hungry = {}
+        self._due_days = []      # 有卡片的桶日期（升序）
+        self._hungry_days = []
+        self._seq = 0
+        for card in cards:
+            self.upsert(card)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _bucket_days(card):
+        due_day = lrd_day(card) + ci_of(card) + 1
+        hungry_day = lad_day(card) + A_THRESHOLD + 1
+        return due_day, hungry_day
+
+    @staticmethod
+    def _bucket_add(buckets, days, day, card_id):
+        bucket = buckets.get(day)
+        if bucket is None:
+            bucket = buckets[day] = set()
+            insort(days, day)
+        bucket.add(card_id)
+
+    @staticmethod
+    def _bucket_remove(buckets, days, day, card_id):
+        bucket = buckets[day]
+        bucket.discard(card_id)
+        if not bucket:
+            del buckets[day]
+            del days[bisect_right(days, day) - 1]
+
+    def upsert(self, card):
+        """新增卡片，或在复习/应用后用新状态替换（保留卡片在卡组中的原顺序）"""
+        card_id = card['card_id']
+        old = self._entries.get(card_id)
+        if old is not None:
+            seq = old[0]
+            self._bucket_remove(self._due, self._due_days, old[2], card_id)
+            self._bucket_remove(self._hungry, self._hungry_days, old[3], card_id)
+        else:
+            seq = self._seq
+            self._seq += 1
+        due_day, hungry_day = self._bucket_days(card)
+        self._entries[card_id] = (seq, card, due_day, hungry_day)
+        self._bucket_add(self._due, self._due_days, due_day, card_id)
+        self._bucket_add(self._hungry, self._hungry_days, hungry_day, card_id)
+
+    def remove(self, card_id):
+        old = self._entries.pop(card_id, None)
+        if old is not None:
+            self._bucket_remove(self._due, self._due_days, old[2], card_id)
+            self._bucket_remove(self._hungry, self._hungry_days, old[3], card_id)
+
+    def candidates(self, today=None):
+        """返回今天可能 P > 0 的卡片（按卡组原顺序，保证同分时的选择结果与全量计算一致）"""
+        if today is None:
+            today = get_today()
+        today_ord = today.toordinal()
+        card_ids = set()
+        for days, buckets in ((self._due_days, self._due), (self._hungry_days, self._hungry)):
+            for day in days[:bisect_right(days, today_ord)]:
+                card_ids.update(buckets[day])
+        entries = sorted((self._entries[card_id] for card_id in card_ids), key=lambda e: e[0])
+        return [entry[1] for entry in entries]
 
 
 # ==========================================================
@@ -0,0 +1,91 @@
+# srs_card.py
+"""
+紧凑的 SRS 卡片记录
+
+parse_srs_record 原来为每张卡片构造一个 8 个键的 dict（card_id 与 id 重复）外加两个 date 对象，
+整副卡组常驻缓存时内存占用主要来自这里。SRSCard 用 __slots__ 存 7 个字段，日期存为整数日序数
+(date.toordinal())，单张卡片约为原来的 1/4。
+
+SRSCard 实现了只读 Mapping 接口：card['LRD']、card.get('referenceCount', 0)、dict(card)、
+card.items() 等原有写法都照常工作（'LRD'/'LAD' 返回 date，'id' 与 'card_id' 相同）。
+算法内部用 ci_of / lrd_day / lad_day 直接读整数字段，避免来回构造 date。
+"""
+from collections.abc import Mapping
+from datetime import date
+from functools import lru_cache
+
+CARD_KEYS = ('card_id', 'id', 'key_module', 'CI', 'LRD', 'LAD', 'is_core', 'referenceCount')
+
+
+class SRSCard(Mapping):
+    __slots__ = ('card_id', 'key_module', 'ci', 'lrd_day', 'lad_day', 'is_core', 'rc')
+
+    def __init__(self, card_id, key_module, ci, lrd_day, lad_day, is_core, rc):
+        self.card_id = card_id
+        self.key_module = key_module
+        self.ci = ci
+        self.lrd_day = lrd_day
+        self.lad_day = lad_day
+        self.is_core = is_core
+        self.rc = rc
+
+    @classmethod
+    def from_dict(cls, card):
+        """由原来的卡片字典构造（LRD/LAD 为 date）"""
+        if isinstance(card, cls):
+            return card
+        return cls(card['card_id'], card.get('key_module', ''), card['CI'], card['LRD'].toordinal(),
+                   card['LAD'].toordinal(), bool(card['is_core']), card.get('referenceCount', 0))
+
+    def __getitem__(self, key):
+        if key == 'card_id' or key == 'id':
+            return self.card_id
+        if key == 'CI':
+            return self.ci
+        if key == 'LRD':
+            return date.fromordinal(self.lrd_day)
+        if key == 'LAD':
+            return date.fromordinal(self.lad_day)
+        if key == 'is_core':
+            return self.is_core
+        if key == 'referenceCount':
+            return self.rc
+        if key == 'key_module':
+            return self.key_module
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(CARD_KEYS)
+
+    def __len__(self):
+        return len(CARD_KEYS)
+
+    def __contains__(self, key):
+        return key in CARD_KEYS
+
+    def __repr__(self):
+        return f"SRSCard({dict(self)!r})"
+
+
+# --- 算法使用的字段读取（SRSCard 直接读整数，dict 卡片兼容原写法）---
+
+def ci_of(card):
+    return card.ci if type(card) is SRSCard else card['CI']
+
+
+def lrd_day(card):
+    return card.lrd_day if type(card) is SRSCard else card['LRD'].toordinal()
+
+
+def lad_day(card):
+    return card.lad_day if type(card) is SRSCard else card['LAD'].toordinal()
+
+
+def rc_of(card):
+    return card.rc if type(card) is SRSCard else card.get('referenceCount', 0)
+
+
+@lru_cache(maxsize=4096)
+def iso_day(value):
+    """'2025-12-15' -> 日序数；一副卡组里不同的日期只有几百个，缓存后每种日期只解析一次"""
+    return date.fromisoformat(value).toordinal()
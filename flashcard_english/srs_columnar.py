@@ -0,0 +1,115 @@
+# srs_columnar.py
+"""
+列式 SRS 打分引擎
+
+把整副卡组的 CI、LRD/LAD（按日序数）、is_core、referenceCount 装入 NumPy 数组，
+一次向量化计算 R、A、S=log2(N+1) 和 P，结果与 calculate_priority_score_P 逐卡计算一致。
+"""
+from .config import A_THRESHOLD
+from .srs_card import ci_of, lrd_day, lad_day, rc_of
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+HUNGRY_BASE = 10000
+
+
+class SRSColumns:
+    """卡组的列式视图：第 i 行对应 cards[i]"""
+
+    def __init__(self, cards):
+        n = len(cards)
+        self.cards = cards
+        self.ci = np.fromiter(map(ci_of, cards), dtype=np.int64, count=n)
+        self.lrd = np.fromiter(map(lrd_day, cards), dtype=np.int64, count=n)
+        self.lad = np.fromiter(map(lad_day, cards), dtype=np.int64, count=n)
+        self.is_core = np.fromiter((bool(c['is_core']) for c in cards), dtype=bool, count=n)
+        self.rc = np.fromiter(map(rc_of, cards), dtype=np.int64, count=n)
+
+    def __len__(self):
+        return len(self.cards)
+
+    def score(self, today):
+        """
+        向量化计算整副卡组的 (P, R, A)
+
+        规则与 calculate_priority_score_P 相同：
+          A > A_THRESHOLD       -> P = 10000 + A
+          R == 0                -> P = 0
+          否则                  -> P = max(1, R*C + A//5 - log2(N+1))
+        """
+        today_ord = today.toordinal()
+        A = today_ord - self.lad
+        R = np.maximum(0, today_ord - (self.lrd + self.ci))
+        C = np.where(self.is_core, 2, 1)
+        S = np.log2(self.rc + 1)
+
+        P = np.maximum(1, (R * C + A // 5) - S)
+        P = np.where(R == 0, 0.0, P)
+        P = np.where(A > A_THRESHOLD, HUNGRY_BASE + A, P)
+        return P, R, A
+
+
+def top_k_indices(idx, P, k):
+    """
+    从行号 idx（升序）中取 P 最大的 k 个，按 P 降序返回，同分保持原顺序。
+    k 小于候选数时先用 np.partition 线性找出第 k 大的分数，只对入选的 k 行排序，
+    结果与 sorted(..., reverse=True)[:k] 完全相同
+    """
+    if k <= 0 or len(idx) == 0:
+        return idx[:0]
+    if k < len(idx):
+        vals = P[idx]
+        kth = np.partition(vals, len(vals) - k)[len(vals) - k]
+        above = idx[vals > kth]
+        # 与第 k 大同分的行按原顺序补足
+        ties = idx[vals == kth][:k - len(above)]
+        idx = np.sort(np.concatenate([above, ties]))
+    return idx[np.argsort(-P[idx], kind='stable')]
+
+
+def select_indices(P, k_target):
+    """
+    按 P 选出今日清单的行号：
+      - P >= 10000 的饥渴卡全部入选（按 P 降序）
+      - 其余 P > 0 的卡按 P 降序补足 k_target（只做 top-k 选择，不对整副卡组排序）
+    同分时保持卡组原顺序，与 list.sort(reverse=True) 的稳定排序一致
+    """
+    force_idx = np.flatnonzero(P >= HUNGRY_BASE)
+    force_idx = force_idx[np.argsort(-P[force_idx], kind='stable')]
+
+    k_remaining = max(0, k_target - len(force_idx))
+    cand_idx = np.flatnonzero((P > 0) & (P < HUNGRY_BASE))
+    cand_idx = top_k_indices(cand_idx, P, k_remaining)
+
+    return force_idx, cand_idx
+
+
+def _python_score(P, R, A):
+    """把 NumPy 标量还原为 calculate_priority_score_P 会返回的 Python 数值（类型也一致）"""
+    if A > A_THRESHOLD:
+        return HUNGRY_BASE + int(A)
+    if R == 0:
+        return 0
+    P = float(P)
+    return 1 if P <= 1 else P
+
+
+def select_must_use_columnar(cards, today, k_target):
+    """
+    列式版本的选择步骤，返回 [(card, {'P', 'R', 'A'}), ...]
+    卡片顺序与原实现完全相同，分数直接取自向量化结果，不再逐卡重算
+    """
+    if not cards:
+        return []
+    columns = SRSColumns(cards)
+    P, R, A = columns.score(today)
+    force_idx, cand_idx = select_indices(P, k_target)
+    return [
+        (cards[i], {'P': _python_score(P[i], R[i], A[i]), 'R': int(R[i]), 'A': int(A[i])})
+        for i in np.concatenate([force_idx, cand_idx])
+    ]
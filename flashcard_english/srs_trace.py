@@ -0,0 +1,85 @@
+# srs_trace.py
+"""
+SRS 选择轨迹（替代 /srs/today 上的 print 调试输出）
+
+- 默认关闭：NULL_TRACE.enabled 为 False，热路径上只有一次属性判断，不格式化任何字符串
+- 全局开启：config.SRS_TRACE_LEVEL 设为 'error' / 'info' / 'debug'，按 SRS_TRACE_SAMPLE_RATE 抽样
+- 单个请求开启：请求头 X-SRS-Trace: debug（不受抽样影响），轨迹同时随响应返回
+- 输出：每个事件一行 JSON，写入 logging（logger 名 flashcard_english.srs），不直接写 stdout
+"""
+import json
+import logging
+import random
+import time
+import uuid
+from .config import SRS_TRACE_LEVEL, SRS_TRACE_SAMPLE_RATE
+
+TRACE_HEADER = 'X-SRS-Trace'
+LEVELS = {'error': 40, 'info': 20, 'debug': 10}
+
+logger = logging.getLogger('flashcard_english.srs')
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+
+
+class SRSTrace:
+    """一次请求的选择轨迹：event() 记录事件，低于 level 的事件直接丢弃"""
+
+    enabled = True
+
+    def __init__(self, level='info', module_id=None, echo=False):
+        self.level = LEVELS[level]
+        self.trace_id = uuid.uuid4().hex[:12]
+        self.module_id = module_id
+        # echo=True 时（请求头开启）把事件随响应一起返回
+        self.echo = echo
+        self.events = []
+        self._start = time.perf_counter()
+
+    def event(self, level, name, **fields):
+        levelno = LEVELS[level]
+        if levelno < self.level:
+            return
+        record = {
+            'trace_id': self.trace_id,
+            'module': self.module_id,
+            'level': level,
+            'event': name,
+            'elapsed_ms': round((time.perf_counter() - self._start) * 1000, 3),
+        }
+        record.update(fields)
+        if self.echo:
+            self.events.append(record)
+        logger.log(levelno, json.dumps(record, ensure_ascii=False, default=str))
+
+
+class _NullTrace:
+    """关闭时使用的空轨迹"""
+
+    enabled = False
+    echo = False
+    events = ()
+
+    def event(self, level, name, **fields):
+        pass
+
+
+NULL_TRACE = _NullTrace()
+
+
+def trace_from_request(headers, module_id=None):
+    """
+    根据请求头和配置决定本次请求是否记录轨迹
+    请求头的值为级别名（error/info/debug）；值无法识别时按 debug 处理
+    """
+    requested = headers.get(TRACE_HEADER)
+    if requested:
+        level = requested.strip().lower()
+        return SRSTrace(level if level in LEVELS else 'debug', module_id, echo=True)
+    if SRS_TRACE_LEVEL and random.random() < SRS_TRACE_SAMPLE_RATE:
+        return SRSTrace(SRS_TRACE_LEVEL, module_id)
+    return NULL_TRACE
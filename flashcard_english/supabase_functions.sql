@@ -0,0 +1,194 @@
+-- supabase_functions.sql
+-- 在 Supabase SQL Editor 中执行，为 flashcard_app 提供数据库端函数（PostgREST RPC）
+
+-- ==========================================================
+-- 场景 B：实战引用（/srs/use）
+-- 在一条 UPDATE 中完成 LAD = 今天、rc + 1，并发点击不会丢失计数
+-- 调用：POST /rest/v1/rpc/srs_record_application
+--       {"p_table": "mod1_cards", "p_cardid": "mod1_card_1", "p_today": "2025-12-15"}
+-- ==========================================================
+create or replace function srs_record_application(p_table text, p_cardid text, p_today date)
+returns setof json
+language plpgsql
+as $$
+begin
+    if p_table !~ '^mod[0-9]+_cards$' then
+        raise exception 'unknown table: %', p_table;
+    end if;
+
+    return query execute format(
+        'update %I
+            set lad = $1, rc = coalesce(rc, 0) + 1
+          where cardid = $2
+      returning json_build_object(
+            ''cardid'', cardid, ''data'', data, ''ci'', ci,
+            ''lrd'', lrd, ''lad'', lad, ''is_core'', is_core, ''rc'', rc)',
+        p_table
+    ) using p_today, p_cardid;
+end;
+$$;
+
+-- ==========================================================
+-- 卡片版本号与变更日志（GET /cards 的 ETag 与 /cards/changes 增量同步）
+-- 改动 cardid / data 的写入调用 record_card_changes：模块版本号 + 1，并记录涉及的 cardid
+-- （只改 SRS 列的复习 / 引用不调用，GET /cards 只返回 cardid + data）
+-- p_op: 'added' | 'updated' | 'deleted' | 'reset'（整表替换，p_cardids 为 null）
+-- card_changes 每张卡只保留最后一次变更（增量同步只需要最新状态）；
+-- reset 时清空该模块之前的全部记录，表的大小因此不超过 卡片数 + 墓碑数 + 1
+-- ==========================================================
+create table if not exists card_module_versions (
+    module_id text primary key,
+    version   bigint not null default 0
+);
+
+create table if not exists card_changes (
+    id         bigserial primary key,
+    module_id  text not null,
+    version    bigint not null,
+    cardid     text,
+    op         text not null,
+    changed_at timestamptz not null default now()
+);
+
+create index if not exists card_changes_module_version_idx on card_changes (module_id, version);
+
+-- 旧版本按变更逐条追加：建唯一索引前先合并为每张卡一行
+delete from card_changes a
+ using card_changes b
+ where a.module_id = b.module_id and a.cardid = b.cardid and a.id < b.id;
+
+create unique index if not exists card_changes_module_cardid_idx on card_changes (module_id, cardid);
+
+create or replace function record_card_changes(p_module text, p_cardids text[], p_op text)
+returns bigint
+language plpgsql
+as $$
+declare
+    v bigint;
+begin
+    insert into card_module_versions (module_id, version) values (p_module, 1)
+    on conflict (module_id) do update set version = card_module_versions.version + 1
+    returning version into v;
+
+    if p_op = 'reset' or p_cardids is null then
+        delete from card_changes where module_id = p_module;
+        insert into card_changes (module_id, version, cardid, op) values (p_module, v, null, p_op);
+    else
+        insert into card_changes (module_id, version, cardid, op)
+        select p_module, v, c, p_op from (select distinct unnest(p_cardids) as c) ids
+        on conflict (module_id, cardid) do update
+            set version = excluded.version, op = excluded.op, changed_at = now();
+    end if;
+
+    return v;
+end;
+$$;
+
+-- ==========================================================
+-- 单张卡片的新增 / 修改 data / 删除，与 record_card_changes 在同一事务内完成
+-- p_op: 'added'（p_row 为整行）| 'updated'（p_row 为 {"data": ...}）| 'deleted'
+-- 返回写入后的行；卡片不存在时不返回行，也不改版本号
+-- 调用：POST /rest/v1/rpc/write_card
+--       {"p_table": "mod1_cards", "p_module": "mod1", "p_op": "updated",
+--        "p_cardid": "mod1_card_1", "p_row": {"data": {...}}}
+-- ==========================================================
+create or replace function write_card(p_table text, p_module text, p_op text, p_cardid text, p_row jsonb)
+returns setof json
+language plpgsql
+as $$
+declare
+    r json;
+begin
+    if p_table !~ '^mod[0-9]+_cards$' then
+        raise exception 'unknown table: %', p_table;
+    end if;
+
+    if p_op = 'added' then
+        execute format(
+            'insert into %1$I as c (cardid, data, ci, lrd, lad, is_core, rc)
+             select cardid, data, ci, lrd, lad, is_core, rc from jsonb_populate_record(null::%1$I, $1)
+             returning to_json(c)',
+            p_table
+        ) into r using p_row || jsonb_build_object('cardid', p_cardid);
+    elsif p_op = 'updated' then
+        execute format(
+            'update %I as c set data = $1 where cardid = $2 returning to_json(c)',
+            p_table
+        ) into r using p_row->'data', p_cardid;
+    elsif p_op = 'deleted' then
+        execute format(
+            'delete from %I as c where cardid = $1 returning to_json(c)',
+            p_table
+        ) into r using p_cardid;
+    else
+        raise exception 'unknown op: %', p_op;
+    end if;
+
+    if r is not null then
+        perform record_card_changes(p_module, array[p_cardid], p_op);
+        return next r;
+    end if;
+end;
+$$;
+
+-- ==========================================================
+-- 批量导入（/import）：在一个事务内删除本批 cardid 的旧行再插入新行
+-- 函数体在同一事务中执行，插入失败时删除一并回滚，不会丢失卡片
+-- 调用：POST /rest/v1/rpc/replace_card_batch
+--       {"p_table": "mod1_cards", "p_rows": [{"cardid": "mod1_card_1", "data": {...}}, ...]}
+-- ==========================================================
+create or replace function replace_card_batch(p_table text, p_rows jsonb)
+returns void
+language plpgsql
+as $$
+begin
+    if p_table !~ '^mod[0-9]+_cards$' then
+        raise exception 'unknown table: %', p_table;
+    end if;
+
+    execute format(
+        'delete from %I where cardid in (select r->>''cardid'' from jsonb_array_elements($1) r)',
+        p_table
+    ) using p_rows;
+
+    execute format(
+        'insert into %I (cardid, data)
+         select r->>''cardid'', r->''data'' from jsonb_array_elements($1) r',
+        p_table
+    ) using p_rows;
+end;
+$$;
+
+-- ==========================================================
+-- 场景 C：批量同步事件（/srs/events）
+-- 一条 UPDATE 完成整批卡片的条件更新：只有 rc、lrd 仍等于读取时的值的卡片被写入，
+-- 返回实际更新的行，客户端（flashcard_app）只对未返回的卡片重新读取、重新折叠后再试
+-- 调用：POST /rest/v1/rpc/srs_apply_event_states
+--       {"p_table": "mod1_cards", "p_rows": [{"cardid": "mod1_card_1", "expected_rc": 3,
+--         "expected_lrd": "2025-12-10", "ci": 5, "lrd": "2025-12-15", "lad": "2025-12-14", "rc": 4}, ...]}
+-- ==========================================================
+create or replace function srs_apply_event_states(p_table text, p_rows jsonb)
+returns setof json
+language plpgsql
+as $$
+begin
+    if p_table !~ '^mod[0-9]+_cards$' then
+        raise exception 'unknown table: %', p_table;
+    end if;
+
+    return query execute format(
+        'update %I as c
+            set ci = r.ci, lrd = r.lrd, lad = r.lad, rc = r.rc
+           from jsonb_to_recordset($1) as r(
+                cardid text, expected_rc integer, expected_lrd date,
+                ci numeric, lrd date, lad date, rc integer)
+          where c.cardid = r.cardid
+            and c.rc is not distinct from r.expected_rc
+            and c.lrd is not distinct from r.expected_lrd
+      returning json_build_object(
+            ''cardid'', c.cardid, ''data'', c.data, ''ci'', c.ci,
+            ''lrd'', c.lrd, ''lad'', c.lad, ''is_core'', c.is_core, ''rc'', c.rc)',
+        p_table
+    ) using p_rows;
+end;
+$$;
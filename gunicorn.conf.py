@@ -0,0 +1,15 @@
+# gunicorn.conf.py
+# gunicorn 启动时自动读取当前目录下的本文件：gunicorn main:app
+# 异步服务模式（见 async_main.py）：gunicorn async_main:app --worker-class aiohttp.GunicornWebWorker
+
+
+def when_ready(server):
+    """master 就绪后、创建 worker 之前执行一次：检查 Supabase 表并导入初始数据（每次部署一次）"""
+    from flashcard_english.flashcard_app import check_initial_data
+    check_initial_data()
+
+
+def post_worker_init(worker):
+    """每个 worker 初始化后在后台预热连接池和缓存，预热完成前 /ready 返回 503"""
+    import main
+    main.start_warmup()
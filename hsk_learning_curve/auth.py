@@ -0,0 +1,185 @@
+# auth.py
+"""
+HSK 账号：签名会话令牌 + 密码哈希 + 用户记录缓存
+
+- login / register 返回无状态的签名令牌（itsdangerous，带签发时间，SESSION_MAX_AGE 后过期），
+  之后的请求带 `Authorization: Bearer <token>`，由 require_session 在本地验证，不访问 Supabase
+- 密码以 werkzeug 哈希保存、在进程内比对；旧的明文密码在下一次登录成功时自动升级为哈希
+- 登录用的密码哈希按用户名缓存 USER_CACHE_TTL 秒（只缓存已哈希的密码，不缓存其它列；注册、密码升级时清除）
+- 没有配置 HSK_SESSION_SECRET 时不签发令牌（login / register 返回的 token 为 null），带令牌的请求一律 401
+- REQUIRE_SESSION_TOKEN 关闭时（默认）没有令牌的请求仍按 username 参数处理，兼容旧客户端——
+  这种模式下令牌只对带令牌的客户端生效，不能阻止别人冒用 username；
+  带了令牌则以令牌中的用户为准，与参数中的 username 不一致时返回 403
+"""
+import hmac
+import threading
+import time
+from functools import wraps
+
+import supabase_client
+from flask import g, jsonify, request
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from .config import (
+    SUPABASE_URL, HEADERS, SESSION_SECRET, SESSION_MAX_AGE, REQUIRE_SESSION_TOKEN, USER_CACHE_TTL
+)
+
+if SESSION_SECRET is None:
+    if REQUIRE_SESSION_TOKEN:
+        raise RuntimeError("HSK_REQUIRE_SESSION_TOKEN 已开启，但没有设置 HSK_SESSION_SECRET")
+    print("⚠️ 未设置 HSK_SESSION_SECRET：不签发、不接受会话令牌")
+if not REQUIRE_SESSION_TOKEN:
+    print("⚠️ HSK_REQUIRE_SESSION_TOKEN 未开启：没有令牌的请求仍按 username 参数处理")
+
+_serializer = URLSafeTimedSerializer(SESSION_SECRET, salt='hsk-session') if SESSION_SECRET else None
+
+# werkzeug 生成的哈希以方法名开头（scrypt:... / pbkdf2:...），其余视为旧的明文密码
+_HASH_PREFIXES = ('scrypt:', 'pbkdf2:')
+
+
+# ==========================================================
+# 令牌
+# ==========================================================
+
+def issue_token(username):
+    """签发令牌；未配置签名密钥时返回 None"""
+    if _serializer is None:
+        return None
+    return _serializer.dumps({'u': username})
+
+
+def verify_token(token):
+    """返回令牌中的用户名；签名错误、已过期或未配置签名密钥时返回 None"""
+    if _serializer is None:
+        return None
+    try:
+        data = _serializer.loads(token, max_age=SESSION_MAX_AGE)
+    except (SignatureExpired, BadSignature):
+        return None
+    return data.get('u') if isinstance(data, dict) else None
+
+
+# ==========================================================
+# 密码
+# ==========================================================
+
+def hash_password(password):
+    return generate_password_hash(password)
+
+
+def check_password(stored, password):
+    """返回 (是否匹配, 是否需要升级为哈希)"""
+    if not isinstance(stored, str) or not isinstance(password, str) or not stored or not password:
+        return False, False
+    if stored.startswith(_HASH_PREFIXES):
+        return check_password_hash(stored, password), False
+    matched = hmac.compare_digest(stored.encode('utf-8'), password.encode('utf-8'))
+    return matched, matched
+
+
+# ==========================================================
+# 用户记录缓存
+# ==========================================================
+
+# username -> (loaded_at, 密码哈希)：只缓存登录比对需要的列
+_users = {}
+_users_lock = threading.Lock()
+
+
+def get_user(username):
+    """按用户名读取 {'username', 'password'}（密码哈希带缓存）；用户不存在返回 None"""
+    with _users_lock:
+        entry = _users.get(username)
+        if entry is not None and time.monotonic() - entry[0] <= USER_CACHE_TTL:
+            return {'username': username, 'password': entry[1]}
+
+    response = supabase_client.request(
+        "GET", f"{SUPABASE_URL}/rest/v1/users", headers=HEADERS,
+        params={"username": f"eq.{username}", "select": "username,password"}
+    )
+    supabase_client.raise_for_supabase(response)
+    rows = response.json()
+    if not rows:
+        return None
+    password = rows[0].get('password')
+    # 旧的明文密码不进缓存（下一次登录成功时升级为哈希）
+    if password and password.startswith(_HASH_PREFIXES):
+        with _users_lock:
+            _users[username] = (time.monotonic(), password)
+    return {'username': username, 'password': password}
+
+
+def forget_user(username):
+    with _users_lock:
+        _users.pop(username, None)
+
+
+def upgrade_password(username, password):
+    """把明文密码改写为哈希；失败不影响本次登录，下次登录再试"""
+    forget_user(username)
+    hashed = hash_password(password)
+    try:
+        response = supabase_client.request(
+            "PATCH", f"{SUPABASE_URL}/rest/v1/users", headers={**HEADERS, "Prefer": "return=minimal"},
+            params={"username": f"eq.{username}"}, json={"password": hashed}
+        )
+        supabase_client.raise_for_supabase(response)
+    except Exception as e:
+        print(f"⚠️ 用户 {username} 的密码升级为哈希失败: {e}")
+    forget_user(username)
+
+
+# ==========================================================
+# 会话校验
+# ==========================================================
+
+def token_from_headers(headers):
+    auth = headers.get('Authorization', '')
+    if auth.startswith('Bearer '):
+        return auth[7:].strip()
+    return headers.get('X-Session-Token')
+
+
+def _supplied_username(view_kwargs):
+    if view_kwargs.get('username'):
+        return view_kwargs['username']
+    if request.args.get('username'):
+        return request.args['username']
+    data = request.get_json(silent=True)
+    return data.get('username') if isinstance(data, dict) else None
+
+
+def check_session(token, supplied):
+    """
+    校验会话，返回 (令牌中的用户名, 错误)；错误为 ({"error": ...}, 状态码)，通过时为 None
+    Flask 的 require_session 与异步模式 (async_main.py) 的原生接口共用
+    """
+    if token:
+        username = verify_token(token)
+        if username is None:
+            return None, ({"error": "invalid or expired session"}, 401)
+        if supplied and supplied != username:
+            return None, ({"error": "session does not match username"}, 403)
+        return username, None
+    if REQUIRE_SESSION_TOKEN:
+        return None, ({"error": "session token required"}, 401)
+    return None, None
+
+
+def require_session(view):
+    """HSK 接口的会话校验：有令牌时验证并记下 g.session_user；无令牌时视 REQUIRE_SESSION_TOKEN 决定是否放行"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = token_from_headers(request.headers)
+        g.session_user, error = check_session(token, _supplied_username(kwargs) if token else None)
+        if error:
+            body, status = error
+            return jsonify(body), status
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def session_username(supplied=None):
+    """当前请求的用户：有会话时取令牌中的用户名，否则取请求参数"""
+    return g.get('session_user') or supplied
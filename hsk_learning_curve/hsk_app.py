@@ -1,44 +1,206 @@
-import asyncio
-import io
-import requests
-import edge_tts
+import supabase_client
+from server_timing import timed
 from flask import Blueprint, request, send_file, jsonify
-from .config import SUPABASE_URL, HEADERS 
+from mandarin_tts_tool.tts_app import tts_engine
+from mandarin_tts_tool.tts_engine import VOICE_DICT
+from .config import (
+    SUPABASE_URL, HEADERS, MASTERY_FLUSH_INTERVAL, MASTERY_FLUSH_MAX_ROWS, MASTERY_BULK_MAX_ROWS,
+    PROGRESS_FLUSH_INTERVAL, PROGRESS_FLUSH_MAX_ROWS, TTS_CACHE_MAX_AGE
+)
+from .auth import (
+    require_session, session_username, issue_token, get_user, forget_user,
+    hash_password, check_password, upgrade_password
+)
+from .mastery_cache import mastery_cache, format_mastery
+from .write_behind import WriteBehindBuffer
 
 hsk_bp = Blueprint('hsk_learning_curve', __name__)
 
 # --- 辅助函数：简化 Supabase 请求 ---
 def supabase_request(method, path, json_data=None, params=None):
     url = f"{SUPABASE_URL}/rest/v1/{path}"
-    response = requests.request(method, url, headers=HEADERS, json=json_data, params=params)
+    response = supabase_client.request(method, url, headers=HEADERS, json=json_data, params=params)
     if response.status_code >= 400:
         print(f"Supabase Error ({path}):", response.text)
     return response
 
+def upsert_mastery_rows(rows):
+    """一次批量 upsert 多行 word_mastery（写回缓冲的刷写函数）"""
+    headers = {**HEADERS, "Prefer": "resolution=merge-duplicates,return=minimal"}
+    response = supabase_client.request("POST", f"{SUPABASE_URL}/rest/v1/word_mastery", headers=headers, json=rows)
+    supabase_client.raise_for_supabase(response)
+
+
+def mastery_key(row):
+    return (row['username'], str(row['level']), row['char'])
+
+
+# save_mastery 的写回缓冲：同一 (username, level, char) 在一次刷写前只保留最后一次答题结果
+mastery_writes = WriteBehindBuffer(
+    'word_mastery', upsert_mastery_rows, key_of=mastery_key,
+    interval=MASTERY_FLUSH_INTERVAL, max_rows=MASTERY_FLUSH_MAX_ROWS
+)
+
+
+def upsert_progress_rows(rows):
+    """
+    批量 upsert user_progress（写回缓冲的刷写函数）
+    各用户合并后的字段可能不同，而 PostgREST 批量写入要求每行的键一致：按字段集合分组，每组一次请求
+    """
+    groups = {}
+    for row in rows:
+        groups.setdefault(frozenset(row), []).append(row)
+    headers = {**HEADERS, "Prefer": "resolution=merge-duplicates,return=minimal"}
+    for group in groups.values():
+        response = supabase_client.request("POST", f"{SUPABASE_URL}/rest/v1/user_progress", headers=headers, json=group)
+        supabase_client.raise_for_supabase(response)
+
+
+def progress_key(row):
+    return (row['username'], str(row.get('level')))
+
+
+# save_progress 的写回缓冲：每个用户的每个级别只保留合并后的进度，最多每 PROGRESS_FLUSH_INTERVAL 秒落库一次
+# （user_progress 每个级别一行，按 (username, level) 合并，切换级别不会覆盖上一个级别尚未落库的进度）
+progress_writes = WriteBehindBuffer(
+    'user_progress', upsert_progress_rows, key_of=progress_key,
+    interval=PROGRESS_FLUSH_INTERVAL, max_rows=PROGRESS_FLUSH_MAX_ROWS
+)
+
+
+def mastery_payload(data):
+    """校验一条熟练度记录，返回 (payload, error)"""
+    # 必传参数校验
+    required_fields = ['username', 'char', 'level', 'record']
+    for field in required_fields:
+        if not data.get(field):
+            return None, f"{field} is required"
+    
+    payload = {
+        "username": data.get('username'),
+        "char": data.get('char'),
+        "level": data.get('level'),
+        "record": data.get('record')
+    }
+    return payload, None
+
+
+def load_user_mastery(username):
+    """从 Supabase 读取用户全部熟练度，并叠加尚未落库的写入，返回 {(level, char): record}"""
+    # 先取待写快照再读取：读取期间刚刷写完的行已不在缓冲中，但一定包含在之后的读取结果里
+    pending = mastery_writes.pending(lambda row: row['username'] == username)
+    m_res = supabase_request("GET", "word_mastery", params={"username": f"eq.{username}", "select": "level,char,record"})
+    supabase_client.raise_for_supabase(m_res)
+    records = {(str(item.get('level')), item['char']): item['record'] for item in m_res.json()}
+    for row in pending:
+        records[(str(row['level']), row['char'])] = row['record']
+    return records
+
+
+def read_user_mastery(username, level=None):
+    """缓存未命中时的读取：载入该用户全部级别放入缓存，再在内存中按级别筛选（键格式 level_char）"""
+    seq = mastery_cache.write_seq(username)
+    records = load_user_mastery(username)
+    mastery_cache.put(username, records, seq)
+    return format_mastery(records, level)
+
+
+def record_mastery(data, session_user=None):
+    """
+    save_mastery 的处理（只改内存：本 worker 的缓存立即更新，落库由写回缓冲合并后批量完成）
+    返回 (响应体, 状态码)；异步模式下由事件循环直接调用
+    """
+    payload, error = mastery_payload({**data, "username": session_user or data.get('username')})
+    if error:
+        return {"error": error}, 400
+    mastery_cache.update(payload['username'], payload['level'], payload['char'], payload['record'])
+    try:
+        mastery_writes.add(payload)
+    except Exception as e:
+        # 同步写入模式下写入失败：缓存中已是未落库的值，整体失效后下次重新读取
+        mastery_cache.invalidate(payload['username'])
+        return {"error": str(e)}, 500
+    return {"status": "success"}, 200
+
+
+def record_progress(data, session_user=None):
+    """
+    save_progress 的处理（与尚未落库的部分进度合并，由写回缓冲按间隔批量写入），返回 (响应体, 状态码)
+    user_progress 每个级别一行，必须带 level 才知道写入哪一行
+    """
+    username = session_user or data.get('username')
+    if not username:
+        return {"error": "username is required"}, 400
+    if data.get('level') is None:
+        return {"error": "level is required"}, 400
+
+    payload = {
+        "username": username,
+        "level": data.get('level'),
+        "quiz_count": data.get('quizCount'),
+        "current_index": data.get('index'),
+        "reading_index": data.get('readingIndex'),
+        "quiz_remove_correct": data.get('quizRemoveCorrect')
+    }
+    
+    # 过滤掉 None 值，防止误改数据库数据
+    payload = {k: v for k, v in payload.items() if v is not None}
+    try:
+        progress_writes.merge(payload)
+    except Exception as e:
+        return {"error": str(e)}, 500
+    return {"status": "success"}, 200
+
 # --- 1. 账号相关 ---
+def _is_credential(value):
+    """用户名 / 密码必须是非空字符串（数字、对象等直接拒绝，避免哈希比对时报错）"""
+    return isinstance(value, str) and bool(value)
+
+
 @hsk_bp.route('/register', methods=['POST'])
 def register():
     data = request.json
-    check = supabase_request("GET", "users", params={"username": f"eq.{data['username']}"})
-    if check.json():
+    if not _is_credential(data.get('username')) or not _is_credential(data.get('password')):
+        return jsonify({"message": "username and password are required"}), 400
+    if get_user(data['username']):
         return jsonify({"message": "User exists"}), 400
-    supabase_request("POST", "users", json_data=data)
-    return jsonify({"status": "success"}), 201
+    # 密码只保存哈希
+    response = supabase_request("POST", "users", json_data={**data, "password": hash_password(data['password'])})
+    if response.status_code >= 400:
+        return jsonify({"message": "Register failed"}), response.status_code
+    forget_user(data['username'])
+    return jsonify({"status": "success", "username": data['username'], "token": issue_token(data['username'])}), 201
 
 @hsk_bp.route('/login', methods=['POST'])
 def login():
     data = request.json
-    params = {"username": f"eq.{data['username']}", "password": f"eq.{data['password']}"}
-    res = supabase_request("GET", "users", params=params)
-    if res.json():
-        return jsonify({"status": "success", "username": data['username']}), 200
-    return jsonify({"status": "error"}), 401
+    username, password = data.get('username'), data.get('password')
+    if not isinstance(username, (str, type(None))) or not isinstance(password, (str, type(None))):
+        return jsonify({"status": "error", "error": "username and password must be strings"}), 400
+    user = get_user(username) if username else None
+    matched, needs_upgrade = check_password(user.get('password') if user else None, password)
+    if not matched:
+        return jsonify({"status": "error"}), 401
+    if needs_upgrade:
+        upgrade_password(username, password)
+    return jsonify({"status": "success", "username": username, "token": issue_token(username)}), 200
+
+
+@hsk_bp.route('/session', methods=['GET'])
+@require_session
+def check_session():
+    """验证令牌（代替客户端为"确认登录状态"而重新登录），不访问 Supabase"""
+    username = session_username()
+    if not username:
+        return jsonify({"status": "error", "error": "session token required"}), 401
+    return jsonify({"status": "success", "username": username}), 200
 
 # --- 2. 数据获取（拆分后）---
 @hsk_bp.route('/get_user_progress', methods=['GET'])
+@require_session
 def get_user_progress():
     """单独获取用户学习进度（level/index/quiz_count等）"""
-    username = request.args.get('username')
+    username = session_username(request.args.get('username'))
     if not username:
         return jsonify({"error": "username is required"}), 400
     level = request.args.get('level')  # 新增：支持按级别筛选，减少数据量
@@ -48,12 +210,24 @@ def get_user_progress():
     params = {"username": f"eq.{username}"}
     if level:
         params["level"] = f"eq.{level}"
+    pending = progress_writes.pending(
+        lambda row: row['username'] == username and row.get('level') is not None
+        and (not level or str(row['level']) == str(level))
+    )
     
     p_res = supabase_request("GET", "user_progress", params=params)
+    if not p_res.ok:
+        return jsonify({"error": p_res.text}), 500
+    rows = p_res.json()
+    # 叠加本 worker 尚未落库的进度（未指定级别时取最近保存的级别），覆盖同一级别的已存行
+    if pending:
+        latest = pending[-1]
+        stored = next((row for row in rows if str(row.get('level')) == str(latest.get('level'))), {})
+        rows = [{**stored, **latest}]
     
     # 确保返回默认值，兼容新用户
-    if p_res.json():
-        progress = p_res.json()[0]
+    if rows:
+        progress = rows[0]
         progress.setdefault("reading_index", 0)
         progress.setdefault("level", 1)
         progress.setdefault("current_index", 0)
@@ -65,131 +239,166 @@ def get_user_progress():
     return jsonify(progress), 200
 
 @hsk_bp.route('/get_user_mastery', methods=['GET'])
+@require_session
 def get_user_mastery():
     """单独获取用户单词熟练度数据"""
-    username = request.args.get('username')
+    username = session_username(request.args.get('username'))
     if not username:
         return jsonify({"error": "username is required"}), 400
     level = request.args.get('level')  # 新增：支持按级别筛选，减少数据量
     if not username:
         return jsonify({"error": "username is required"}), 400
     
-    # 构建查询参数：用户名 + 可选级别筛选
-    params = {"username": f"eq.{username}"}
-    if level:
-        params["level"] = f"eq.{level}"
-    
-    m_res = supabase_request("GET", "word_mastery", params=params)
-    mastery = {}
-    for item in m_res.json():
-        # 键格式：level_char（保持和前端兼容）
-        key = f"{item.get('level')}_{item['char']}"
-        mastery[key] = item['record']
+    # 先查缓存；未命中时载入该用户全部级别，再在内存中按级别筛选
+    mastery = mastery_cache.get(username, level or None)
+    if mastery is None:
+        try:
+            mastery = read_user_mastery(username, level or None)
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
         
     return jsonify(mastery), 200
 
 # --- 3. 数据保存 ---
 @hsk_bp.route('/save_progress', methods=['POST'])
+@require_session
 def save_progress():
-    data = request.json
-    username = data.get('username')
-    if not username:
-        return jsonify({"error": "username is required"}), 400
-    
-    payload = {
-        "username": username,
-        "level": data.get('level'),
-        "quiz_count": data.get('quizCount'),
-        "current_index": data.get('index'),
-        "reading_index": data.get('readingIndex'),
-        "quiz_remove_correct": data.get('quizRemoveCorrect')
-    }
-    
-    # 过滤掉 None 值，防止误改数据库数据
-    payload = {k: v for k, v in payload.items() if v is not None}
-
-    headers = {**HEADERS, "Prefer": "resolution=merge-duplicates"}
-    requests.post(f"{SUPABASE_URL}/rest/v1/user_progress", headers=headers, json=payload)
-    return jsonify({"status": "success"}), 200
+    body, status = record_progress(request.json, session_username())
+    return jsonify(body), status
 
 @hsk_bp.route('/save_mastery', methods=['POST'])
+@require_session
 def save_mastery():
-    data = request.json
-    # 必传参数校验
-    required_fields = ['username', 'char', 'level', 'record']
-    for field in required_fields:
-        if not data.get(field):
-            return jsonify({"error": f"{field} is required"}), 400
-    
-    payload = {
-        "username": data.get('username'),
-        "char": data.get('char'),
-        "level": data.get('level'),
-        "record": data.get('record')
-    }
-    headers = {**HEADERS, "Prefer": "resolution=merge-duplicates"}
-    requests.post(f"{SUPABASE_URL}/rest/v1/word_mastery", headers=headers, json=payload)
-    return jsonify({"status": "success"}), 200
+    body, status = record_mastery(request.json, session_username())
+    return jsonify(body), status
+
+
+@hsk_bp.route('/save_mastery/bulk', methods=['POST'])
+@require_session
+def save_mastery_bulk():
+    """
+    一次保存整个测验的答题结果
+    请求体: {"username": "...", "records": [{"char", "level", "record"}, ...]}
+            （每条记录也可以自带 username；也可以直接传记录数组）
+    所有记录一次校验，合法的记录合并为一次 upsert；返回每条记录的状态：
+      results[i] = {"index": i, "status": "ok" | "invalid" | "failed", "error"?: ...}
+    同一 (level, char) 出现多次时以最后一条为准
+    """
+    data = request.get_json(silent=True)
+    if isinstance(data, list):
+        data = {"records": data}
+    if not isinstance(data, dict) or not isinstance(data.get('records'), list):
+        return jsonify({"error": "records must be a list"}), 400
+    records = data['records']
+    if len(records) > MASTERY_BULK_MAX_ROWS:
+        return jsonify({"error": f"too many records (max {MASTERY_BULK_MAX_ROWS})"}), 400
+
+    results = []
+    rows = {}
+    for index, item in enumerate(records):
+        if not isinstance(item, dict):
+            results.append({"index": index, "status": "invalid", "error": "record must be an object"})
+            continue
+        fields = {"username": data.get('username'), **item}
+        # 有会话时记录一律归属令牌中的用户
+        if session_username():
+            fields['username'] = session_username()
+        payload, error = mastery_payload(fields)
+        if error:
+            results.append({"index": index, "status": "invalid", "error": error})
+            continue
+        results.append({"index": index, "status": "ok"})
+        # 同一个键在一条 upsert 语句中只能出现一次
+        rows[mastery_key(payload)] = payload
+
+    if rows:
+        try:
+            # 同步写入；写回缓冲中同键的旧值（包括正在刷写的批次）不会覆盖这次写入
+            mastery_writes.write_through(rows.values())
+        except Exception as e:
+            for result in results:
+                if result['status'] == 'ok':
+                    result.update(status="failed", error=str(e))
+        else:
+            for payload in rows.values():
+                mastery_cache.update(payload['username'], payload['level'], payload['char'], payload['record'])
+
+    saved = sum(1 for result in results if result['status'] == 'ok')
+    failed = len(results) - saved
+    if not failed:
+        status, code = "success", 200
+    elif saved:
+        status, code = "partial", 200
+    else:
+        status, code = "error", 500 if any(r['status'] == 'failed' for r in results) else 400
+    return jsonify({"status": status, "saved": saved, "failed": failed, "results": results}), code
+
+
+def flush_writes():
+    """立即刷写两个写回缓冲（异步服务模式关闭连接池前调用；atexit 时连接池已关闭）"""
+    return mastery_writes.flush() + progress_writes.flush()
+
+
+@hsk_bp.route('/mastery/cache/stats', methods=['GET'])
+def get_mastery_cache_stats():
+    """GET /mastery/cache/stats - 熟练度缓存命中与写回缓冲统计"""
+    return jsonify({
+        "cache": mastery_cache.stats(),
+        "write_behind": mastery_writes.stats(),
+        "progress_write_behind": progress_writes.stats()
+    }), 200
 
 # --- 4. TTS ---
-@hsk_bp.route('/tts')
-def tts():
+def tts_params(args):
+    """解析 /tts 的查询参数，返回 (text, voice, speed)；Flask 路由和异步服务模式 (async_main.py) 共用"""
     # 获取参数
-    text = request.args.get('text', '')
+    text = args.get('text', '')
     # 默认声音设置为 Yunjian (Male)
-    voice_name = request.args.get('voice', 'Mandarin Male (Yunjian)')
+    voice_name = args.get('voice', 'Mandarin Male (Yunjian)')
     # 获取语速参数，默认 0 (正常速度)
-    speed = request.args.get('speed', '0')
-
-    # 1. 声音映射（参考 tts_engine.py 的 VOICE_DICT）
-    VOICE_DICT = {
-        "Mandarin Female (Xiaoyi)": "zh-CN-XiaoyiNeural",
-        "Mandarin Female (Xiaoxiao)": "zh-CN-XiaoxiaoNeural",
-        "Mandarin Male (Yunxi)": "zh-CN-YunxiNeural",
-        "Mandarin Male (Yunjian)": "zh-CN-YunjianNeural",
-        "Mandarin Male (Yunxia)": "zh-CN-YunxiaNeural",
-        "Mandarin Male (Yunyang)": "zh-CN-YunyangNeural",
-    }
-    selected_voice = VOICE_DICT.get(voice_name, "zh-CN-YunjianNeural")
+    speed = args.get('speed', '0')
 
-    # 2. 语速格式化（参考 tts_engine.py 的 rate_str 逻辑）
+    # 1. 声音映射（与 TTS 工具共用 tts_engine.py 的 VOICE_DICT）
+    selected_voice = VOICE_DICT.get(voice_name, VOICE_DICT['Mandarin Male (Yunjian)'])
+
+    # 2. 语速（TTSEngine 内部格式化为 rate_str）
     try:
-        speed_val = int(speed)
-        # 限制范围在 -50% 到 +100% 之间，防止数值过大导致接口报错
-        speed_val = max(-100, min(100, speed_val))
-        rate_str = f"{speed_val:+d}%"
+        # 限制范围在 -100% 到 +100% 之间，防止数值过大导致接口报错
+        speed_val = max(-100, min(100, int(speed)))
     except ValueError:
-        rate_str = "+0%"
+        speed_val = 0
+    return text, selected_voice, speed_val
+
+
+@hsk_bp.route('/tts')
+def tts():
+    """
+    单词/句子发音：经共享的 TTSEngine 生成，复用其按内容寻址的音频磁盘缓存
+    （HSK 词表固定，绝大多数请求直接命中缓存文件；未命中时在进程共用的后台事件循环上合成）
+    """
+    text, selected_voice, speed = tts_params(request.args)
 
     try:
-        # 异步生成逻辑
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        # 传入 rate 和 voice 参数
-        communicate = edge_tts.Communicate(text, selected_voice, rate=rate_str)
-        audio_stream = io.BytesIO()
+        audio_path = tts_engine.generate_single_sentence_audio(text, selected_voice, speed)
+        if str(audio_path).startswith("Error"):
+            print(f"TTS Error: {audio_path}")
+            return audio_path, 500
         
-        async def stream():
-            async for chunk in communicate.stream():
-                if chunk["type"] == "audio": 
-                    audio_stream.write(chunk["data"])
-        
-        loop.run_until_complete(stream())
-        audio_stream.seek(0)
-        
-        return send_file(audio_stream, mimetype="audio/mpeg")
+        # 同一参数的音频内容不变，允许客户端缓存
+        with timed('disk'):
+            return send_file(audio_path, mimetype="audio/mpeg", max_age=TTS_CACHE_MAX_AGE)
     except Exception as e: 
         print(f"TTS Error: {e}")
         return str(e), 500
         
 # --- 5. 用户自定义词库 (CRUD + Review List) ---
 @hsk_bp.route('/custom/cards', methods=['POST'])
+@require_session
 def add_custom_card():
     """添加新卡片"""
     data = request.json
     payload = {
-        "username": data.get('username'),
+        "username": session_username(data.get('username')),
         "char": data.get('char'),
         "pinyin": data.get('pinyin'),
         "meaning": data.get('meaning'),
@@ -200,6 +409,7 @@ def add_custom_card():
     return jsonify({"status": "success"}), response.status_code
 
 @hsk_bp.route('/custom/cards/list/<username>', methods=['GET'])
+@require_session
 def get_custom_cards_list(username):
     """获取用户所有的自定义卡片（管理页面用）"""
     params = {
@@ -210,9 +420,13 @@ def get_custom_cards_list(username):
     return jsonify(response.json()), response.status_code
 
 @hsk_bp.route('/custom/cards/item/<card_id>', methods=['PATCH', 'DELETE'])
+@require_session
 def handle_single_card(card_id):
     """修改或删除特定卡片"""
     params = {"id": f"eq.{card_id}"}
+    # 有会话时只能修改自己的卡片
+    if session_username():
+        params["username"] = f"eq.{session_username()}"
     
     if request.method == 'PATCH':
         data = request.json
@@ -0,0 +1,89 @@
+# mastery_cache.py
+"""
+按用户缓存 word_mastery（进程内，带 TTL）
+
+- 读：get_user_mastery 命中时直接由内存生成 level_char 字典；未命中时一次读取该用户全部级别，
+      之后按级别筛选也不再访问 Supabase
+- 写：save_mastery 先写入缓存（本 worker 立即可见），再交给写回缓冲批量落库
+- 缓存在进程内：其它 worker 的写入要等本 worker 的缓存过期（ttl）、且对方的写回缓冲刷写后才可见，
+  最长约 MASTERY_CACHE_TTL + MASTERY_FLUSH_INTERVAL 秒；ttl <= 0 时不缓存，每次读取 Supabase
+"""
+import threading
+import time
+
+from .config import MASTERY_CACHE_TTL
+
+
+class MasteryCache:
+
+    def __init__(self, ttl=MASTERY_CACHE_TTL):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # username -> (loaded_at, {(level, char): record})，level 统一为字符串
+        self._users = {}
+        # 每个用户的写入序号：读取期间有写入时，读取结果不放入缓存
+        self._write_seq = {}
+        self._lock = threading.Lock()
+
+    def get(self, username, level=None):
+        """返回 {"level_char": record}；未命中或已过期返回 None"""
+        with self._lock:
+            entry = self._users.get(username)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return format_mastery(entry[1], level)
+
+    def write_seq(self, username):
+        with self._lock:
+            return self._write_seq.get(username, 0)
+
+    def put(self, username, records, seq):
+        """载入用户全部熟练度；seq 为读取前的写入序号，期间有写入则放弃（下次读取重新载入）"""
+        with self._lock:
+            if self.ttl <= 0 or self._write_seq.get(username, 0) != seq:
+                return False
+            self._users[username] = (time.monotonic(), records)
+            return True
+
+    def update(self, username, level, char, record):
+        with self._lock:
+            self._write_seq[username] = self._write_seq.get(username, 0) + 1
+            entry = self._users.get(username)
+            if entry is not None:
+                entry[1][(str(level), char)] = record
+
+    def invalidate(self, username=None):
+        with self._lock:
+            if username is None:
+                for name in self._users:
+                    self._write_seq[name] = self._write_seq.get(name, 0) + 1
+                self._users.clear()
+            else:
+                self._write_seq[username] = self._write_seq.get(username, 0) + 1
+                self._users.pop(username, None)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'ttl': self.ttl,
+                'users': len(self._users),
+                'words': sum(len(entry[1]) for entry in self._users.values())
+            }
+
+
+def format_mastery(records, level=None):
+    """{(level, char): record} -> 前端使用的 {"level_char": record}，可按级别筛选"""
+    if level is None:
+        return {f"{lvl}_{char}": record for (lvl, char), record in records.items()}
+    level = str(level)
+    return {f"{lvl}_{char}": record for (lvl, char), record in records.items() if lvl == level}
+
+
+mastery_cache = MasteryCache()
@@ -0,0 +1,167 @@
+# write_behind.py
+"""
+通用的写回缓冲（write-behind）
+
+- add(row)：按 key 合并，同一个 key 在两次刷写之间的多次写入只保留最后一次
+- merge(row)：按 key 合并字段（部分更新），同一个 key 的多次写入合并成一行，后写的字段覆盖先写的
+- 后台线程每隔 interval 秒刷写一次；缓冲行数达到 max_rows 时立即唤醒刷写
+- interval <= 0 时为同步模式：add / merge 直接写入存储（不缓冲），失败时异常抛给调用方
+- 进程退出时（atexit，包括 gunicorn worker 正常退出和超时被中止）再刷写一次；
+  进程被 SIGKILL 杀掉（或 OOM）时，最多丢失最近 interval 秒内的写入
+- 缓冲在进程内：pending() 只覆盖本 worker 的写入，其它 worker 要等刷写后才能从 Supabase 读到
+- 刷写失败：连接错误 / 5xx 的行放回缓冲等待下次重试（不覆盖期间的新写入）；4xx 视为数据问题，记录后丢弃
+- pending()：尚未写入 Supabase 的行（含正在刷写的批次），按最近写入的先后排序，读路径用它覆盖从 Supabase 读到的旧值
+"""
+import atexit
+import os
+import threading
+
+from supabase_client import SupabaseAPIError
+
+
+class WriteBehindBuffer:
+
+    def __init__(self, name, flush_rows, key_of, interval, max_rows):
+        """
+        flush_rows(rows): 把一批行写入存储（批量 upsert），失败时抛出异常
+        key_of(row):      合并用的键，例如 (username, level, char)
+        """
+        self.name = name
+        self.flush_rows = flush_rows
+        self.key_of = key_of
+        self.interval = interval
+        self.max_rows = max_rows
+        self.written = 0
+        self.coalesced = 0
+        self.failures = 0
+        self._pending = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        # 保证同一时间只有一个刷写在进行（后台线程、阈值唤醒、atexit 可能同时触发）
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread_pid = None
+        atexit.register(self.flush)
+
+    def add(self, row):
+        self._put(row, merge=False)
+
+    def merge(self, row):
+        self._put(row, merge=True)
+
+    @property
+    def synchronous(self):
+        """同步模式：每次写入都直接访问存储（异步服务模式下不能在事件循环上调用）"""
+        return self.interval <= 0
+
+    def _put(self, row, merge):
+        if self.synchronous:
+            # 没有后台线程可以重试，失败必须让调用方知道
+            self.write_through([row])
+            return
+        key = self.key_of(row)
+        with self._lock:
+            # 重新插入到末尾：_pending 按最近一次写入排序
+            previous = self._pending.pop(key, None)
+            if previous is not None:
+                self.coalesced += 1
+                if merge:
+                    row = {**previous, **row}
+            self._pending[key] = row
+            size = len(self._pending)
+        self._ensure_thread()
+        if size >= self.max_rows:
+            self._wakeup.set()
+
+    def write_through(self, rows):
+        """
+        绕过缓冲同步写入 rows（失败时抛出异常），同 key 尚未刷写的旧值不再写入
+        持有刷写锁进行：正在刷写的批次先完成，旧值不会在这次写入之后落库覆盖它；
+        写入期间到达的新值留在缓冲中照常刷写；写入失败时被替代的旧值放回缓冲
+        """
+        rows = list(rows)
+        with self._flush_lock:
+            with self._lock:
+                superseded = {}
+                for row in rows:
+                    key = self.key_of(row)
+                    if key in self._pending:
+                        superseded[key] = self._pending.pop(key)
+            try:
+                self.flush_rows(rows)
+            except Exception:
+                with self._lock:
+                    self.failures += 1
+                    for key, row in superseded.items():
+                        self._pending.setdefault(key, row)
+                raise
+            with self._lock:
+                self.written += len(rows)
+
+    def pending(self, predicate=None):
+        """尚未落库的行，最近写入的在后；新写入的字段覆盖正在刷写的批次"""
+        with self._lock:
+            rows = {key: row for key, row in self._inflight.items() if key not in self._pending}
+            for key, row in self._pending.items():
+                rows[key] = {**self._inflight[key], **row} if key in self._inflight else row
+        return [row for row in rows.values() if predicate is None or predicate(row)]
+
+    def flush(self):
+        """把当前缓冲写入存储，返回写入的行数"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch, self._pending = self._pending, {}
+                self._inflight = batch
+            try:
+                self.flush_rows(list(batch.values()))
+            except Exception as e:
+                retry = not isinstance(e, SupabaseAPIError) or e.status_code >= 500
+                with self._lock:
+                    self.failures += 1
+                    if retry:
+                        # 期间的新写入优先：字段合并在失败批次之上
+                        for key, row in batch.items():
+                            newer = self._pending.get(key)
+                            self._pending[key] = row if newer is None else {**row, **newer}
+                    self._inflight = {}
+                action = "稍后重试" if retry else "已丢弃"
+                print(f"❌ {self.name} 刷写 {len(batch)} 行失败（{action}）: {e}")
+                return 0
+            with self._lock:
+                self._inflight = {}
+                self.written += len(batch)
+            return len(batch)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pending': len(self._pending),
+                'inflight': len(self._inflight),
+                'written': self.written,
+                'coalesced': self.coalesced,
+                'failures': self.failures,
+                'interval': self.interval,
+                'max_rows': self.max_rows
+            }
+
+    def _ensure_thread(self):
+        """首次写入时启动后台刷写线程；gunicorn fork 后 pid 变化，在子进程里重新启动"""
+        pid = os.getpid()
+        if self._thread_pid == pid:
+            return
+        with self._lock:
+            if self._thread_pid == pid:
+                return
+            self._thread_pid = pid
+        threading.Thread(target=self._run, name=f'write-behind-{self.name}', daemon=True).start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"❌ {self.name} 后台刷写异常: {e}")
@@ -1,20 +1,109 @@
-from flask import Flask
+import threading
+import time
+from flask import Flask, jsonify, request
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-from flashcard_english.flashcard_app import flashcard_bp
+import server_timing
+from server_timing import timed
+from flashcard_english.flashcard_app import flashcard_bp, check_initial_data, warmup_caches
 from mandarin_tts_tool.tts_app import tts_bp
 from hsk_learning_curve.hsk_app import hsk_bp
 
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """jsonify / request.get_json 的序列化耗时计入 Server-Timing 的 json"""
+
+    def dumps(self, obj, **kwargs):
+        with timed('json'):
+            return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        with timed('json'):
+            return super().loads(s, **kwargs)
+
+
 app = Flask(__name__)
+app.json = TimedJSONProvider(app)
 CORS(app)
 @app.route('/hello')
 def hello():
     return "Hello! The server is working!"
 
+# ==========================================================
+# Server-Timing：每个响应附带总耗时；明细模式下附带耗时分解（Supabase / edge-tts / 百度 OCR / 磁盘缓存 / JSON / 处理 CPU）
+# ==========================================================
+@app.before_request
+def start_timing():
+    server_timing.start_request()
+
+
+@app.after_request
+def add_server_timing(response):
+    # 分类明细只在 SERVER_TIMING_DETAIL / 剖析 / debug 模式下输出
+    detail = server_timing.DETAIL or app.debug
+    value = server_timing.finish_request(f"{request.method} {request.path}", detail)
+    if value:
+        response.headers['Server-Timing'] = value
+        if detail:
+            # 前端跨域读取 PerformanceResourceTiming.serverTiming 需要此头
+            response.headers['Timing-Allow-Origin'] = server_timing.ALLOW_ORIGIN
+    return response
+
+
+@app.teardown_request
+def discard_timing(exc):
+    server_timing.abort_request()
+
+
 # 注册蓝图
 app.register_blueprint(flashcard_bp, url_prefix='/api/flashcard')
 app.register_blueprint(tts_bp, url_prefix='/api/tts')
 app.register_blueprint(hsk_bp, url_prefix='/api/hsk')
 
+
+# ==========================================================
+# 启动预热 / 就绪检查
+# ==========================================================
+# 初始数据检查每次部署只做一次（gunicorn.conf.py 的 when_ready，或 `flask --app main warmup`），
+# 每个 worker 启动后在后台预热连接池和缓存，完成前 /ready 返回 503；
+# 没有安排预热的进程（flask run 等）缓存按需加载，/ready 直接返回 200
+warmup_status = {'ready': False, 'scheduled': False, 'started_at': None, 'finished_at': None, 'modules': {}, 'error': None}
+
+
+def warmup():
+    """预热当前 worker（建立 Supabase 连接池、加载 SRS 缓存）"""
+    warmup_status['started_at'] = time.time()
+    try:
+        warmup_status['modules'] = warmup_caches()
+    except Exception as e:
+        warmup_status['error'] = str(e)
+        print(f"❌ 预热失败: {e}")
+    warmup_status['finished_at'] = time.time()
+    warmup_status['ready'] = True
+    print(f"🔥 worker 预热完成，用时 {warmup_status['finished_at'] - warmup_status['started_at']:.2f}s")
+
+
+def start_warmup():
+    warmup_status['scheduled'] = True
+    threading.Thread(target=warmup, name='warmup', daemon=True).start()
+
+
+@app.route('/ready')
+def ready():
+    """就绪检查：当前 worker 预热完成（或未安排预热）时返回 200，供负载均衡/部署脚本使用"""
+    ready = warmup_status['ready'] or not warmup_status['scheduled']
+    return jsonify(warmup_status), 200 if ready else 503
+
+
+@app.cli.command('warmup')
+def warmup_command():
+    """flask --app main warmup：检查/导入初始数据并预热缓存"""
+    check_initial_data()
+    warmup()
+
+
 if __name__ == "__main__":
+    check_initial_data()
+    start_warmup()
     # 统一监听 8000 端口
-    app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=5000)
@@ -3,6 +3,7 @@ import os
 import re
 import sys
 from aip import AipOcr
+from server_timing import timed
 
 # --- Baidu OCR Configuration (Extracted from your existing code) ---
 BAIDU_OCR_CONFIG = {
@@ -42,9 +43,19 @@ class OCREngine:
             # Read the image file as binary data
             with open(image_path, 'rb') as fp:
                 image_data = fp.read()
-            
+        except Exception as e:
+            return f"OCR Processing Error: {str(e)}"
+        return self.ocr_image_data(image_data)
+
+    def ocr_image_data(self, image_data):
+        """
+        Same as ocr_image, but takes the image bytes directly (no temp file).
+        Blocking: async callers should run it in an executor.
+        """
+        try:
             # Call the Baidu API (this is the blocking I/O operation)
-            result = self.client.basicGeneral(image_data)
+            with timed('baidu-ocr'):
+                result = self.client.basicGeneral(image_data)
             
             # --- Result Parsing and Custom Filtering Logic ---
             if 'error_code' in result:
@@ -5,6 +5,7 @@ import os
 import sys
 import tempfile
 from pathlib import Path
+from server_timing import timed
 
 # 导入您提供的OCR和TTS引擎
 from .ocr_engine import OCREngine
@@ -20,6 +21,25 @@ tts_engine = TTSEngine(clear_cache_on_start=False)
 CACHE_DIR = Path(__file__).parent / "audio_cache"
 CACHE_DIR.mkdir(exist_ok=True)
 
+def parse_tts_request(data, text_key, empty_message):
+    """
+    校验生成音频接口的请求体，返回 (text, voice_id, speed, error)
+    Flask 路由和异步服务模式 (async_main.py) 共用同一套校验
+    """
+    text = data.get(text_key, '').strip()
+    voice = data.get('voice', 'Mandarin Female (Xiaoyi)')
+    speed = int(data.get('speed', 0))
+    if speed < -50 or speed > 100:
+        return None, None, None, "语速范围必须在-50% ~ +100%之间"
+    
+    if not text:
+        return None, None, None, empty_message
+    
+    # 验证语音是否有效
+    if voice not in VOICE_DICT:
+        voice = 'Mandarin Female (Xiaoyi)'
+    return text, VOICE_DICT[voice], speed, None
+
 @tts_bp.route('/split-text', methods=['POST'])
 def split_text():
     """分句接口：接收文本，返回分句结果"""
@@ -43,23 +63,12 @@ def split_text():
 def generate_single_audio():
     """生成单句音频接口"""
     try:
-        data = request.get_json()
-        sentence = data.get('sentence', '').strip()
-        voice = data.get('voice', 'Mandarin Female (Xiaoyi)')
-        speed = int(data.get('speed', 0))
-        
-        if speed < -50 or speed > 100:
-            return jsonify({"error": "语速范围必须在-50% ~ +100%之间"}), 400
-        
-        if not sentence:
-            return jsonify({"error": "句子不能为空"}), 400
-        
-        # 验证语音是否有效
-        if voice not in VOICE_DICT:
-            voice = 'Mandarin Female (Xiaoyi)'
+        sentence, voice, speed, error = parse_tts_request(request.get_json(), 'sentence', "句子不能为空")
+        if error:
+            return jsonify({"error": error}), 400
         
         # 生成音频
-        audio_path = tts_engine.generate_single_sentence_audio(sentence, VOICE_DICT[voice], speed)
+        audio_path = tts_engine.generate_single_sentence_audio(sentence, voice, speed)
         
         if str(audio_path).startswith("Error"):
             return jsonify({"error": audio_path}), 500
@@ -77,20 +86,11 @@ def generate_single_audio():
 def generate_full_audio():
     """生成全文音频接口"""
     try:
-        data = request.get_json()
-        text = data.get('text', '').strip()
-        voice = data.get('voice', 'Mandarin Female (Xiaoyi)')
-        speed = int(data.get('speed', 0))
-        if speed < -50 or speed > 100:
-            return jsonify({"error": "语速范围必须在-50% ~ +100%之间"}), 400
-        
-        if not text:
-            return jsonify({"error": "文本不能为空"}), 400
-        
-        if voice not in VOICE_DICT:
-            voice = 'Mandarin Female (Xiaoyi)'
+        text, voice, speed, error = parse_tts_request(request.get_json(), 'text', "文本不能为空")
+        if error:
+            return jsonify({"error": error}), 400
         
-        audio_path, sentences = tts_engine.generate_full_audio(text, VOICE_DICT[voice], speed)
+        audio_path, sentences = tts_engine.generate_full_audio(text, voice, speed)
         
         if str(audio_path).startswith("Error"):
             return jsonify({"error": audio_path}), 500
@@ -113,7 +113,7 @@ def ocr_image():
         
         # 保存上传的图片到临时文件
         image_file = request.files['image']
-        with tempfile.NamedTemporaryFile(suffix=os.path.splitext(image_file.filename)[1], delete=False) as temp_file:
+        with timed('disk'), tempfile.NamedTemporaryFile(suffix=os.path.splitext(image_file.filename)[1], delete=False) as temp_file:
             image_file.save(temp_file)
             temp_file_path = temp_file.name
         
@@ -121,7 +121,8 @@ def ocr_image():
         result = ocr_engine.ocr_image(temp_file_path)
         
         # 删除临时文件
-        os.unlink(temp_file_path)
+        with timed('disk'):
+            os.unlink(temp_file_path)
         
         # 判断结果是否为错误
         if result.startswith(("Error:", "Warning:")):
@@ -137,7 +138,10 @@ def ocr_image():
 @tts_bp.route('/audio/<filename>')
 def serve_audio(filename):
     """提供音频文件访问"""
-    audio_path = os.path.join(tts_engine._audio_dir, filename)
-    if os.path.exists(audio_path):
-        return send_file(audio_path, mimetype='audio/mpeg')
+    audio_path = tts_engine.cached_audio_path(filename)
+    if audio_path is None:
+        abort(404)
+    with timed('disk'):
+        if os.path.isfile(audio_path):
+            return send_file(audio_path, mimetype='audio/mpeg')
     abort(404)
@@ -7,9 +7,11 @@ import asyncio
 import edge_tts
 import time
 import shutil
+import threading
 import ssl
 import certifi
 from pathlib import Path
+from server_timing import timed
 
 # --- 跨平台配置 ---
 # Windows/macOS通用语音字典
@@ -48,6 +50,37 @@ def run_async_task(func, *args):
         asyncio.set_event_loop(loop)
     return loop.run_until_complete(func(*args))
 
+# --- 后台事件循环：服务端的同步调用方（Flask 视图线程）共用一个长期运行的事件循环 ---
+# 每个请求新建事件循环既有创建开销，又从不关闭（泄漏）；这里每个 worker 进程只有一个
+TTS_TIMEOUT = 60  # 单次合成的最长等待时间（秒）
+
+_background_loop = None
+_background_loop_pid = None
+_background_loop_lock = threading.Lock()
+
+
+def get_background_loop():
+    """获取当前进程的后台事件循环（首次调用时启动；gunicorn fork 后在子进程里重新创建）"""
+    global _background_loop, _background_loop_pid
+    pid = os.getpid()
+    if _background_loop is None or _background_loop_pid != pid:
+        with _background_loop_lock:
+            if _background_loop is None or _background_loop_pid != pid:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='tts-loop', daemon=True).start()
+                _background_loop, _background_loop_pid = loop, pid
+    return _background_loop
+
+
+def run_on_background_loop(func, *args):
+    """在后台事件循环上执行异步函数并等待结果；超时后取消任务并抛出 TimeoutError"""
+    future = asyncio.run_coroutine_threadsafe(func(*args), get_background_loop())
+    try:
+        return future.result(timeout=TTS_TIMEOUT)
+    except TimeoutError:
+        future.cancel()
+        raise
+
 # --- 跨平台路径工具 ---
 def get_audio_dir(app_name="MandarinTTS", sub_dir="audio_cache"):
     """
@@ -162,12 +195,25 @@ class TTSEngine:
         try:
             rate_str = f"{rate:+d}%" if isinstance(rate, int) else f"{rate}%"
             communicate = edge_tts.Communicate(text, voice, rate=rate_str)
-            await communicate.save(filepath)
+            # 先写临时文件再原子替换：并发请求不会读到写了一半的缓存文件
+            temp_path = f"{filepath}.{os.getpid()}.{threading.get_ident()}.{id(communicate)}.tmp"
+            try:
+                with timed('edge-tts'):
+                    await communicate.save(temp_path)
+                os.replace(temp_path, filepath)
+            finally:
+                if os.path.exists(temp_path):
+                    os.unlink(temp_path)
             print(f"Generated audio: {filepath}")
         except Exception as e:
             print(f"Error generating audio for '{text[:20]}...': {e}")
             raise  # 重新抛出异常，让上层处理
 
+    def _is_cached(self, path):
+        """磁盘缓存命中检查（计入 Server-Timing 的 disk）"""
+        with timed('disk'):
+            return Path(path).exists()
+
     def _get_audio_file_path(self, text, voice, rate, prefix="full"):
         """生成跨平台安全的文件路径"""
         voice_key = voice.replace('-', '_').replace(':', '_')  # 替换Windows非法字符
@@ -176,8 +222,17 @@ class TTSEngine:
         filename = f"{prefix}_{voice_key}_{rate}_{safe_hash}.mp3"
         # 使用Path拼接（跨平台兼容）
         return str(Path(self._audio_dir) / filename)
+
+    def cached_audio_path(self, filename):
+        """
+        按文件名返回缓存目录中的音频路径（供 /audio/<filename> 使用）
+        只接受单纯的文件名：含路径分隔符、'.'、'..' 时返回 None，保证不会越出缓存目录
+        """
+        if not filename or filename in ('.', '..') or '/' in filename or '\\' in filename:
+            return None
+        return str(Path(self._audio_dir) / filename)
         
-    # --- 完整音频生成（替换asyncio.run为run_async_task）---
+    # --- 完整音频生成（在后台事件循环上运行）---
     def generate_full_audio(self, text, voice, rate):
         if not text.strip():
             return "Error: Input text is empty.", []
@@ -187,15 +242,15 @@ class TTSEngine:
         
         cached_path = self._get_audio_file_path(full_text_clean, voice, rate, prefix="full")
 
-        if Path(cached_path).exists():
+        if self._is_cached(cached_path):
             print(f"TTS Full Cache Hit: Found audio at {cached_path}")
             return cached_path, sentences
         
         print(f"TTS Full Cache Miss: Generating new audio to {cached_path}")
         
         try:
-            # 替换asyncio.run为跨平台的run_async_task
-            run_async_task(self._async_generate, full_text_clean, voice, rate, cached_path)
+            # 在本进程共用的后台事件循环上生成
+            run_on_background_loop(self._async_generate, full_text_clean, voice, rate, cached_path)
             return cached_path, sentences
         except Exception as e:
             return f"Error: TTS Generation Failed: {str(e)}", []
@@ -207,18 +262,41 @@ class TTSEngine:
 
         cached_path = self._get_audio_file_path(sentence, voice, rate, prefix="single")
 
-        if Path(cached_path).exists():
+        if self._is_cached(cached_path):
             print(f"TTS Single Cache Hit: Found audio at {cached_path}")
             return cached_path
         
         print(f"TTS Single Cache Miss: Generating new single audio to {cached_path}")
         
         try:
-            run_async_task(self._async_process_single_sentence, sentence, voice, rate)
+            result = run_on_background_loop(self._async_process_single_sentence, sentence, voice, rate)
+            if str(result).startswith("Error"):
+                return result
             return cached_path
         except Exception as e:
             return f"Error: TTS Generation Failed: {str(e)}"
 
+    # --- 异步版本：直接在调用方的事件循环上运行 edge-tts（异步服务模式 async_main.py 使用）---
+    async def generate_full_audio_async(self, text, voice, rate):
+        if not text.strip():
+            return "Error: Input text is empty.", []
+
+        sentences = self.text_to_sentences(text)
+        full_text_clean = "".join(sentences)
+        cached_path = self._get_audio_file_path(full_text_clean, voice, rate, prefix="full")
+
+        if self._is_cached(cached_path):
+            return cached_path, sentences
+
+        try:
+            await self._async_generate(full_text_clean, voice, rate, cached_path)
+            return cached_path, sentences
+        except Exception as e:
+            return f"Error: TTS Generation Failed: {str(e)}", []
+
+    async def generate_single_sentence_audio_async(self, sentence, voice, rate):
+        return await self._async_process_single_sentence(sentence, voice, rate)
+
     async def _async_process_single_sentence(self, sentence, voice, rate):
         """异步处理单句（保持不变）"""
         if not sentence.strip():
@@ -226,7 +304,7 @@ class TTSEngine:
 
         cached_path = self._get_audio_file_path(sentence, voice, rate, prefix="single")
 
-        if Path(cached_path).exists():
+        if self._is_cached(cached_path):
             return cached_path
         
         print(f"TTS Single Cache Miss: Generating new single audio to {cached_path}")
@@ -0,0 +1,168 @@
+# server_timing.py
+"""
+请求耗时分解：Server-Timing 响应头 + 按阈值采样的性能剖析
+
+- 各处对外调用用 timed('<类别>') 包起来（supabase / edge-tts / baidu-ocr / disk / json），
+  耗时累加到当前请求的 contextvar 上；不在请求中时（预热线程、命令行）不做任何记录
+- main.py 的 before_request / after_request 调用 start_request / finish_request，
+  生成形如 `supabase;dur=41.2;desc="3 calls", cpu;dur=5.1, total;dur=52.7` 的 Server-Timing 头；
+  分类明细只在 SERVER_TIMING_DETAIL=1、开启剖析或 Flask debug 时输出，否则只有 `total;dur=...`
+- 线程池中的任务需要用 contextvars.copy_context().run 提交，才能计入发起它的请求
+- SERVER_PROFILE_THRESHOLD_MS 设置后，按 SERVER_PROFILE_SAMPLE_RATE 采样的请求会在处理线程上启用剖析器，
+  总耗时超过阈值的请求把结果写入 SERVER_PROFILE_DIR（cProfile 的 .prof，或 pyinstrument 的 .html），
+  文件名出现在 Server-Timing 的 profile 项中
+"""
+import contextvars
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+# --- 剖析配置（可通过环境变量覆盖）---
+PROFILE_THRESHOLD_MS = float(os.environ['SERVER_PROFILE_THRESHOLD_MS']) \
+    if os.environ.get('SERVER_PROFILE_THRESHOLD_MS') else None  # None = 不剖析
+PROFILE_SAMPLE_RATE = float(os.environ.get('SERVER_PROFILE_SAMPLE_RATE', 0.05))
+PROFILE_DIR = os.environ.get('SERVER_PROFILE_DIR', 'profiles')
+PROFILER = os.environ.get('SERVER_PROFILER', 'cprofile')  # cprofile | pyinstrument
+# 是否输出分类明细（各依赖的耗时与调用次数、剖析文件名）；默认只输出总耗时，不向外暴露内部结构
+DETAIL = os.environ.get('SERVER_TIMING_DETAIL', '').lower() in ('1', 'true', 'yes') \
+    or PROFILE_THRESHOLD_MS is not None
+# 明细模式下的 Timing-Allow-Origin（允许哪些来源的前端读取 serverTiming）
+ALLOW_ORIGIN = os.environ.get('SERVER_TIMING_ALLOW_ORIGIN', '*')
+
+# Server-Timing 中各类别的输出顺序
+CATEGORIES = ('supabase', 'edge-tts', 'baidu-ocr', 'disk', 'json')
+
+_current = contextvars.ContextVar('server_timing', default=None)
+
+
+class RequestTimings:
+    """单个请求的耗时累加器；并发的子任务（线程池）可能同时写入，所以加锁"""
+    __slots__ = ('wall_start', 'cpu_start', 'totals', 'counts', 'profiler', 'lock')
+
+    def __init__(self):
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.thread_time()
+        self.totals = {}
+        self.counts = {}
+        self.profiler = None
+        self.lock = threading.Lock()
+
+    def add(self, category, seconds):
+        with self.lock:
+            self.totals[category] = self.totals.get(category, 0.0) + seconds
+            self.counts[category] = self.counts.get(category, 0) + 1
+
+
+@contextmanager
+def timed(category):
+    """把 with 块的耗时计入当前请求的 category；不在请求中时直接执行"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(category, time.perf_counter() - start)
+
+
+def start_request():
+    timings = RequestTimings()
+    _current.set(timings)
+    if PROFILE_THRESHOLD_MS is not None and random.random() < PROFILE_SAMPLE_RATE:
+        timings.profiler = _start_profiler()
+    return timings
+
+
+def finish_request(label, detail=DETAIL):
+    """
+    结束当前请求的计时，返回 Server-Timing 头的值（当前不在请求中时返回 None）
+    detail 为 False 时只返回总耗时
+    """
+    timings = _current.get()
+    if timings is None:
+        return None
+    _current.set(None)
+
+    total_ms = (time.perf_counter() - timings.wall_start) * 1000
+    cpu_ms = (time.thread_time() - timings.cpu_start) * 1000
+    path = _stop_profiler(timings.profiler, label, total_ms) if timings.profiler is not None else None
+    if not detail:
+        return f'total;dur={total_ms:.1f}'
+
+    metrics = []
+    for category in CATEGORIES:
+        if category in timings.totals:
+            count = timings.counts[category]
+            metrics.append(f'{category};dur={timings.totals[category] * 1000:.1f};desc="{count} calls"')
+    metrics.append(f'cpu;dur={cpu_ms:.1f};desc="handler CPU"')
+    metrics.append(f'total;dur={total_ms:.1f}')
+
+    if path:
+        metrics.append(f'profile;desc="{os.path.basename(path)}"')
+    return ', '.join(metrics)
+
+
+def abort_request():
+    """请求结束时的兜底清理（teardown_request）：未经过 finish_request 时停止剖析器并丢弃计时"""
+    timings = _current.get()
+    if timings is None:
+        return
+    _current.set(None)
+    if timings.profiler is not None:
+        if hasattr(timings.profiler, 'disable'):
+            timings.profiler.disable()
+        else:
+            timings.profiler.stop()
+
+
+# ==========================================================
+# 剖析器（pyinstrument 为可选依赖，未安装时退回 cProfile）
+# ==========================================================
+
+def _start_profiler():
+    if PROFILER == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+            profiler = Profiler(async_mode='disabled')
+            profiler.start()
+            return profiler
+        except ImportError:
+            pass
+    import cProfile
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # 同一线程上已有剖析器在运行（例如整个进程在 cProfile 下启动）
+        return None
+    return profiler
+
+
+def _stop_profiler(profiler, label, total_ms):
+    """停止剖析；超过阈值时写入文件并返回路径"""
+    is_cprofile = hasattr(profiler, 'disable')
+    if is_cprofile:
+        profiler.disable()
+    else:
+        profiler.stop()
+    if total_ms < PROFILE_THRESHOLD_MS:
+        return None
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    safe_label = ''.join(c if c.isalnum() else '_' for c in label).strip('_')[:80]
+    now = time.time()
+    stamp = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}.{int(now * 1000) % 1000:03d}"
+    name = f"{stamp}_{int(total_ms)}ms_{safe_label}_{os.getpid()}_{threading.get_ident() % 100000}"
+    if is_cprofile:
+        path = os.path.join(PROFILE_DIR, name + '.prof')
+        profiler.dump_stats(path)
+    else:
+        path = os.path.join(PROFILE_DIR, name + '.html')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(profiler.output_html())
+    print(f"🐢 慢请求 {label} 用时 {total_ms:.0f}ms，剖析结果: {path}")
+    return path
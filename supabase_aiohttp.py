@@ -0,0 +1,145 @@
+# supabase_aiohttp.py
+"""
+异步服务模式 (async_main.py) 下的 Supabase HTTP 客户端
+
+- 每个 worker 在服务器事件循环上持有一个带连接池的 aiohttp.ClientSession，Supabase 请求不再占用线程等待网络
+- 超时、重试沿用 supabase_client 的配置：幂等方法在连接失败或 502/503/504 时按指数退避重试
+- install() 在 supabase_client 的共享 Session 上挂载 AiohttpAdapter：现有蓝图里的
+  supabase_client.request(...) 无需改动，实际的 HTTP I/O 都在事件循环上通过这个连接池完成
+"""
+import asyncio
+import os
+import aiohttp
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from yarl import URL
+
+import supabase_client
+from supabase_client import (
+    CONNECT_TIMEOUT, READ_TIMEOUT, MAX_RETRIES, BACKOFF_FACTOR, IDEMPOTENT_METHODS, RETRY_STATUS
+)
+
+# 事件循环上的连接可以比线程池多得多：等待 Supabase 的请求只占一个 socket，不占线程
+ASYNC_POOL_SIZE = int(os.environ.get('SUPABASE_ASYNC_POOL_SIZE', 100))
+
+_session = None
+_loop = None
+
+
+async def start():
+    """在服务器事件循环上创建连接池（aiohttp 应用的 on_startup 中调用）"""
+    global _session, _loop
+    _loop = asyncio.get_running_loop()
+    connector = aiohttp.TCPConnector(limit=ASYNC_POOL_SIZE, limit_per_host=ASYNC_POOL_SIZE)
+    _session = aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(sock_connect=CONNECT_TIMEOUT, sock_read=READ_TIMEOUT),
+        auto_decompress=True,
+    )
+    return _session
+
+
+async def close():
+    global _session, _loop
+    if _session is not None:
+        await _session.close()
+    _session = None
+    _loop = None
+
+
+def _timeout(timeout):
+    """requests 风格的 timeout（数字或 (connect, read) 元组）转换为 aiohttp.ClientTimeout"""
+    if timeout is None:
+        connect, read = CONNECT_TIMEOUT, READ_TIMEOUT
+    elif isinstance(timeout, tuple):
+        connect, read = timeout
+    else:
+        connect = read = timeout
+    return aiohttp.ClientTimeout(sock_connect=connect, sock_read=read)
+
+
+async def request(method, url, headers=None, data=None, timeout=None):
+    """
+    通过连接池发送请求，返回 (status, reason, headers, body)
+    url 必须已经编码好（requests 的 PreparedRequest.url），不再二次编码
+    """
+    if _session is None:
+        raise RuntimeError("supabase_aiohttp 尚未启动（需要先在事件循环上调用 start()）")
+
+    method = method.upper()
+    attempts = MAX_RETRIES + 1 if method in IDEMPOTENT_METHODS else 1
+    for attempt in range(attempts):
+        last = attempt == attempts - 1
+        try:
+            async with _session.request(method, URL(url, encoded=True), headers=headers, data=data,
+                                        timeout=_timeout(timeout), allow_redirects=False) as response:
+                body = await response.read()
+                if response.status not in RETRY_STATUS or last:
+                    return response.status, response.reason, list(response.headers.items()), body
+        except aiohttp.ClientConnectionError:
+            if last:
+                raise
+        await asyncio.sleep(BACKOFF_FACTOR * (2 ** attempt))
+
+
+class AiohttpAdapter(BaseAdapter):
+    """
+    requests 传输适配器：把请求交给事件循环上的 aiohttp 连接池执行，调用线程只等待结果
+    只能在事件循环以外的线程（WSGI 桥接线程、预热线程等）中使用
+    """
+
+    def send(self, prepared, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        loop = _loop
+        if loop is None:
+            raise requests.ConnectionError("supabase_aiohttp 尚未启动", request=prepared)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            raise RuntimeError("不能在事件循环线程中同步调用 Supabase，请改用 await supabase_aiohttp.request(...)")
+
+        body = prepared.body
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        future = asyncio.run_coroutine_threadsafe(
+            request(prepared.method, prepared.url, dict(prepared.headers), body, timeout), loop
+        )
+        try:
+            status, reason, headers, content = future.result()
+        except asyncio.TimeoutError as e:
+            raise requests.exceptions.ReadTimeout(e, request=prepared)
+        except aiohttp.ClientConnectionError as e:
+            raise requests.ConnectionError(e, request=prepared)
+        return self.build_response(prepared, status, reason, headers, content)
+
+    def build_response(self, prepared, status, reason, headers, content):
+        response = requests.Response()
+        response.status_code = status
+        response.reason = reason
+        response.headers = CaseInsensitiveDict(headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = prepared.url
+        response.request = prepared
+        response.connection = self
+        response._content = content
+        response._content_consumed = True
+        return response
+
+    def close(self):
+        pass
+
+
+def install():
+    """在 supabase_client 的共享 Session 上为 Supabase 地址挂载 AiohttpAdapter"""
+    from flashcard_english.config import SUPABASE_URL as FLASHCARD_URL
+    from hsk_learning_curve.config import SUPABASE_URL as HSK_URL
+
+    adapter = AiohttpAdapter()
+    session = supabase_client.get_session()
+    for base_url in {FLASHCARD_URL, HSK_URL}:
+        session.mount(base_url, adapter)
+    print(f"🔌 Supabase 请求改走 aiohttp 连接池（上限 {ASYNC_POOL_SIZE} 个连接）")
+    return adapter
@@ -0,0 +1,84 @@
+# supabase_client.py
+"""
+所有蓝图共享的 Supabase HTTP 客户端
+
+- 每个 worker 进程持有一个带连接池的 requests.Session（keep-alive，复用 TCP+TLS）
+- 所有请求默认带连接/读取超时，避免挂起的 Supabase 调用永久占用 gunicorn worker
+- 幂等方法（GET/HEAD/PUT/DELETE/OPTIONS）在连接失败或 5xx 时按指数退避重试
+"""
+import os
+import threading
+import requests
+from server_timing import timed
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# --- 连接池 / 超时 / 重试配置（可通过环境变量覆盖）---
+POOL_SIZE = int(os.environ.get('SUPABASE_POOL_SIZE', 10))
+CONNECT_TIMEOUT = float(os.environ.get('SUPABASE_CONNECT_TIMEOUT', 3.05))
+READ_TIMEOUT = float(os.environ.get('SUPABASE_READ_TIMEOUT', 15))
+MAX_RETRIES = int(os.environ.get('SUPABASE_MAX_RETRIES', 3))
+BACKOFF_FACTOR = float(os.environ.get('SUPABASE_BACKOFF_FACTOR', 0.3))
+
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'])
+RETRY_STATUS = (502, 503, 504)
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+class SupabaseAPIError(Exception):
+    """Supabase 返回非 2xx 状态码时抛出，保留 status_code 供调用方区分处理"""
+
+    def __init__(self, status_code, message):
+        super().__init__(f"Supabase API Error {status_code}: {message}")
+        self.status_code = status_code
+        self.message = message
+
+
+def _build_session():
+    retry = Retry(
+        total=MAX_RETRIES,
+        connect=MAX_RETRIES,
+        read=MAX_RETRIES,
+        status=MAX_RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUS,
+        allowed_methods=IDEMPOTENT_METHODS,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session():
+    """
+    获取当前 worker 的共享 Session
+    gunicorn fork 之后 pid 会变化，此时重新创建，避免父子进程共用同一批 socket
+    """
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                _session = _build_session()
+                _session_pid = pid
+    return _session
+
+
+def request(method, url, **kwargs):
+    """通过共享连接池发送请求，未显式指定时使用默认超时"""
+    kwargs.setdefault('timeout', (CONNECT_TIMEOUT, READ_TIMEOUT))
+    with timed('supabase'):
+        return get_session().request(method=method, url=url, **kwargs)
+
+
+def raise_for_supabase(response):
+    """非 2xx 时抛出 SupabaseAPIError（错误信息格式与原来的 Exception 保持一致）"""
+    if not response.ok:
+        raise SupabaseAPIError(response.status_code, response.text or response.reason)
+    return response
@@ -0,0 +1,16 @@
+# test_auth.py
+"""check_password：非字符串输入一律视为不匹配，不抛异常"""
+from hsk_learning_curve.auth import check_password, hash_password
+
+
+def test_check_password_matches_hash():
+    stored = hash_password('pw1')
+    assert check_password(stored, 'pw1') == (True, False)
+    assert check_password(stored, 'nope') == (False, False)
+
+
+def test_check_password_rejects_non_str_input():
+    stored = hash_password('123')
+    assert check_password(stored, 123) == (False, False)
+    assert check_password(stored, {'password': '123'}) == (False, False)
+    assert check_password('123', 123) == (False, False)
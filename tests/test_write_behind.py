@@ -0,0 +1,46 @@
+# test_write_behind.py
+"""WriteBehindBuffer：同步模式的失败必须抛给调用方，缓冲模式的失败放回缓冲等待重试"""
+import pytest
+
+from hsk_learning_curve.write_behind import WriteBehindBuffer
+
+
+def failing_flush(rows):
+    raise ConnectionError("supabase unavailable")
+
+
+def make_buffer(flush_rows, interval):
+    return WriteBehindBuffer('test', flush_rows, key_of=lambda row: row['k'], interval=interval, max_rows=100)
+
+
+def test_sync_mode_writes_immediately():
+    written = []
+    buffer = make_buffer(written.extend, interval=0)
+    buffer.add({'k': 1, 'v': 'a'})
+    assert written == [{'k': 1, 'v': 'a'}]
+    assert buffer.stats()['pending'] == 0
+    assert buffer.stats()['written'] == 1
+
+
+def test_sync_mode_failing_flush_raises():
+    buffer = make_buffer(failing_flush, interval=0)
+    with pytest.raises(ConnectionError):
+        buffer.add({'k': 1, 'v': 'a'})
+    with pytest.raises(ConnectionError):
+        buffer.merge({'k': 1, 'v': 'b'})
+    # 调用方已经收到错误，失败的行不留在缓冲里
+    assert buffer.pending() == []
+    assert buffer.stats()['failures'] == 2
+
+
+def test_buffered_failing_flush_requeues_for_retry():
+    buffer = make_buffer(failing_flush, interval=3600)
+    buffer.add({'k': 1, 'v': 'a'})
+    assert buffer.flush() == 0
+    assert buffer.pending() == [{'k': 1, 'v': 'a'}]
+
+    written = []
+    buffer.flush_rows = written.extend
+    assert buffer.flush() == 1
+    assert written == [{'k': 1, 'v': 'a'}]
+    assert buffer.pending() == []